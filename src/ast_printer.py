@@ -2,8 +2,23 @@ from expr import (
     Assignment,
     Binary,
     Grouping,
+    Inline,
     Literal,
     Logical,
+    NumBinary,
+    StrConcat,
+    IncrementVariable,
+    AddConstToVariable,
+    ArrayLiteral,
+    Index,
+    SetIndex,
+    Slice,
+    MapLiteral,
+    Get,
+    Set,
+    This,
+    Super,
+    Invoke,
     Ternary,
     Unary,
     Variable,
@@ -50,6 +65,58 @@ class AstPrinter(Visitor[str]):
     def visitUnaryExpr(self, expr: Unary) -> str:
         return self.parenthesize(expr.operator.lexeme, expr.right)
 
+    def visitInlineExpr(self, expr: Inline) -> str:
+        return self.parenthesize(
+            "inline " + expr.callee.lexeme, *expr.arguments, expr.body
+        )
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> str:
+        return self.parenthesize(expr.operator.lexeme * 2 + expr.name.lexeme)
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> str:
+        return self.parenthesize("+=", Variable(expr.name), Literal(expr.delta))
+
+    def visitNumBinaryExpr(self, expr: NumBinary) -> str:
+        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+
+    def visitStrConcatExpr(self, expr: StrConcat) -> str:
+        return self.parenthesize(expr.operator.lexeme, expr.left, expr.right)
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral) -> str:
+        return self.parenthesize("array", *expr.elements)
+
+    def visitIndexExpr(self, expr: Index) -> str:
+        return self.parenthesize("index", expr.object, expr.index)
+
+    def visitSetIndexExpr(self, expr: SetIndex) -> str:
+        return self.parenthesize("set-index", expr.object, expr.index, expr.value)
+
+    def visitSliceExpr(self, expr: Slice) -> str:
+        start = expr.start if expr.start != None else Literal(None)
+        end = expr.end if expr.end != None else Literal(None)
+        return self.parenthesize("slice", expr.object, start, end)
+
+    def visitMapLiteralExpr(self, expr: MapLiteral) -> str:
+        entries = [e for pair in zip(expr.keys, expr.values) for e in pair]
+        return self.parenthesize("map", *entries)
+
+    def visitGetExpr(self, expr: Get) -> str:
+        return self.parenthesize("get " + expr.name.lexeme, expr.object)
+
+    def visitSetExpr(self, expr: Set) -> str:
+        return self.parenthesize("set " + expr.name.lexeme, expr.object, expr.value)
+
+    def visitThisExpr(self, expr: This) -> str:
+        return "this"
+
+    def visitSuperExpr(self, expr: Super) -> str:
+        return "super." + expr.method.lexeme
+
+    def visitInvokeExpr(self, expr: Invoke) -> str:
+        return self.parenthesize(
+            "invoke " + expr.name.lexeme, expr.object, *expr.arguments
+        )
+
 
 # if __name__ == "__main__":
 #     from ptoken import Token, TokenType
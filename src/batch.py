@@ -0,0 +1,104 @@
+from __future__ import annotations
+import contextlib
+import io
+import os
+import sys
+import time
+import traceback
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional
+from lazy import lazyImport
+
+futures = lazyImport("concurrent.futures")
+
+if TYPE_CHECKING:
+    from plam import Plam
+
+# Scripts are sent to the workers in about this many batches per worker.
+BATCHES_PER_WORKER = 4
+
+
+class Result(NamedTuple):
+    script: str
+    # 0, or 65 and 70 as plam would have exited with on its own.
+    status: int
+    seconds: float
+    stdout: str
+    stderr: str
+
+
+# Every .plam file under a directory, in a stable order.
+def findScripts(directory: str) -> list[str]:
+    scripts: list[str] = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".plam"):
+                scripts.append(os.path.join(root, name))
+    return scripts
+
+
+# The Plam a worker runs its scripts with, set up once per process.
+_plam: Optional[Plam] = None
+
+
+def _start(plam: Plam):
+    global _plam
+    _plam = plam
+
+
+# Runs one script on a fresh interpreter, capturing what it prints.
+def runScript(plam: Plam, script: str) -> Result:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            plam.newInterpreter()
+            status = plam.runScript(script)
+        except Exception:
+            status = internalError(script)
+    seconds = time.perf_counter() - start
+    return Result(script, status, seconds, stdout.getvalue(), stderr.getvalue())
+
+
+def _run(script: str) -> Result:
+    assert _plam != None
+    return runScript(_plam, script)
+
+
+# Runs every script under a directory in a pool of worker processes, each
+# reusing one Plam with a fresh interpreter per script, and summarises how
+# they went.
+def runBatch(plam: Plam, directory: str, jobs: int) -> dict[str, Any]:
+    scripts = findScripts(directory)
+    start = time.perf_counter()
+    results: list[Result] = []
+    if len(scripts) > 0:
+        workers = min(jobs, len(scripts))
+        batch = max(len(scripts) // (workers * BATCHES_PER_WORKER), 1)
+        with futures.ProcessPoolExecutor(
+            workers, initializer=_start, initargs=(plam,)
+        ) as pool:
+            results = list(pool.map(_run, scripts, chunksize=batch))
+    seconds = time.perf_counter() - start
+
+    failures = [result.script for result in results if result.status != 0]
+    return {
+        "scripts": len(results),
+        "passed": len(results) - len(failures),
+        "failed": len(failures),
+        "seconds": seconds,
+        "failures": failures,
+        "results": [result._asdict() for result in results],
+    }
+
+
+# The exit status of a whole batch: the worst of its scripts'.
+def batchStatus(summary: dict[str, Any]) -> int:
+    return max((result["status"] for result in summary["results"]), default=0)
+
+
+# What a script that crashed the interpreter itself reports.
+def internalError(script: str) -> int:
+    print(f"Internal error running {script}:", file=sys.stderr)
+    traceback.print_exc(file=sys.stderr)
+    return 70
@@ -0,0 +1,140 @@
+from __future__ import annotations
+import dataclasses
+import os
+import time
+from typing import Optional
+from exceptions import (
+    DepthLimitExceeded,
+    MemoryLimitExceeded,
+    StepLimitExceeded,
+    TimeLimitExceeded,
+)
+from ptoken import Token, TokenType
+
+# Steps between checks of the clock and the heap.
+CHECK_INTERVAL = 1000
+
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+# Bytes the process has resident, or None where that can't be told cheaply.
+def heapSize() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except (OSError, IndexError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the peak is available, in kilobytes everywhere but macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+# The first token in a node, to report a limit at when the node has none of
+# its own.
+def firstToken(node: object) -> Optional[Token]:
+    if isinstance(node, Token):
+        return node
+    if isinstance(node, list):
+        children = node
+    elif dataclasses.is_dataclass(node):
+        children = [getattr(node, field.name) for field in dataclasses.fields(node)]
+    else:
+        return None
+    for child in children:
+        token = firstToken(child)
+        if token != None:
+            return token
+    return None
+
+
+def limitToken(node: object) -> Token:
+    return firstToken(node) or Token(TokenType.IDENTIFIER, "", None, 0)
+
+
+# Limits on how much a run may do, for running scripts that can't be trusted to
+# stop. Every loop iteration and call is a step. Steps are counted down from a
+# fuel level and the clock and heap are only looked at when it runs out, every
+# CHECK_INTERVAL steps, so a run well within its limits pays for little more
+# than the counter.
+class Budget:
+    steps: Optional[int]
+    # Seconds from when the budget was made.
+    seconds: Optional[float]
+    depth: Optional[int]
+    # Bytes the process may grow by.
+    memory: Optional[int]
+    # Steps left before the next check, less one.
+    fuel: int
+    # Steps taken before the current period of CHECK_INTERVAL.
+    used: int
+    period: int
+    deadline: Optional[float]
+    baseline: Optional[int]
+    # Calls running now.
+    calls: int
+
+    def __init__(
+        self,
+        steps: Optional[int] = None,
+        seconds: Optional[float] = None,
+        depth: Optional[int] = None,
+        memory: Optional[int] = None,
+    ):
+        self.steps = steps
+        self.seconds = seconds
+        self.depth = depth
+        self.memory = memory
+        self.fuel = 0
+        self.used = 0
+        self.period = 0
+        self.deadline = None if seconds == None else time.monotonic() + seconds
+        self.baseline = None if memory == None else heapSize()
+        self.calls = 0
+
+    # Counts one step, checking the limits once the fuel runs out.
+    def step(self, node: object):
+        self.fuel -= 1
+        if self.fuel < 0:
+            self.refuel(node)
+
+    def refuel(self, node: object):
+        self.used += self.period
+        if self.steps != None and self.used >= self.steps:
+            self.fuel = self.period = 0
+            message = f"Step limit of {self.steps} exceeded."
+            raise StepLimitExceeded(limitToken(node), message)
+        if self.deadline != None and time.monotonic() > self.deadline:
+            self.fuel = self.period = 0
+            message = f"Time limit of {self.seconds * 1000:.0f} ms exceeded."
+            raise TimeLimitExceeded(limitToken(node), message)
+        if self.memory != None and self.baseline != None:
+            size = heapSize()
+            if size != None and size - self.baseline > self.memory:
+                self.fuel = self.period = 0
+                megabytes = self.memory / (1024 * 1024)
+                message = f"Memory limit of {megabytes:.0f} MB exceeded."
+                raise MemoryLimitExceeded(limitToken(node), message)
+        self.period = CHECK_INTERVAL
+        if self.steps != None:
+            self.period = min(self.period, self.steps - self.used)
+        self.fuel = self.period - 1
+
+    # Counts a call as a step and one level deeper. Whoever enters leaves by
+    # taking one off calls once the call returns.
+    def enter(self, node: object):
+        self.step(node)
+        if self.depth != None and self.calls >= self.depth:
+            message = f"Call depth limit of {self.depth} exceeded."
+            raise DepthLimitExceeded(limitToken(node), message)
+        self.calls += 1
+
+    # The same limits and deadline, counted afresh, for a worker process. The
+    # monotonic clock is shared by every process on the machine.
+    def share(self) -> Budget:
+        budget = Budget(self.steps, self.seconds, self.depth, self.memory)
+        budget.deadline = self.deadline
+        return budget
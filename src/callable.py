@@ -7,6 +7,9 @@ if TYPE_CHECKING:
 
 
 class Callable(ABC):
+    # Whether calling it can affect anything but its arguments and result.
+    sideEffects: bool = False
+
     def call(self, interpreter: Interpreter, args: list[object]) -> object: ...
 
     def arity(self) -> int: ...
@@ -0,0 +1,142 @@
+from __future__ import annotations
+from typing import Optional
+from ptoken import TokenType
+from expr import Expr, Binary, Grouping, Literal, Logical, Ternary, Unary
+from stmt import (
+    Stmt,
+    Block,
+    Break,
+    CompareAndBranch,
+    Continue,
+    Expression,
+    If,
+    Return,
+    While,
+)
+from transformer import Transformer, countNodes
+
+
+def truthy(value: object) -> bool:
+    if value == None:
+        return False
+    if isinstance(value, bool):
+        return value
+    return True
+
+
+# Removes statements that can never run or have no observable effect, and
+# prunes branches whose conditions are constant.
+class DeadCodeEliminator(Transformer):
+    stats: dict[str, int]
+
+    def __init__(self, stats: dict[str, int]):
+        self.stats = stats
+        self.stats.setdefault("eliminated", 0)
+
+    def run(self, statements: list[Stmt]) -> list[Stmt]:
+        return self.stmts(statements)
+
+    def eliminate(self, node: Expr | Stmt, kept: Optional[Expr | Stmt] = None):
+        self.stats["eliminated"] += countNodes(node) - (
+            countNodes(kept) if kept != None else 0
+        )
+
+    def constant(self, expr: Expr) -> tuple[bool, object]:
+        if isinstance(expr, Literal):
+            return True, expr.value
+        if isinstance(expr, Grouping):
+            return self.constant(expr.expression)
+        if isinstance(expr, Unary) and expr.operator.t == TokenType.BANG:
+            known, value = self.constant(expr.right)
+            return known, not truthy(value)
+        return False, None
+
+    # Expressions that can neither raise nor change any state.
+    def isPure(self, expr: Expr) -> bool:
+        if isinstance(expr, Literal):
+            return True
+        if isinstance(expr, Grouping):
+            return self.isPure(expr.expression)
+        if isinstance(expr, Unary):
+            return expr.operator.t == TokenType.BANG and self.isPure(expr.right)
+        if isinstance(expr, Logical):
+            return self.isPure(expr.left) and self.isPure(expr.right)
+        if isinstance(expr, Ternary):
+            return (
+                self.isPure(expr.cond)
+                and self.isPure(expr.first)
+                and self.isPure(expr.second)
+            )
+        if isinstance(expr, Binary):
+            return (
+                expr.operator.t in (TokenType.EQUALEQ, TokenType.BANGEQ)
+                and self.isPure(expr.left)
+                and self.isPure(expr.right)
+            )
+        return False
+
+    def terminates(self, stmt: Stmt) -> bool:
+        if isinstance(stmt, (Return, Break, Continue)):
+            return True
+        if isinstance(stmt, Block):
+            return len(stmt.statements) > 0 and self.terminates(stmt.statements[-1])
+        if isinstance(stmt, (If, CompareAndBranch)):
+            return (
+                stmt.elseBranch != None
+                and self.terminates(stmt.thenBranch)
+                and self.terminates(stmt.elseBranch)
+            )
+        return False
+
+    def stmts(self, stmts: list[Stmt]) -> list[Stmt]:
+        result: list[Stmt] = []
+        for i, s in enumerate(stmts):
+            s = self.stmt(s)
+            if s == None:
+                continue
+            result.append(s)
+            if self.terminates(s):
+                for dead in stmts[i + 1 :]:
+                    self.eliminate(dead)
+                break
+        return result
+
+    def visitTernaryExpr(self, expr: Ternary) -> Expr:
+        expr = super().visitTernaryExpr(expr)
+        known, value = self.constant(expr.cond)
+        if not known:
+            return expr
+        kept = expr.first if truthy(value) else expr.second
+        self.eliminate(expr, kept)
+        return kept
+
+    def visitExpressionStmt(self, stmt: Expression) -> Optional[Stmt]:
+        stmt.expression = self.expr(stmt.expression)
+        if self.isPure(stmt.expression):
+            self.eliminate(stmt)
+            return None
+        return stmt
+
+    def visitIfStmt(self, stmt: If) -> Optional[Stmt]:
+        super().visitIfStmt(stmt)
+        known, value = self.constant(stmt.cond)
+        if not known:
+            return stmt
+        kept = stmt.thenBranch if truthy(value) else stmt.elseBranch
+        self.eliminate(stmt, kept)
+        return kept
+
+    def visitWhileStmt(self, stmt: While) -> Optional[Stmt]:
+        super().visitWhileStmt(stmt)
+        known, value = self.constant(stmt.cond)
+        if not known:
+            return stmt
+        if not truthy(value):
+            self.eliminate(stmt)
+            return None
+        # The interpreter skips evaluating a literal true condition entirely.
+        if not isinstance(stmt.cond, Literal) or stmt.cond.value is not True:
+            literal = Literal(True)
+            self.eliminate(stmt.cond, literal)
+            stmt.cond = literal
+        return stmt
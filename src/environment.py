@@ -1,16 +1,20 @@
 from __future__ import annotations
+import itertools
 from ptoken import Token
 from typing import Optional
 
 from exceptions import PlamRuntimeError
 UNINITIALIZED = object()
 class Environment:
+    # Counts every environment made, for metrics.
+    created = itertools.count()
     enclosing: Optional[Environment]
     _values: dict[str, object]
 
     def __init__(self, enclosing: Optional[Environment] = None):
         self.enclosing = enclosing
         self._values = {}
+        next(Environment.created)
 
     def define(self, name: str, value: object):
         self._values[name] = value
@@ -26,6 +30,15 @@ class Environment:
 
         raise PlamRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
 
+    def resolve(self, name: Token) -> Environment:
+        env: Optional[Environment] = self
+        while env != None:
+            if name.lexeme in env._values:
+                return env
+            env = env.enclosing
+
+        raise PlamRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+
     def assign(self, name: Token, value: object):
         if name.lexeme in self._values.keys():
             self._values[name.lexeme] = value
@@ -36,3 +49,30 @@ class Environment:
             return
 
         raise PlamRuntimeError(name, f"Undefined variable '{name.lexeme}'.")
+
+
+# The outermost environment. Every definition or assignment gives it a new
+# version, drawn from a counter shared by all global environments so no two
+# states of any of them share a version. Lookups can cache a global's value
+# together with the version it was read at.
+class GlobalEnvironment(Environment):
+    versions = itertools.count(1)
+    version: int
+
+    def __init__(self):
+        super().__init__()
+        self.version = next(GlobalEnvironment.versions)
+
+    def values(self) -> list[object]:
+        return list(self._values.values())
+
+    def items(self) -> list[tuple[str, object]]:
+        return list(self._values.items())
+
+    def define(self, name: str, value: object):
+        self._values[name] = value
+        self.version = next(GlobalEnvironment.versions)
+
+    def assign(self, name: Token, value: object):
+        super().assign(name, value)
+        self.version = next(GlobalEnvironment.versions)
@@ -13,6 +13,28 @@ class PlamRuntimeError(RuntimeError):
         self.token = token
 
 
+# Raised when a run goes over one of the limits in its budget. Each limit has
+# its own kind, so whoever runs the interpreter can tell them apart.
+class LimitExceeded(PlamRuntimeError):
+    pass
+
+
+class StepLimitExceeded(LimitExceeded):
+    pass
+
+
+class TimeLimitExceeded(LimitExceeded):
+    pass
+
+
+class DepthLimitExceeded(LimitExceeded):
+    pass
+
+
+class MemoryLimitExceeded(LimitExceeded):
+    pass
+
+
 class ReturnException(Exception):
     value: object
 
@@ -20,9 +42,31 @@ class ReturnException(Exception):
         self.value = value
 
 
+class BreakLoop(Exception):
+    token: Token
+
+    def __init__(self, tok: Token):
+        self.token = tok
+
+
+class ContinueLoop(Exception):
+    token: Token
+
+    def __init__(self, tok: Token):
+        self.token = tok
+
+
 class ParseError(Exception):
     pass
 
 
 class BreakOutsideLoop(Exception):
     pass
+
+
+class BuildError(Exception):
+    token: Token
+
+    def __init__(self, token: Token, message: str):
+        super().__init__(message)
+        self.token = token
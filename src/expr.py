@@ -2,18 +2,21 @@ from __future__ import annotations
 from dataclasses import dataclass
 from abc import ABC
 from ptoken import Token
-from typing import TypeVar, Generic, Optional
-
+from typing import Any, Callable, ClassVar, TypeVar, Generic, Optional
 
 T = TypeVar("T")
 
 
 class Expr(ABC):
+    __slots__ = ()
+    kind: ClassVar[int]
+
     def accept(self, visitor: Visitor[T]) -> T: ...
 
 
-@dataclass
+@dataclass(slots=True)
 class Assignment(Expr):
+    kind: ClassVar[int] = 0
     name: Token
     value: Expr
 
@@ -21,8 +24,9 @@ class Assignment(Expr):
         return visitor.visitAssignmentExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Ternary(Expr):
+    kind: ClassVar[int] = 1
     cond: Expr
     first: Expr
     second: Expr
@@ -31,8 +35,9 @@ class Ternary(Expr):
         return visitor.visitTernaryExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Binary(Expr):
+    kind: ClassVar[int] = 2
     left: Expr
     operator: Token
     right: Expr
@@ -41,8 +46,9 @@ class Binary(Expr):
         return visitor.visitBinaryExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Call(Expr):
+    kind: ClassVar[int] = 3
     callee: Expr
     paren: Token
     arguments: list[Expr]
@@ -51,24 +57,27 @@ class Call(Expr):
         return visitor.visitCallExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Grouping(Expr):
+    kind: ClassVar[int] = 4
     expression: Expr
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitGroupingExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Literal(Expr):
+    kind: ClassVar[int] = 5
     value: object
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitLiteralExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Logical(Expr):
+    kind: ClassVar[int] = 6
     left: Expr
     operator: Token
     right: Expr
@@ -77,8 +86,9 @@ class Logical(Expr):
         return visitor.visitLogicalExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Unary(Expr):
+    kind: ClassVar[int] = 7
     operator: Token
     right: Expr
 
@@ -86,14 +96,191 @@ class Unary(Expr):
         return visitor.visitUnaryExpr(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Variable(Expr):
+    kind: ClassVar[int] = 8
     name: Token
+    cache: object = None
+    version: int = 0
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitVariableExpr(self)
 
 
+@dataclass(slots=True)
+class Inline(Expr):
+    kind: ClassVar[int] = 9
+    callee: Token
+    params: list[Token]
+    arguments: list[Expr]
+    body: Expr
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitInlineExpr(self)
+
+
+@dataclass(slots=True)
+class NumBinary(Expr):
+    kind: ClassVar[int] = 10
+    left: Expr
+    operator: Token
+    right: Expr
+    op: object
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitNumBinaryExpr(self)
+
+
+@dataclass(slots=True)
+class StrConcat(Expr):
+    kind: ClassVar[int] = 11
+    left: Expr
+    operator: Token
+    right: Expr
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitStrConcatExpr(self)
+
+
+@dataclass(slots=True)
+class IncrementVariable(Expr):
+    kind: ClassVar[int] = 12
+    name: Token
+    operator: Token
+    delta: float
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitIncrementVariableExpr(self)
+
+
+@dataclass(slots=True)
+class AddConstToVariable(Expr):
+    kind: ClassVar[int] = 13
+    name: Token
+    operator: Token
+    delta: float
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitAddConstToVariableExpr(self)
+
+
+@dataclass(slots=True)
+class ArrayLiteral(Expr):
+    kind: ClassVar[int] = 14
+    bracket: Token
+    elements: list[Expr]
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitArrayLiteralExpr(self)
+
+
+@dataclass(slots=True)
+class Index(Expr):
+    kind: ClassVar[int] = 15
+    object: Expr
+    bracket: Token
+    index: Expr
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitIndexExpr(self)
+
+
+@dataclass(slots=True)
+class SetIndex(Expr):
+    kind: ClassVar[int] = 16
+    object: Expr
+    bracket: Token
+    index: Expr
+    value: Expr
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitSetIndexExpr(self)
+
+
+@dataclass(slots=True)
+class Slice(Expr):
+    kind: ClassVar[int] = 17
+    object: Expr
+    bracket: Token
+    start: Optional[Expr]
+    end: Optional[Expr]
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitSliceExpr(self)
+
+
+@dataclass(slots=True)
+class MapLiteral(Expr):
+    kind: ClassVar[int] = 18
+    brace: Token
+    keys: list[Expr]
+    values: list[Expr]
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitMapLiteralExpr(self)
+
+
+@dataclass(slots=True)
+class Get(Expr):
+    kind: ClassVar[int] = 19
+    object: Expr
+    name: Token
+    shape: object = None
+    slot: int = 0
+    method: object = None
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitGetExpr(self)
+
+
+@dataclass(slots=True)
+class Set(Expr):
+    kind: ClassVar[int] = 20
+    object: Expr
+    name: Token
+    value: Expr
+    shape: object = None
+    next: object = None
+    slot: int = 0
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitSetExpr(self)
+
+
+@dataclass(slots=True)
+class This(Expr):
+    kind: ClassVar[int] = 21
+    keyword: Token
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitThisExpr(self)
+
+
+@dataclass(slots=True)
+class Super(Expr):
+    kind: ClassVar[int] = 22
+    keyword: Token
+    method: Token
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitSuperExpr(self)
+
+
+@dataclass(slots=True)
+class Invoke(Expr):
+    kind: ClassVar[int] = 23
+    object: Expr
+    name: Token
+    paren: Token
+    arguments: list[Expr]
+    shape: object = None
+    slot: int = 0
+    method: object = None
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitInvokeExpr(self)
+
+
 class Visitor(ABC, Generic[T]):
     def visitAssignmentExpr(self, expr: Assignment) -> T: ...
 
@@ -112,3 +299,65 @@ class Visitor(ABC, Generic[T]):
     def visitUnaryExpr(self, expr: Unary) -> T: ...
 
     def visitVariableExpr(self, expr: Variable) -> T: ...
+
+    def visitInlineExpr(self, expr: Inline) -> T: ...
+
+    def visitNumBinaryExpr(self, expr: NumBinary) -> T: ...
+
+    def visitStrConcatExpr(self, expr: StrConcat) -> T: ...
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> T: ...
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> T: ...
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral) -> T: ...
+
+    def visitIndexExpr(self, expr: Index) -> T: ...
+
+    def visitSetIndexExpr(self, expr: SetIndex) -> T: ...
+
+    def visitSliceExpr(self, expr: Slice) -> T: ...
+
+    def visitMapLiteralExpr(self, expr: MapLiteral) -> T: ...
+
+    def visitGetExpr(self, expr: Get) -> T: ...
+
+    def visitSetExpr(self, expr: Set) -> T: ...
+
+    def visitThisExpr(self, expr: This) -> T: ...
+
+    def visitSuperExpr(self, expr: Super) -> T: ...
+
+    def visitInvokeExpr(self, expr: Invoke) -> T: ...
+
+
+VISIT_METHODS = [
+    "visitAssignmentExpr",
+    "visitTernaryExpr",
+    "visitBinaryExpr",
+    "visitCallExpr",
+    "visitGroupingExpr",
+    "visitLiteralExpr",
+    "visitLogicalExpr",
+    "visitUnaryExpr",
+    "visitVariableExpr",
+    "visitInlineExpr",
+    "visitNumBinaryExpr",
+    "visitStrConcatExpr",
+    "visitIncrementVariableExpr",
+    "visitAddConstToVariableExpr",
+    "visitArrayLiteralExpr",
+    "visitIndexExpr",
+    "visitSetIndexExpr",
+    "visitSliceExpr",
+    "visitMapLiteralExpr",
+    "visitGetExpr",
+    "visitSetExpr",
+    "visitThisExpr",
+    "visitSuperExpr",
+    "visitInvokeExpr",
+]
+
+
+def dispatchTable(visitor: Visitor[T]) -> list[Callable[[Any], T]]:
+    return [getattr(visitor, name) for name in VISIT_METHODS]
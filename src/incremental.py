@@ -0,0 +1,230 @@
+from __future__ import annotations
+import dataclasses
+from bisect import bisect_left, bisect_right
+from typing import Any, Optional
+from ptoken import Token, TokenType
+from scanner import Scanner
+from pparser import Parser
+from expr import Expr
+from stmt import Stmt
+from splitter import ErrorCollector, Report
+
+
+# A run of top-level declarations together with the source they were parsed
+# from. Spans tile the source: each runs from its first token to the first
+# token of the next, so comments and whitespace belong to the span before them.
+class Span:
+    start: int
+    end: int
+    line: int
+    statements: list[Optional[Stmt]]
+    reports: list[Report]
+
+    def __init__(
+        self,
+        start: int,
+        end: int,
+        line: int,
+        statements: list[Optional[Stmt]],
+        reports: list[Report],
+    ):
+        self.start = start
+        self.end = end
+        self.line = line
+        self.statements = statements
+        self.reports = reports
+
+
+# Records where in the source each token starts.
+class _OffsetScanner(Scanner):
+    offsets: list[int]
+
+    def __init__(self, source: str, plam, line: int):
+        super().__init__(source, plam)
+        self.offsets = []
+        self.line = line
+
+    def addToken(self, t: TokenType, literal: object = None):
+        super().addToken(t, literal)
+        self.offsets.append(self.start)
+
+
+def _commonPrefix(a: str, b: str) -> int:
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _commonSuffix(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid :] == b[len(b) - mid :]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _shiftLines(node: object, delta: int, seen: set[int]):
+    if isinstance(node, Token):
+        if id(node) not in seen:
+            seen.add(id(node))
+            node.line += delta
+    elif isinstance(node, list):
+        for n in node:
+            _shiftLines(n, delta, seen)
+    elif isinstance(node, (Expr, Stmt)):
+        for field in dataclasses.fields(node):
+            _shiftLines(getattr(node, field.name), delta, seen)
+
+
+# Keeps the spans of the last source it parsed and, given an edited version,
+# re-scans and re-parses only the declarations the edit touched. Declarations
+# before the edit are reused as they are; declarations after it are reused with
+# their line numbers moved. Once a parse reports errors, everything from the
+# first error to the end of the source is parsed again on every update, so
+# errors are always reported in the order a full parse would report them.
+class IncrementalParser:
+    plam: Any
+    source: str
+    spans: list[Span]
+    tail: Optional[Span]
+    parsed: int
+
+    def __init__(self, plam):
+        self.plam = plam
+        self.source = ""
+        self.spans = []
+        self.tail = None
+        self.parsed = 0
+
+    def update(self, source: str) -> list[Optional[Stmt]]:
+        self.parsed = 0
+        if source != self.source:
+            self.reparse(self.source, source)
+            self.source = source
+
+        statements: list[Optional[Stmt]] = []
+        for span in self.spans:
+            statements.extend(span.statements)
+        if self.tail != None:
+            statements.extend(self.tail.statements)
+            for report in self.tail.reports:
+                self.plam.report(report.line, report.where, report.message)
+        return statements
+
+    def declarations(self) -> int:
+        total = sum(len(span.statements) for span in self.spans)
+        return total + (len(self.tail.statements) if self.tail != None else 0)
+
+    def reparse(self, old: str, new: str):
+        prefix = _commonPrefix(old, new)
+        suffix = _commonSuffix(old, new, min(len(old), len(new)) - prefix)
+        delta = len(new) - len(old)
+
+        # A span is untouched if the edit starts after it ends, as long as it
+        # doesn't run to the end of the source where a trailing comment could
+        # swallow new text.
+        spans = self.spans
+        before = bisect_right(spans, prefix, key=lambda span: span.end)
+        if before > 0 and spans[before - 1].end == len(old):
+            before -= 1
+        after = len(spans)
+        if self.tail == None:
+            limit = len(old) - suffix
+            after = bisect_left(spans, limit, before, key=lambda span: span.start)
+        kept = spans[:before]
+        following = spans[after:]
+
+        start = kept[-1].end if len(kept) > 0 else 0
+        line = 1
+        if len(kept) > 0:
+            line = kept[-1].line + old.count("\n", kept[-1].start, start)
+        end = following[0].start + delta if len(following) > 0 else len(new)
+
+        while True:
+            region = self.parseRegion(new, start, end, line)
+            if region == None:
+                # The edit continues an 'if' that ends the previous span.
+                previous = kept.pop()
+                start, line = previous.start, previous.line
+                continue
+            spans, reports, clean = region
+            if clean or end == len(new):
+                break
+            following = []
+            end = len(new)
+
+        if len(following) > 0:
+            lineDelta = line + new.count("\n", start, end) - following[0].line
+            seen: set[int] = set()
+            for span in following:
+                span.start += delta
+                span.end += delta
+                span.line += lineDelta
+                if lineDelta != 0:
+                    _shiftLines(span.statements, lineDelta, seen)
+
+        self.tail = None
+        if len(reports) > 0:
+            statements = [s for span in spans for s in span.statements]
+            self.tail = Span(start, len(new), line, statements, reports)
+            spans = []
+        elif len(spans) == 0 and len(kept) > 0:
+            kept[-1].end = end
+        elif len(spans) == 0 and len(following) > 0:
+            following[0].start = start
+            following[0].line = line
+        self.spans = kept + spans + following
+        self.parsed = sum(len(span.statements) for span in spans)
+        if self.tail != None:
+            self.parsed += len(self.tail.statements)
+
+    # Scans and parses new[start:end]. Returns None if the region starts with
+    # an 'else', otherwise its spans, any errors, and whether the region is
+    # known to end where a full parse would have ended a declaration.
+    def parseRegion(
+        self, new: str, start: int, end: int, line: int
+    ) -> Optional[tuple[list[Span], list[Report], bool]]:
+        text = new[start:end]
+        collector = ErrorCollector()
+        scanner = _OffsetScanner(text, collector, line)
+        tokens = scanner.scanTokens()
+        if tokens[0].t == TokenType.ELSE and start > 0:
+            return None
+        scanErrors = collector.reports
+        collector.reports = []
+
+        parser = Parser(tokens, collector)
+        firsts: list[int] = []
+        statements: list[Optional[Stmt]] = []
+        while not parser.isAtEnd():
+            firsts.append(parser.current)
+            statements.append(parser.declaration())
+        reports = scanErrors + collector.reports
+
+        spans: list[Span] = []
+        for i, statement in enumerate(statements):
+            spanStart = start + scanner.offsets[firsts[i]] if i > 0 else start
+            spanEnd = (
+                start + scanner.offsets[firsts[i + 1]] if i + 1 < len(firsts) else end
+            )
+            spanLine = line + new.count("\n", start, spanStart)
+            spans.append(Span(spanStart, spanEnd, spanLine, [statement], []))
+
+        # A comment on the last line of the region would have run into the
+        # text that follows it.
+        clean = len(reports) == 0
+        if clean and len(tokens) > 1:
+            last = tokens[-2]
+            trailing = text[scanner.offsets[-1] + len(last.lexeme) :]
+            clean = "//" not in trailing.rsplit("\n", 1)[-1]
+        elif clean:
+            clean = "//" not in text.rsplit("\n", 1)[-1]
+        return spans, reports, clean
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import copy
+from collections import Counter
+from typing import NamedTuple, Optional
+from ptoken import Token, TokenType
+from expr import (
+    Expr,
+    Assignment,
+    Call,
+    Inline,
+    Variable,
+    IncrementVariable,
+    AddConstToVariable,
+)
+from stmt import Stmt, Block, Class, CountedFor, ForIn, Function, Return, Var
+from transformer import Transformer, declaredNames, countNodes, nameUsage
+
+# Maximum number of expression nodes in a function body that will be inlined.
+INLINE_THRESHOLD = 16
+
+
+class _Candidate(NamedTuple):
+    index: int
+    function: Function
+    value: Expr
+    freeNames: set[str]
+
+
+class _Renamer(Transformer):
+    names: dict[str, Token]
+
+    def __init__(self, names: dict[str, Token]):
+        self.names = names
+
+    def visitAssignmentExpr(self, expr: Assignment) -> Expr:
+        if expr.name.lexeme in self.names:
+            expr.name = self.names[expr.name.lexeme]
+        return super().visitAssignmentExpr(expr)
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> Expr:
+        if expr.name.lexeme in self.names:
+            expr.name = self.names[expr.name.lexeme]
+        return expr
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> Expr:
+        if expr.name.lexeme in self.names:
+            expr.name = self.names[expr.name.lexeme]
+        return expr
+
+    def visitVariableExpr(self, expr: Variable) -> Expr:
+        if expr.name.lexeme in self.names:
+            renamed = self.names[expr.name.lexeme]
+            return Variable(
+                Token(TokenType.IDENTIFIER, renamed.lexeme, None, expr.name.line)
+            )
+        return expr
+
+
+# Replaces calls to small, non-recursive top-level functions with an Inline
+# node holding a copy of the callee's returned expression. Parameters are
+# renamed to names that can't be written in source, so the body can never
+# capture or clobber the caller's variables.
+class Inliner(Transformer):
+    stats: dict[str, int]
+    candidates: dict[str, _Candidate]
+    scopes: list[set[str]]
+    topIndex: int
+    sites: int
+
+    def __init__(self, stats: dict[str, int]):
+        self.stats = stats
+        self.candidates = {}
+        self.scopes = []
+        self.topIndex = 0
+        self.sites = 0
+
+    def run(self, statements: list[Stmt]) -> list[Stmt]:
+        self.candidates = self.findCandidates(statements)
+        self.stats.setdefault("inlined", 0)
+        if len(self.candidates) == 0:
+            return statements
+
+        for i, statement in enumerate(statements):
+            self.topIndex = i
+            statements[i] = self.branch(statement)
+        return statements
+
+    def findCandidates(self, statements: list[Stmt]) -> dict[str, _Candidate]:
+        usage = nameUsage(*statements)
+
+        declarations: Counter[str] = Counter()
+        functions: dict[str, tuple[int, Function]] = {}
+        for i, s in enumerate(statements):
+            if isinstance(s, (Var, Function, Class)):
+                declarations[s.name.lexeme] += 1
+            if isinstance(s, Function):
+                functions[s.name.lexeme] = (i, s)
+
+        candidates: dict[str, _Candidate] = {}
+        for name, (i, function) in functions.items():
+            if declarations[name] != 1 or name in usage.assigned:
+                continue
+            # Only ever called directly, so the function value never escapes.
+            if usage.refs[name] != usage.calls[name]:
+                continue
+            if len(function.body) != 1 or not isinstance(function.body[0], Return):
+                continue
+            value = function.body[0].value
+            if value == None or countNodes(value) > INLINE_THRESHOLD:
+                continue
+            params = {p.lexeme for p in function.params}
+            if len(params) != len(function.params):
+                continue
+
+            free = nameUsage(value)
+            names = (set(free.refs) | free.assigned) - params
+            candidates[name] = _Candidate(i, function, copy.deepcopy(value), names)
+
+        recursive = {n for n in candidates if self.reaches(candidates, n, n, set())}
+        for name in recursive:
+            del candidates[name]
+        return candidates
+
+    def reaches(
+        self, candidates: dict[str, _Candidate], start: str, target: str, seen: set
+    ) -> bool:
+        for name in candidates[start].freeNames:
+            if name == target:
+                return True
+            if name in candidates and name not in seen:
+                seen.add(name)
+                if self.reaches(candidates, name, target, seen):
+                    return True
+        return False
+
+    def inline(self, expr: Call) -> Optional[Expr]:
+        if not isinstance(expr.callee, Variable):
+            return None
+        name = expr.callee.name.lexeme
+        candidate = self.candidates.get(name)
+        if candidate == None:
+            return None
+        # The function must already be defined when this statement runs.
+        if self.topIndex <= candidate.index:
+            return None
+        if len(expr.arguments) != len(candidate.function.params):
+            return None
+        for scope in self.scopes:
+            if name in scope or not scope.isdisjoint(candidate.freeNames):
+                return None
+
+        site = self.sites
+        self.sites += 1
+        names = {
+            p.lexeme: Token(
+                TokenType.IDENTIFIER, f"{p.lexeme}@{name}#{site}", None, p.line
+            )
+            for p in candidate.function.params
+        }
+        body = _Renamer(names).expr(copy.deepcopy(candidate.value))
+        self.stats["inlined"] += 1
+        return Inline(
+            expr.callee.name, list(names.values()), expr.arguments, self.expr(body)
+        )
+
+    def visitCallExpr(self, expr: Call) -> Expr:
+        expr = super().visitCallExpr(expr)
+        inlined = self.inline(expr)
+        return inlined if inlined != None else expr
+
+    def visitBlockStmt(self, stmt: Block) -> Optional[Stmt]:
+        self.scopes.append(declaredNames(stmt.statements))
+        result = super().visitBlockStmt(stmt)
+        self.scopes.pop()
+        return result
+
+    def visitFunctionStmt(self, stmt: Function) -> Optional[Stmt]:
+        self.scopes.append(
+            {p.lexeme for p in stmt.params} | declaredNames(stmt.body)
+        )
+        result = super().visitFunctionStmt(stmt)
+        self.scopes.pop()
+        return result
+
+    def visitCountedForStmt(self, stmt: CountedFor) -> Optional[Stmt]:
+        self.scopes.append({stmt.initializer.name.lexeme})
+        result = super().visitCountedForStmt(stmt)
+        self.scopes.pop()
+        return result
+
+    def visitForInStmt(self, stmt: ForIn) -> Optional[Stmt]:
+        stmt.iterable = self.expr(stmt.iterable)
+        self.scopes.append({stmt.name.lexeme})
+        stmt.body = self.branch(stmt.body)
+        self.scopes.pop()
+        return stmt
@@ -1,3 +1,4 @@
+from __future__ import annotations
 from expr import (
     Binary,
     Expr,
@@ -9,7 +10,23 @@ from expr import (
     Assignment,
     Logical,
     Call,
+    Inline,
+    NumBinary,
+    StrConcat,
+    IncrementVariable,
+    AddConstToVariable,
+    ArrayLiteral,
+    Index,
+    SetIndex,
+    Slice,
+    MapLiteral,
+    Get,
+    Set,
+    This,
+    Super,
+    Invoke,
     Visitor as EVisitor,
+    dispatchTable as exprDispatchTable,
 )
 from stmt import (
     Stmt,
@@ -22,53 +39,130 @@ from stmt import (
     If,
     Function,
     Return,
+    CountedFor,
+    CompareAndBranch,
+    ForIn,
+    Class,
+    Yield,
+    Import,
     Visitor as SVisitor,
+    dispatchTable as stmtDispatchTable,
 )
-from pfunction import PFunction
+from pfunction import PFunction, THIS
+from pclass import PClass, PInstance
+from scheduler import Scheduler
+from modules import ModuleLoader
 from ptoken import TokenType, Token
-from typing import cast, Any, TYPE_CHECKING
+from typing import cast, Any, Callable as PyCallable, Optional, TYPE_CHECKING
 from callable import Callable
-from exceptions import PlamRuntimeError, ReturnException
-from environment import Environment, UNINITIALIZED
+from exceptions import (
+    PlamRuntimeError,
+    ReturnException,
+    ParseError,
+    BreakLoop,
+    ContinueLoop,
+)
+from environment import Environment, GlobalEnvironment, UNINITIALIZED
+from transformer import localNames
+from pparser import parseBody
 from pbuiltins import BUILTINS
+from pruntime import (
+    PArray,
+    PMap,
+    PRope,
+    PlamError,
+    broadcast,
+    concat,
+    formatArray,
+    formatMap,
+    getIndex,
+    getSlice,
+    isString,
+    iterate,
+    neg,
+    newArray,
+    newMap,
+    repeatString,
+    setIndex,
+)
 
-class BreakLoop(Exception):
-    def __init__(self, tok: Token):
-        self.token = tok
-
+if TYPE_CHECKING:
+    from budget import Budget
+    from jit import JIT
+    from metrics import Metrics
 
-class ContinueLoop(Exception):
-    def __init__(self, tok: Token):
-        self.token = tok
+# Operators that apply element by element when an operand is an array.
+BROADCAST = {
+    TokenType.PLUS: "+",
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.SLASH: "/",
+}
 
 
 class Interpreter(EVisitor[object], SVisitor[None]):
     plam: Any
-    globalenv: Environment
+    globalenv: GlobalEnvironment
     environment: Environment
+    # Names declared somewhere other than the global environment.
+    shadowed: set[str]
+    visitExpr: list[PyCallable[[Expr], object]]
+    visitStmt: list[PyCallable[[Stmt], None]]
+    jit: Optional[JIT]
+    # Function whose body is running, tracked while the JIT is enabled.
+    function: Optional[PFunction]
+    scheduler: Scheduler
+    modules: ModuleLoader
+    # Limits on the run, if it has any.
+    budget: Optional[Budget]
+    # Counters kept when the run asked for them.
+    metrics: Optional[Metrics]
 
     def __init__(self, plam):
-        self.globalenv = Environment()
+        self.globalenv = self.builtinEnvironment()
         self.environment = self.globalenv
+        self.shadowed = set()
+        self.jit = None
+        self.function = None
+        self.scheduler = Scheduler(self)
+        self.modules = ModuleLoader(self)
+        self.budget = None
+        self.metrics = None
+        self.visitExpr = exprDispatchTable(self)
+        self.visitStmt = stmtDispatchTable(self)
+        self.plam = plam
 
+    # A global environment holding nothing but the builtins.
+    def builtinEnvironment(self) -> GlobalEnvironment:
+        env = GlobalEnvironment()
         for b in BUILTINS:
-            self.globalenv.define(b.name, b.fn)
-        self.plam = plam
+            env.define(b.name, b.fn)
+        return env
 
     def interpret(self, statements: list[Stmt]):
+        self.shadowed |= localNames(statements)
         try:
             for statement in statements:
                 self.execute(statement)
+            self.scheduler.finish()
+            return
         except PlamRuntimeError as e:
-            self.plam.runtimeError(e)
+            self.runtimeError(e)
+        except ParseError:
+            # A function body parsed on its first call had syntax errors,
+            # which have already been reported.
+            pass
         except BreakLoop as e:
-            self.plam.runetimeError(
-                PlamRuntimeError(e.token, "'break' used outside loop.")
-            )
+            self.runtimeError(PlamRuntimeError(e.token, "'break' used outside loop."))
         except ContinueLoop as e:
-            self.plam.runetimeError(
-                PlamRuntimeError(e.token, "'continue' used outside loop.")
-            )
+            message = "'continue' used outside loop."
+            self.runtimeError(PlamRuntimeError(e.token, message))
+        self.scheduler.shutdown()
+
+    def runtimeError(self, error: PlamRuntimeError):
+        if self.metrics != None:
+            self.metrics.runtimeErrors += 1
+        self.plam.runtimeError(error)
 
     def stringify(self, obj: object) -> str:
         if obj == None:
@@ -84,13 +178,25 @@ class Interpreter(EVisitor[object], SVisitor[None]):
             return "true"
         if obj == False:
             return "false"
+        if isinstance(obj, PArray):
+            return formatArray(obj, self.stringify)
+        if isinstance(obj, PMap):
+            return formatMap(obj, self.stringify)
         return str(obj)
 
     def evaluate(self, expr: Expr) -> object:
-        return expr.accept(self)
+        return self.visitExpr[expr.kind](expr)
 
     def execute(self, stmt: Stmt) -> None:
-        stmt.accept(self)
+        self.visitStmt[stmt.kind](stmt)
+
+    # Runs a runtime helper shared with compiled code, reporting its errors at
+    # the given token.
+    def runtime(self, token: Token, helper: PyCallable, *args: object) -> object:
+        try:
+            return helper(*args, token.line)
+        except PlamError as e:
+            raise PlamRuntimeError(token, str(e))
 
     def isTruthy(self, obj: object) -> bool:
         if obj == None:
@@ -100,14 +206,18 @@ class Interpreter(EVisitor[object], SVisitor[None]):
         return True
 
     def isEqual(self, left: object, right: object) -> bool:
+        if isinstance(left, PRope):
+            left = str(left)
+        if isinstance(right, PRope):
+            right = str(right)
         if type(left) != type(right):
             return False
         return left == right
 
     def checkNumberOperands(self, operator: Token, *operands: object):
-        if all([isinstance(x, float) for x in operands]):
-            return
-        raise PlamRuntimeError(operator, "Operand must be a number.")
+        for x in operands:
+            if not isinstance(x, float):
+                raise PlamRuntimeError(operator, "Operand must be a number.")
 
     def visitIfStmt(self, stmt: If) -> None:
         if self.isTruthy(self.evaluate(stmt.cond)):
@@ -115,6 +225,16 @@ class Interpreter(EVisitor[object], SVisitor[None]):
         elif stmt.elseBranch != None:
             self.execute(stmt.elseBranch)
 
+    def visitCompareAndBranchStmt(self, stmt: CompareAndBranch) -> None:
+        left = self.evaluate(stmt.left)
+        right = self.evaluate(stmt.right)
+        if not isinstance(left, float) or not isinstance(right, float):
+            raise PlamRuntimeError(stmt.operator, "Operand must be a number.")
+        if stmt.compare(left, right):
+            self.execute(stmt.thenBranch)
+        elif stmt.elseBranch != None:
+            self.execute(stmt.elseBranch)
+
     def visitExpressionStmt(self, stmt: Expression) -> None:
         self.evaluate(stmt.expression)
 
@@ -122,6 +242,41 @@ class Interpreter(EVisitor[object], SVisitor[None]):
         function = PFunction(stmt, self.environment)
         self.environment.define(stmt.name.lexeme, function)
 
+    # Parses a function body a lazy parse skipped, the first time it's called.
+    def parseBody(self, declaration: Function):
+        parseBody(declaration, self.plam)
+        self.shadowed |= localNames([declaration])
+
+    def visitClassStmt(self, stmt: Class) -> None:
+        superclass: Optional[PClass] = None
+        if stmt.superclass != None:
+            value = self.evaluate(stmt.superclass)
+            if not isinstance(value, PClass):
+                raise PlamRuntimeError(
+                    stmt.superclass.name, "Superclass must be a class."
+                )
+            superclass = value
+
+        closure = self.environment
+        if superclass != None:
+            closure = Environment(closure)
+            closure.define("super", superclass)
+        methods = {
+            method.name.lexeme: PFunction(method, closure, method.name.lexeme == "init")
+            for method in stmt.methods
+        }
+        klass = PClass(stmt.name.lexeme, superclass, methods)
+        self.environment.define(stmt.name.lexeme, klass)
+
+    # Generator bodies run in a frame that handles yields itself.
+    def visitYieldStmt(self, stmt: Yield) -> None:
+        raise PlamRuntimeError(stmt.keyword, "Can't yield outside a generator.")
+
+    def visitImportStmt(self, stmt: Import) -> None:
+        module = self.modules.load(stmt)
+        for name, value in module.values().items():
+            self.environment.define(name, value)
+
     def visitBreakStmt(self, stmt: Break) -> None:
         raise BreakLoop(stmt.tok)
 
@@ -136,8 +291,14 @@ class Interpreter(EVisitor[object], SVisitor[None]):
         raise ReturnException(value)
 
     def visitWhileStmt(self, stmt: While) -> None:
+        forever = isinstance(stmt.cond, Literal) and self.isTruthy(stmt.cond.value)
+        budget = self.budget
+        iterations = 0
         try:
-            while self.isTruthy(self.evaluate(stmt.cond)):
+            while forever or self.isTruthy(self.evaluate(stmt.cond)):
+                iterations += 1
+                if budget != None:
+                    budget.step(stmt)
                 try:
                     self.execute(stmt.body)
                 except ContinueLoop:
@@ -147,6 +308,70 @@ class Interpreter(EVisitor[object], SVisitor[None]):
                         self.execute(stmt.post)
         except BreakLoop:
             pass
+        finally:
+            if self.function != None:
+                self.function.backEdges += iterations
+
+    def visitCountedForStmt(self, stmt: CountedFor) -> None:
+        previous = self.environment
+        env = Environment(previous)
+        try:
+            self.environment = env
+            self.execute(stmt.initializer)
+            name = stmt.initializer.name
+            counter = env.get(name)
+            bound = self.evaluate(stmt.bound)
+            if not isinstance(counter, float) or not isinstance(bound, float):
+                self.execute(stmt.loop)
+                return
+
+            compare = stmt.compare
+            step = stmt.step
+            body = stmt.loop.body
+            budget = self.budget
+            iterations = 0
+            try:
+                while compare(counter, bound):
+                    iterations += 1
+                    if budget != None:
+                        budget.step(stmt)
+                    try:
+                        self.execute(body)
+                    except ContinueLoop:
+                        pass
+                    finally:
+                        counter += step
+                        env.define(name.lexeme, counter)
+            except BreakLoop:
+                pass
+            finally:
+                if self.function != None:
+                    self.function.backEdges += iterations
+        finally:
+            self.environment = previous
+
+    def visitForInStmt(self, stmt: ForIn) -> None:
+        iterable = self.evaluate(stmt.iterable)
+        values = cast(list, self.runtime(stmt.keyword, iterate, iterable))
+        name = stmt.name.lexeme
+        budget = self.budget
+        iterations = 0
+        try:
+            for value in values:
+                iterations += 1
+                if budget != None:
+                    budget.step(stmt.keyword)
+                env = Environment(self.environment)
+                env.define(name, value)
+                try:
+                    self.executeBlock([stmt.body], env)
+                except ContinueLoop:
+                    pass
+        except BreakLoop:
+            pass
+        finally:
+            if self.function != None:
+                self.function.backEdges += iterations
 
     def visitVarStmt(self, stmt: Var) -> None:
         value = UNINITIALIZED
@@ -179,8 +404,33 @@ class Interpreter(EVisitor[object], SVisitor[None]):
 
         return self.evaluate(expr.right)
 
+    # A name that is never declared outside the global environment always
+    # resolves to it, so its value is cached on the node until the globals
+    # change.
     def visitVariableExpr(self, expr: Variable) -> object:
-        return self.environment.get(expr.name)
+        globalenv = self.globalenv
+        if expr.version == globalenv.version:
+            return expr.cache
+        if expr.name.lexeme in self.shadowed:
+            return self.environment.get(expr.name)
+        value = globalenv.get(expr.name)
+        expr.cache = value
+        expr.version = globalenv.version
+        return value
+
+    def visitInlineExpr(self, expr: Inline) -> object:
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        # The parameters get a scope of their own, as in a call, so an inlined
+        # call at the top level doesn't define globals.
+        env = Environment(self.environment)
+        for param, arg in zip(expr.params, args):
+            env.define(param.lexeme, arg)
+        previous = self.environment
+        try:
+            self.environment = env
+            return self.evaluate(expr.body)
+        finally:
+            self.environment = previous
 
     def visitLiteralExpr(self, expr: Literal) -> object:
         return expr.value
@@ -193,6 +443,8 @@ class Interpreter(EVisitor[object], SVisitor[None]):
 
         match expr.operator.t:
             case TokenType.MINUS:
+                if isinstance(right, PArray):
+                    return self.runtime(expr.operator, neg, right)
                 self.checkNumberOperands(expr.operator, right)
                 return -cast(float, right)
             case TokenType.BANG:
@@ -216,6 +468,10 @@ class Interpreter(EVisitor[object], SVisitor[None]):
     def visitBinaryExpr(self, expr: Binary) -> object:
         left = self.evaluate(expr.left)
         right = self.evaluate(expr.right)
+        if isinstance(left, PArray) or isinstance(right, PArray):
+            if expr.operator.t in BROADCAST:
+                symbol = BROADCAST[expr.operator.t]
+                return self.runtime(expr.operator, broadcast, symbol, left, right)
 
         match expr.operator.t:
             case TokenType.MINUS:
@@ -227,17 +483,17 @@ class Interpreter(EVisitor[object], SVisitor[None]):
                     raise PlamRuntimeError(expr.operator, "Can't divide by zero.")
                 return cast(float, left) / cast(float, right)
             case TokenType.STAR:
-                if isinstance(left, str) and isinstance(right, float):
+                if isString(left) and isinstance(right, float):
                     if cast(float, right).is_integer():
-                        return str(left) * int(right)
+                        return repeatString(left, int(right))
                     else:
                         raise PlamRuntimeError(
                             expr.operator,
                             "Can't multiply string by non-integer amount.",
                         )
-                if isinstance(right, str) and isinstance(left, float):
+                if isString(right) and isinstance(left, float):
                     if float(left).is_integer():
-                        return str(right) * int(left)
+                        return repeatString(right, int(left))
                     else:
                         raise PlamRuntimeError(
                             expr.operator,
@@ -246,8 +502,8 @@ class Interpreter(EVisitor[object], SVisitor[None]):
                 self.checkNumberOperands(expr.operator, left, right)
                 return cast(float, left) * cast(float, right)
             case TokenType.PLUS:
-                if isinstance(left, str) and isinstance(right, str):
-                    return str(left) + str(right)
+                if isString(left) and isString(right):
+                    return concat(left, right)
                 if isinstance(left, float) and isinstance(right, float):
                     return float(left) + float(right)
                 raise PlamRuntimeError(
@@ -270,16 +526,161 @@ class Interpreter(EVisitor[object], SVisitor[None]):
             case TokenType.EQUALEQ:
                 return self.isEqual(left, right)
 
+    def visitNumBinaryExpr(self, expr: NumBinary) -> object:
+        return expr.op(self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def visitStrConcatExpr(self, expr: StrConcat) -> object:
+        return concat(self.evaluate(expr.left), self.evaluate(expr.right))
+
+    def addToVariable(self, name: Token, operator: Token, delta: float) -> object:
+        env = self.environment.resolve(name)
+        value = env.get(name)
+        if isinstance(value, PArray):
+            value = self.runtime(operator, broadcast, "+", value, delta)
+            env.define(name.lexeme, value)
+            return value
+        if not isinstance(value, float):
+            if operator.t == TokenType.PLUS:
+                raise PlamRuntimeError(
+                    operator, "Operands must be two numbers or two strings."
+                )
+            raise PlamRuntimeError(operator, "Operand must be a number.")
+        value += delta
+        env.define(name.lexeme, value)
+        return value
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> object:
+        return self.addToVariable(expr.name, expr.operator, expr.delta)
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> object:
+        return self.addToVariable(expr.name, expr.operator, expr.delta)
+
     def visitCallExpr(self, expr: Call) -> object:
         callee = self.evaluate(expr.callee)
         args = [self.evaluate(arg) for arg in expr.arguments]
+        return self.call(expr.paren, callee, args)
 
+    def call(self, paren: Token, callee: object, args: list[object]) -> object:
         if not isinstance(callee, Callable):
-            raise RuntimeError(expr.paren, "Can only call functions and classes.")
+            raise PlamRuntimeError(paren, "Can only call functions and classes.")
         function = cast(Callable, callee)
         if len(args) != function.arity():
-            raise RuntimeError(
-                expr.paren,
+            raise PlamRuntimeError(
+                paren,
                 f"Expected {function.arity()} arguments but got {len(args)}.",
             )
-        return function.call(self, args)
+        try:
+            return function.call(self, args)
+        except PlamError as e:
+            # Raised by a builtin, which doesn't know where it was called from.
+            raise PlamRuntimeError(paren, str(e))
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral) -> object:
+        return newArray([self.evaluate(element) for element in expr.elements])
+
+    def visitIndexExpr(self, expr: Index) -> object:
+        target = self.evaluate(expr.object)
+        index = self.evaluate(expr.index)
+        return self.runtime(expr.bracket, getIndex, target, index)
+
+    def visitSetIndexExpr(self, expr: SetIndex) -> object:
+        target = self.evaluate(expr.object)
+        index = self.evaluate(expr.index)
+        value = self.evaluate(expr.value)
+        return self.runtime(expr.bracket, setIndex, target, index, value)
+
+    def visitSliceExpr(self, expr: Slice) -> object:
+        target = self.evaluate(expr.object)
+        start = None if expr.start == None else self.evaluate(expr.start)
+        end = None if expr.end == None else self.evaluate(expr.end)
+        return self.runtime(expr.bracket, getSlice, target, start, end)
+
+    def visitMapLiteralExpr(self, expr: MapLiteral) -> object:
+        pairs = [
+            (self.evaluate(key), self.evaluate(value))
+            for key, value in zip(expr.keys, expr.values)
+        ]
+        return self.runtime(expr.brace, newMap, pairs)
+
+    # Property accesses cache the slot or method they found for the last shape
+    # they saw, and only look the name up again when the shape changes.
+    def cacheProperty(self, expr: Get | Invoke, instance: PInstance):
+        shape = instance.shape
+        slot = shape.slots.get(expr.name.lexeme)
+        if slot != None:
+            expr.slot = slot
+            expr.method = None
+        else:
+            method = shape.klass.methods.get(expr.name.lexeme)
+            if method == None:
+                raise PlamRuntimeError(
+                    expr.name, f"Undefined property '{expr.name.lexeme}'."
+                )
+            expr.method = method
+        expr.shape = shape
+
+    def visitGetExpr(self, expr: Get) -> object:
+        instance = self.evaluate(expr.object)
+        if not isinstance(instance, PInstance):
+            raise PlamRuntimeError(expr.name, "Only instances have properties.")
+        if instance.shape is not expr.shape:
+            self.cacheProperty(expr, instance)
+        if expr.method == None:
+            return instance.fields[expr.slot]
+        return cast(PFunction, expr.method).bind(instance)
+
+    def visitSetExpr(self, expr: Set) -> object:
+        instance = self.evaluate(expr.object)
+        if not isinstance(instance, PInstance):
+            raise PlamRuntimeError(expr.name, "Only instances have fields.")
+        value = self.evaluate(expr.value)
+        shape = instance.shape
+        if shape is not expr.shape:
+            slot = shape.slots.get(expr.name.lexeme)
+            if slot != None:
+                expr.slot = slot
+                expr.next = None
+            else:
+                expr.slot = len(shape.slots)
+                expr.next = shape.withField(expr.name.lexeme)
+            expr.shape = shape
+        if expr.next == None:
+            instance.fields[expr.slot] = value
+        else:
+            instance.fields.append(value)
+            instance.shape = expr.next
+        return value
+
+    def visitThisExpr(self, expr: This) -> object:
+        return self.environment.get(expr.keyword)
+
+    def visitSuperExpr(self, expr: Super) -> object:
+        superclass = cast(PClass, self.environment.get(expr.keyword))
+        instance = self.environment.get(THIS)
+        method = superclass.methods.get(expr.method.lexeme)
+        if method == None:
+            raise PlamRuntimeError(
+                expr.method, f"Undefined property '{expr.method.lexeme}'."
+            )
+        return method.bind(instance)
+
+    # A method call on an instance runs the method without binding it first.
+    def visitInvokeExpr(self, expr: Invoke) -> object:
+        instance = self.evaluate(expr.object)
+        if not isinstance(instance, PInstance):
+            raise PlamRuntimeError(expr.name, "Only instances have properties.")
+        if instance.shape is not expr.shape:
+            self.cacheProperty(expr, instance)
+        method = cast(Optional[PFunction], expr.method)
+        if method == None:
+            callee = instance.fields[expr.slot]
+            args = [self.evaluate(arg) for arg in expr.arguments]
+            return self.call(expr.paren, callee, args)
+
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        if len(args) != method.arity():
+            raise PlamRuntimeError(
+                expr.paren,
+                f"Expected {method.arity()} arguments but got {len(args)}.",
+            )
+        return method.invoke(self, instance, args)
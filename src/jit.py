@@ -0,0 +1,223 @@
+from __future__ import annotations
+import copy
+from typing import TYPE_CHECKING, Callable as PyCallable, Optional
+from budget import limitToken
+from ptoken import Token, TokenType
+from stmt import Function, ForIn, Stmt
+from callable import Callable
+from environment import Environment
+from exceptions import BuildError, PlamRuntimeError
+from transpiler import Transpiler
+from typeinfer import TypeInference, NUM, ANY, literalType
+import pruntime
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+    from pfunction import PFunction
+
+# Number of calls plus loop iterations after which a function is compiled.
+JIT_THRESHOLD = 1000
+
+# Returned by compiled code when its entry guards fail.
+DEOPT = object()
+
+
+def assignEnv(env: Environment, name: Token, value: object) -> object:
+    env.assign(name, value)
+    return value
+
+
+# Compiles a single function body. Variables declared in the function become
+# Python locals; every other name is looked up in the function's closure
+# environment when it is used, exactly as the interpreter would.
+class _FunctionTranspiler(Transpiler):
+    CALL = "callValue"
+
+    constants: dict[str, object]
+    # Whether loops count their iterations against the interpreter's budget.
+    budgeted: bool
+
+    def __init__(self, budgeted: bool = False):
+        super().__init__(True)
+        self.constants = {}
+        self.budgeted = budgeted
+
+    def constant(self, value: object) -> str:
+        name = f"_k{len(self.constants)}"
+        self.constants[name] = value
+        return name
+
+    def freeRead(self, name: Token) -> str:
+        return f"_env.get({self.constant(name)})"
+
+    def freeWrite(self, name: Token, value: str) -> str:
+        return f"assignEnv(_env, {self.constant(name)}, {value})"
+
+    def compile(self, declaration: Function, numbers: list[bool]) -> str:
+        self.resolver.run(declaration, declaration.body, declaration.params)
+        self.function = self.resolver.functions[id(declaration)]
+        declared = self.resolver.declared[id(declaration)]
+        params = [b.pyname for b in declared[: len(declaration.params)]]
+
+        self.line = declaration.name.line
+        self.emit(f"def compiled({', '.join(params)}):")
+        self.indent += 1
+        guards = [f"type({p}) is not float" for p, n in zip(params, numbers) if n]
+        if len(guards) > 0:
+            self.emit(f"if {' or '.join(guards)}:")
+            self.emit("    return DEOPT")
+        self.block(declaration, declaration.body)
+        self.emit("return None")
+        self.indent -= 1
+        return "\n".join(self.lines) + "\n"
+
+    def loopBody(self, loop: Stmt, body: Stmt):
+        if self.budgeted:
+            node = loop.keyword if isinstance(loop, ForIn) else loop
+            self.emit(f"_budget.step({self.constant(limitToken(node))})")
+        super().loopBody(loop, body)
+
+    def visitFunctionStmt(self, stmt: Function):
+        raise BuildError(stmt.name, "Can't compile nested functions.")
+
+
+class _Record:
+    name: str
+    line: int
+    promotions: int
+    guardFailures: int
+    assumptions: str
+    failure: Optional[str]
+
+    def __init__(self, declaration: Function):
+        self.name = declaration.name.lexeme
+        self.line = declaration.name.line
+        self.promotions = 0
+        self.guardFailures = 0
+        self.assumptions = ""
+        self.failure = None
+
+
+# Counts calls and loop iterations of every function and, once a function is
+# hot, compiles its body to Python specialised on the argument types seen so
+# far. Parameters that only ever held numbers are assumed to be numbers; when a
+# call breaks that assumption it runs in the interpreter instead and the
+# function is recompiled later without it.
+class JIT:
+    interpreter: Interpreter
+    threshold: int
+    records: dict[int, _Record]
+
+    def __init__(self, interpreter: Interpreter, threshold: int = JIT_THRESHOLD):
+        self.interpreter = interpreter
+        self.threshold = threshold
+        self.records = {}
+
+    def call(self, function: PFunction, args: list[object]) -> object:
+        compiled = function.compiled
+        if compiled == None:
+            function.calls += 1
+            feedback = function.feedback
+            for i, arg in enumerate(args):
+                feedback[i] |= literalType(arg)
+            if function.calls + function.backEdges >= self.threshold:
+                compiled = self.compile(function)
+            if compiled == None:
+                return self.interpret(function, args)
+
+        try:
+            result = compiled(*args)
+        except pruntime.PlamError as e:
+            token = Token(TokenType.IDENTIFIER, "", None, e.line)
+            raise PlamRuntimeError(token, str(e))
+        if result is DEOPT:
+            self.deoptimize(function, args)
+            return self.interpret(function, args)
+        return result
+
+    def interpret(self, function: PFunction, args: list[object]) -> object:
+        interpreter = self.interpreter
+        previous = interpreter.function
+        interpreter.function = function
+        try:
+            return function.interpret(interpreter, args)
+        finally:
+            interpreter.function = previous
+
+    def record(self, declaration: Function) -> _Record:
+        key = id(declaration)
+        if key not in self.records:
+            self.records[key] = _Record(declaration)
+        return self.records[key]
+
+    def compile(self, function: PFunction) -> Optional[PyCallable]:
+        record = self.record(function.declaration)
+        if record.failure != None:
+            return None
+
+        numbers = [types == NUM for types in function.feedback]
+        # Globals cached on the declaration's nodes are shared with the copy.
+        memo = {id(value): value for value in self.interpreter.globalenv.values()}
+        declaration = copy.deepcopy(function.declaration, memo)
+        paramTypes = [NUM if n else ANY for n in numbers]
+        TypeInference({}).runFunction(declaration, paramTypes)
+        budget = self.interpreter.budget
+        transpiler = _FunctionTranspiler(budget != None)
+        try:
+            source = transpiler.compile(declaration, numbers)
+        except BuildError as e:
+            record.failure = str(e)
+            return None
+
+        namespace = dict(vars(pruntime))
+        namespace.update(transpiler.constants)
+        namespace.update(
+            DEOPT=DEOPT,
+            assignEnv=assignEnv,
+            callValue=self.callValue,
+            _env=function.closure,
+            _budget=budget,
+        )
+        exec(compile(source, f"<jit {record.name}>", "exec"), namespace)
+        function.compiled = namespace["compiled"]
+
+        record.promotions += 1
+        params = function.declaration.params
+        assumed = [p.lexeme for p, n in zip(params, numbers) if n]
+        record.assumptions = ", ".join(f"{name}: number" for name in assumed)
+        return function.compiled
+
+    def deoptimize(self, function: PFunction, args: list[object]):
+        self.record(function.declaration).guardFailures += 1
+        for i, arg in enumerate(args):
+            function.feedback[i] |= literalType(arg)
+        function.compiled = None
+        function.calls = 0
+        function.backEdges = 0
+
+    def callValue(self, callee: object, args: tuple, line: int) -> object:
+        if not isinstance(callee, Callable):
+            raise pruntime.PlamError("Can only call functions and classes.", line)
+        if len(args) != callee.arity():
+            message = f"Expected {callee.arity()} arguments but got {len(args)}."
+            raise pruntime.PlamError(message, line)
+        try:
+            return callee.call(self.interpreter, list(args))
+        except pruntime.PlamError as e:
+            if e.line == None:
+                e.line = line
+            raise
+
+    def report(self) -> list[str]:
+        lines = []
+        for record in self.records.values():
+            where = f"{record.name} (line {record.line})"
+            if record.failure != None:
+                lines.append(f"{where}: not compiled, {record.failure}")
+                continue
+            assumptions = record.assumptions or "no assumptions"
+            lines.append(
+                f"{where}: promoted {record.promotions} time(s), {assumptions}, "
+                f"{record.guardFailures} guard failure(s)"
+            )
+        return lines
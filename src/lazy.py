@@ -0,0 +1,25 @@
+from __future__ import annotations
+import importlib.util
+import sys
+from types import ModuleType
+
+
+# Returns a module that is only loaded when one of its attributes is first
+# used, so features a run doesn't use cost nothing at startup.
+def lazyImport(name: str) -> ModuleType:
+    module = sys.modules.get(name)
+    if module != None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec == None or spec.loader == None:
+        raise ImportError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    # As import does, so `import a.b` elsewhere finds the submodule on `a`.
+    parent, _, child = name.rpartition(".")
+    if parent != "":
+        setattr(sys.modules[parent], child, module)
+    return module
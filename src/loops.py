@@ -0,0 +1,86 @@
+from __future__ import annotations
+import operator
+from typing import Optional
+from ptoken import TokenType
+from expr import (
+    Assignment,
+    Binary,
+    Literal,
+    Variable,
+    IncrementVariable,
+    AddConstToVariable,
+)
+from stmt import Stmt, CountedFor, Expression, Var, While
+from transformer import nameUsage
+
+COMPARISONS = {
+    TokenType.LESS: operator.lt,
+    TokenType.LESSEQ: operator.le,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATEREQ: operator.ge,
+}
+
+
+def _step(name: str, post: Optional[Stmt]) -> Optional[float]:
+    if not isinstance(post, Expression):
+        return None
+    if isinstance(post.expression, (IncrementVariable, AddConstToVariable)):
+        if post.expression.name.lexeme != name:
+            return None
+        return post.expression.delta
+    if not isinstance(post.expression, Assignment):
+        return None
+    assignment = post.expression
+    value = assignment.value
+    if (
+        assignment.name.lexeme != name
+        or not isinstance(value, Binary)
+        or not isinstance(value.left, Variable)
+        or value.left.name.lexeme != name
+        or not isinstance(value.right, Literal)
+        or not isinstance(value.right.value, float)
+    ):
+        return None
+    match value.operator.t:
+        case TokenType.PLUS:
+            return value.right.value
+        case TokenType.MINUS:
+            return -value.right.value
+    return None
+
+
+# Recognises the desugared form of 'for (var i = a; i < n; i = i + k) body'
+# where the body never assigns i and n can't change while the loop runs, so
+# the interpreter can drive the counter with a native loop.
+def countedLoop(initializer: Stmt, loop: While) -> Optional[CountedFor]:
+    if not isinstance(initializer, Var) or initializer.initializer == None:
+        return None
+    name = initializer.name.lexeme
+    cond = loop.cond
+    if (
+        not isinstance(cond, Binary)
+        or cond.operator.t not in COMPARISONS
+        or not isinstance(cond.left, Variable)
+        or cond.left.name.lexeme != name
+    ):
+        return None
+
+    step = _step(name, loop.post)
+    if step == None:
+        return None
+
+    usage = nameUsage(loop.body)
+    if name in usage.assigned:
+        return None
+    bound = cond.right
+    if isinstance(bound, Variable):
+        # Any call could reassign a variable bound from an outer scope, and so
+        # could whoever resumes a generator suspended at a yield.
+        if bound.name.lexeme == name or bound.name.lexeme in usage.assigned:
+            return None
+        if usage.hasCalls or usage.hasYields:
+            return None
+    elif not isinstance(bound, Literal) or not isinstance(bound.value, float):
+        return None
+
+    return CountedFor(initializer, loop, COMPARISONS[cond.operator.t], bound, step)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+import json
+from typing import TYPE_CHECKING, Any, Callable as PyCallable
+from environment import Environment
+from stmt import VISIT_METHODS, Stmt
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+# Node type of each kind of statement, as in visitWhileStmt.
+STATEMENT_TYPES = [
+    name.removeprefix("visit").removesuffix("Stmt") for name in VISIT_METHODS
+]
+
+# Statements that always raise the exception a function or loop catches.
+CONTROL_FLOW = {"Return": "return", "Break": "break", "Continue": "continue"}
+
+FORMATS = ["json", "prometheus"]
+
+
+# Counts what interpreters do, for runs that ask for it. Statements are counted
+# by wrapping an interpreter's dispatch table, so an interpreter without
+# metrics runs exactly as before. Function bodies the JIT has compiled run as
+# Python and only count as calls.
+class Metrics:
+    # Statements executed, by kind.
+    statements: list[int]
+    calls: int
+    runtimeErrors: int
+    outputBytes: int
+    # Value of Environment.created after the last time it was read.
+    base: int
+
+    def __init__(self):
+        self.statements = [0] * len(VISIT_METHODS)
+        self.calls = 0
+        self.runtimeErrors = 0
+        self.outputBytes = 0
+        self.base = next(Environment.created) + 1
+
+    def attach(self, interpreter: Interpreter):
+        interpreter.metrics = self
+        table = interpreter.visitStmt
+        for kind, visit in enumerate(table):
+            table[kind] = self.counting(kind, visit)
+
+    def counting(
+        self, kind: int, visit: PyCallable[[Stmt], None]
+    ) -> PyCallable[[Stmt], None]:
+        statements = self.statements
+
+        def count(stmt: Stmt):
+            statements[kind] += 1
+            visit(stmt)
+
+        return count
+
+    # Environments made by every interpreter since the metrics were.
+    def environments(self) -> int:
+        # Reading the counter advances it, so each read is taken off again.
+        created = next(Environment.created) - self.base
+        self.base += 1
+        return created
+
+    def counters(self) -> dict[str, Any]:
+        statements = {
+            name: count
+            for name, count in zip(STATEMENT_TYPES, self.statements)
+            if count > 0
+        }
+        return {
+            "statements": statements,
+            "calls": self.calls,
+            "environments": self.environments(),
+            "controlFlow": {
+                kind: statements.get(name, 0) for name, kind in CONTROL_FLOW.items()
+            },
+            "runtimeErrors": self.runtimeErrors,
+            "outputBytes": self.outputBytes,
+        }
+
+    def write(self, path: str, format: str):
+        counters = self.counters()
+        with open(path, "w") as f:
+            if format == "prometheus":
+                f.write(prometheus(counters))
+            else:
+                json.dump(counters, f, indent=2)
+                f.write("\n")
+
+
+# The counters in Prometheus's text format.
+def prometheus(counters: dict[str, Any]) -> str:
+    lines: list[str] = []
+
+    def counter(name: str, help: str, values: dict[str, int], label: str = ""):
+        lines.append(f"# HELP plam_{name} {help}")
+        lines.append(f"# TYPE plam_{name} counter")
+        for key, value in values.items():
+            labels = f'{{{label}="{key}"}}' if label else ""
+            lines.append(f"plam_{name}{labels} {value}")
+
+    statements = counters["statements"]
+    counter("statements_total", "Statements executed.", statements, "type")
+    counter("calls_total", "Function calls.", {"": counters["calls"]})
+    environments = {"": counters["environments"]}
+    counter("environments_total", "Environments allocated.", environments)
+    controlFlow = counters["controlFlow"]
+    help = "Return, break and continue exceptions raised."
+    counter("control_flow_exceptions_total", help, controlFlow, "kind")
+    errors = {"": counters["runtimeErrors"]}
+    counter("runtime_errors_total", "Runtime errors reported.", errors)
+    output = {"": counters["outputBytes"]}
+    counter("output_bytes_total", "Bytes printed.", output)
+    return "\n".join(lines) + "\n"
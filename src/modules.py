@@ -0,0 +1,184 @@
+from __future__ import annotations
+import os
+import pickle
+from typing import TYPE_CHECKING, Optional, cast
+from environment import GlobalEnvironment
+from exceptions import PlamRuntimeError
+from pbuiltins import BUILTINS
+from pparser import Parser
+from scanner import Scanner
+from stmt import Stmt, Import
+from transformer import declaredNames, localNames, nameUsage
+from lazy import lazyImport
+
+splitter = lazyImport("splitter")
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+# Parsed modules are cached on disk in this directory next to their source.
+CACHE_DIRECTORY = "__plamcache__"
+# Changed whenever the syntax tree changes shape, so older caches are ignored.
+CACHE_VERSION = 1
+
+# Identifies a version of a source file without reading it.
+Stamp = tuple[int, int]
+
+# Pickled statements of every module parsed by this process, with the stamp of
+# the source they were parsed from. Each load unpickles its own copy, since
+# running a tree caches lookups on its nodes.
+_parsed: dict[str, tuple[Stamp, bytes]] = {}
+
+_BUILTINS: dict[str, object] = {b.name: b.fn for b in BUILTINS}
+
+
+class PModule:
+    path: str
+    environment: GlobalEnvironment
+    # The globals the module declared or imported itself.
+    exports: set[str]
+
+    def __init__(self, path: str, environment: GlobalEnvironment):
+        self.path = path
+        self.environment = environment
+        self.exports = set()
+
+    # The exports' values now, which the module's own functions may have
+    # changed since it ran.
+    def values(self) -> dict[str, object]:
+        items = self.environment.items()
+        return {name: value for name, value in items if name in self.exports}
+
+    def __str__(self) -> str:
+        return f"<module {self.path}>"
+
+
+def stamp(path: str) -> Stamp:
+    status = os.stat(path)
+    return status.st_mtime_ns, status.st_size
+
+
+def cachePath(path: str) -> str:
+    directory, name = os.path.split(path)
+    return os.path.join(directory, CACHE_DIRECTORY, name + ".pickle")
+
+
+def readCache(path: str, current: Stamp) -> Optional[bytes]:
+    try:
+        with open(cachePath(path), "rb") as f:
+            version, cached, data = pickle.load(f)
+    except Exception:
+        return None
+    if version != CACHE_VERSION or cached != current:
+        return None
+    return data
+
+
+# Caching is only an optimisation, so a directory that can't be written to is
+# left alone.
+def writeCache(path: str, current: Stamp, data: bytes):
+    cache = cachePath(path)
+    try:
+        os.makedirs(os.path.dirname(cache), exist_ok=True)
+        temporary = f"{cache}.{os.getpid()}"
+        with open(temporary, "wb") as f:
+            pickle.dump((CACHE_VERSION, current, data), f)
+        os.replace(temporary, cache)
+    except OSError:
+        pass
+
+
+# The interpreter looks globals up directly in its own global environment
+# unless the name is shadowed, so every name a module declares or refers to
+# must be, apart from builtins it leaves alone. Its functions then find them
+# in their closure, which is the module's environment.
+def moduleNames(statements: list[Stmt]) -> set[str]:
+    usage = nameUsage(*statements)
+    declared = declaredNames(statements) | usage.assigned
+    names = (set(usage.refs) - set(_BUILTINS)) | declared
+    return localNames(statements) | names
+
+
+# Loads the modules a script imports. Each is parsed at most once per process,
+# and not at all while its cached parse on disk is up to date, and runs once
+# per interpreter in a global environment of its own.
+class ModuleLoader:
+    interpreter: Interpreter
+    # Imports are relative to the directory of the file being run.
+    directory: str
+    modules: dict[str, PModule]
+    loading: set[str]
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        self.directory = os.getcwd()
+        self.modules = {}
+        self.loading = set()
+
+    def load(self, stmt: Import) -> PModule:
+        name = cast(str, stmt.path.literal)
+        path = os.path.normpath(os.path.join(self.directory, name))
+        module = self.modules.get(path)
+        if module != None:
+            return module
+        if path in self.loading:
+            raise PlamRuntimeError(stmt.path, f"Circular import of '{name}'.")
+
+        statements, names = self.parse(stmt, path)
+        plam = self.interpreter.plam
+        if plam != None and plam.optLevel > 0:
+            statements = plam.optimize(statements)
+            names = moduleNames(statements)
+        module = PModule(path, self.interpreter.builtinEnvironment())
+        self.interpreter.shadowed |= names
+        self.run(module, statements)
+        self.modules[path] = module
+        return module
+
+    # The statements of a module, and the names they use as moduleNames finds
+    # them, which are cached along with them.
+    def parse(self, stmt: Import, path: str) -> tuple[list[Stmt], set[str]]:
+        name = cast(str, stmt.path.literal)
+        try:
+            current = stamp(path)
+        except OSError:
+            raise PlamRuntimeError(stmt.path, f"Can't find module '{name}'.")
+
+        parsed = _parsed.get(path)
+        data = parsed[1] if parsed != None and parsed[0] == current else None
+        if data == None:
+            data = readCache(path, current)
+        if data == None:
+            with open(path, "r") as f:
+                source = f.read()
+            collector = splitter.ErrorCollector()
+            tokens = Scanner(source, collector).scanTokens()
+            statements = Parser(tokens, collector).parse()
+            if len(collector.reports) > 0:
+                report = collector.reports[0]
+                message = (
+                    f"Error in module '{name}' at line {report.line}"
+                    f"{report.where}: {report.message}"
+                )
+                raise PlamRuntimeError(stmt.path, message)
+            data = pickle.dumps((statements, moduleNames(statements)))
+            writeCache(path, current, data)
+        _parsed[path] = (current, data)
+        return pickle.loads(data)
+
+    def run(self, module: PModule, statements: list[Stmt]):
+        interpreter = self.interpreter
+        previous = interpreter.environment, self.directory
+        interpreter.environment = module.environment
+        self.directory = os.path.dirname(module.path)
+        self.loading.add(module.path)
+        try:
+            for statement in statements:
+                interpreter.execute(statement)
+        finally:
+            interpreter.environment, self.directory = previous
+            self.loading.discard(module.path)
+
+        for name, value in module.environment.items():
+            if _BUILTINS.get(name) is not value:
+                module.exports.add(name)
@@ -0,0 +1,27 @@
+from __future__ import annotations
+from stmt import Stmt
+from inliner import Inliner
+from deadcode import DeadCodeEliminator
+from typeinfer import TypeInference
+
+
+class Optimizer:
+    level: int
+    stats: dict[str, int]
+    sharedGlobals: bool
+
+    def __init__(self, level: int, sharedGlobals: bool = False):
+        self.level = level
+        self.stats = {}
+        self.sharedGlobals = sharedGlobals
+
+    def optimize(self, statements: list[Stmt]) -> list[Stmt]:
+        if self.level >= 2:
+            statements = Inliner(self.stats).run(statements)
+        if self.level >= 1:
+            statements = DeadCodeEliminator(self.stats).run(statements)
+            statements = TypeInference(self.stats, self.sharedGlobals).run(statements)
+        return statements
+
+    def report(self) -> str:
+        return ", ".join(f"{name}: {count}" for name, count in self.stats.items())
@@ -0,0 +1,244 @@
+from __future__ import annotations
+import copy
+from typing import TYPE_CHECKING, NamedTuple, Optional
+from budget import Budget
+from callable import Callable
+from exceptions import PlamRuntimeError
+from expr import Expr, Get, Invoke, Set, Super, This, Variable
+from pclass import PClass
+from pfunction import PFunction
+from ptoken import Token, TokenType
+from pruntime import BoolKey, PArray, PMap, PRope, PlamError, newArray
+from stmt import Function, Stmt
+from transformer import Transformer, localNames, nameUsage
+from lazy import lazyImport
+
+futures = lazyImport("concurrent.futures")
+jit = lazyImport("jit")
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+# Inputs are sent to the workers in about this many batches per worker.
+BATCHES_PER_WORKER = 4
+
+
+# Everything a worker needs to rebuild a function: copies of the declarations
+# it can reach, and the values of the names they capture. The function that
+# is mapped is declared under its own name like the rest. Workers run under
+# the same limits as the parent, each counting its own steps.
+class Shipment(NamedTuple):
+    name: str
+    functions: dict[str, Function]
+    values: dict[str, object]
+    jitThreshold: Optional[int]
+    budget: Optional[Budget]
+
+
+class _Outcome(NamedTuple):
+    value: object
+    error: Optional[str]
+    line: Optional[int]
+    # Runtime errors are raised again in the parent as the same kind.
+    kind: type = PlamRuntimeError
+
+
+# Copies a declaration without the lookups its nodes have cached, which may
+# refer to anything in the parent process, and notes what it uses.
+class _Copier(Transformer):
+    interpreter: Interpreter
+    method: Optional[Token]
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        self.method = None
+
+    def copy(self, declaration: Function) -> Function:
+        memo = {id(declaration.pending): declaration.pending}
+        function = copy.deepcopy(declaration, memo)
+        self.stmt(function)
+        return function
+
+    def visitFunctionStmt(self, stmt: Function) -> Optional[Stmt]:
+        if stmt.pending != None:
+            self.interpreter.parseBody(stmt)
+        return super().visitFunctionStmt(stmt)
+
+    def visitVariableExpr(self, expr: Variable) -> Expr:
+        expr.cache = None
+        expr.version = 0
+        return expr
+
+    def visitGetExpr(self, expr: Get) -> Expr:
+        expr.shape = expr.method = None
+        return super().visitGetExpr(expr)
+
+    def visitSetExpr(self, expr: Set) -> Expr:
+        expr.shape = expr.next = None
+        return super().visitSetExpr(expr)
+
+    def visitInvokeExpr(self, expr: Invoke) -> Expr:
+        expr.shape = expr.method = None
+        return super().visitInvokeExpr(expr)
+
+    def visitThisExpr(self, expr: This) -> Expr:
+        self.method = expr.keyword
+        return expr
+
+    def visitSuperExpr(self, expr: Super) -> Expr:
+        self.method = expr.keyword
+        return expr
+
+
+# Collects a function and everything it captures, refusing anything a worker
+# couldn't reproduce exactly: mutable values, builtins with side effects, and
+# functions that assign to what they capture.
+class _Packer:
+    interpreter: Interpreter
+    shipment: Shipment
+    seen: dict[str, object]
+
+    def __init__(self, interpreter: Interpreter, function: PFunction):
+        self.interpreter = interpreter
+        name = function.declaration.name.lexeme
+        self.shipment = Shipment(name, {}, {}, None, None)
+        self.seen = {}
+        self.add(name, function)
+
+    def add(self, name: str, value: object):
+        if name in self.seen:
+            if self.seen[name] is not value and self.seen[name] != value:
+                raise PlamError(f"pmap can't ship two values named '{name}'.", None)
+            return
+        self.seen[name] = value
+
+        if isinstance(value, PFunction):
+            self.addFunction(name, value)
+        elif isinstance(value, PClass):
+            raise PlamError(f"pmap can't ship class '{name}'.", None)
+        elif isinstance(value, Callable):
+            # Builtins hold no state, so the worker gets an equal copy.
+            if value.sideEffects:
+                message = f"pmap can't ship '{name}', which has side effects."
+                raise PlamError(message, None)
+            self.shipment.values[name] = value
+        elif value == None or isinstance(value, (float, bool, str)):
+            self.shipment.values[name] = value
+        elif isinstance(value, PRope):
+            self.shipment.values[name] = str(value)
+        else:
+            message = f"pmap can't ship '{name}', which holds mutable state."
+            raise PlamError(message, None)
+
+    def addFunction(self, name: str, function: PFunction):
+        copier = _Copier(self.interpreter)
+        declaration = copier.copy(function.declaration)
+        if copier.method != None:
+            raise PlamError("pmap can't ship methods.", None)
+        self.shipment.functions[name] = declaration
+
+        locals = localNames([declaration])
+        usage = nameUsage(declaration)
+        for assigned in usage.assigned - locals:
+            message = f"pmap can't ship '{name}', which assigns to '{assigned}'."
+            raise PlamError(message, None)
+        for free in set(usage.refs) - locals:
+            if free == name:
+                continue
+            try:
+                value = function.closure.get(Token(TokenType.IDENTIFIER, free, None, 0))
+            except PlamRuntimeError:
+                # Left for the worker to report, as the interpreter would.
+                continue
+            self.add(free, value)
+
+
+# Copies an input or result into a form that can be sent between processes,
+# or refuses it.
+def portable(value: object, memo: dict[int, object]) -> object:
+    if value == None or isinstance(value, (float, bool, str, BoolKey)):
+        return value
+    if isinstance(value, PRope):
+        return str(value)
+    if id(value) in memo:
+        return memo[id(value)]
+    if isinstance(value, PArray):
+        if not isinstance(value.items, list):
+            result = PArray(value.items[:])
+            memo[id(value)] = result
+            return result
+        array = PArray([])
+        memo[id(value)] = array
+        array.items.extend(portable(item, memo) for item in value.items)
+        return array
+    if isinstance(value, PMap):
+        map = PMap({})
+        memo[id(value)] = map
+        for key, item in value.items.items():
+            map.items[portable(key, memo)] = portable(item, memo)
+        return map
+    message = "pmap can only pass numbers, strings, booleans, null, arrays and maps."
+    raise PlamError(message, None)
+
+
+# The function a worker maps, set up once per process.
+_function: Optional[PFunction] = None
+_interpreter: Optional[Interpreter] = None
+
+
+def _start(interpreterClass: type, shipment: Shipment):
+    global _function, _interpreter
+    interpreter = interpreterClass(None)
+    if shipment.budget != None:
+        interpreter.budget = shipment.budget.share()
+    if shipment.jitThreshold != None:
+        interpreter.jit = jit.JIT(interpreter, shipment.jitThreshold)
+    globalenv = interpreter.globalenv
+    for name, value in shipment.values.items():
+        globalenv.define(name, value)
+    for name, declaration in shipment.functions.items():
+        globalenv.define(name, PFunction(declaration, globalenv))
+    interpreter.shadowed |= localNames(list(shipment.functions.values()))
+    _interpreter = interpreter
+    _function = globalenv.get(Token(TokenType.IDENTIFIER, shipment.name, None, 0))
+
+
+def _apply(value: object) -> _Outcome:
+    assert _function != None and _interpreter != None
+    try:
+        result = _function.call(_interpreter, [value])
+        return _Outcome(portable(result, {}), None, None)
+    except PlamRuntimeError as e:
+        return _Outcome(None, str(e), e.token.line, type(e))
+    except PlamError as e:
+        return _Outcome(None, str(e), e.line)
+
+
+# Calls a pure one-argument function on every input in a pool of worker
+# processes, each with its own interpreter, and returns the results in order.
+def parallelMap(
+    interpreter: Interpreter, function: PFunction, inputs: PArray, jobs: int
+) -> PArray:
+    packer = _Packer(interpreter, function)
+    compiler = interpreter.jit
+    shipment = packer.shipment._replace(
+        jitThreshold=compiler.threshold if compiler != None else None,
+        budget=interpreter.budget,
+    )
+    values = [portable(value, {}) for value in inputs.items]
+    workers = max(min(jobs, len(values)), 1)
+    batch = max(len(values) // (workers * BATCHES_PER_WORKER), 1)
+    with futures.ProcessPoolExecutor(
+        workers, initializer=_start, initargs=(type(interpreter), shipment)
+    ) as pool:
+        outcomes = list(pool.map(_apply, values, chunksize=batch))
+
+    results: list[object] = []
+    for outcome in outcomes:
+        if outcome.error != None and outcome.line == None:
+            raise PlamError(outcome.error, None)
+        if outcome.error != None:
+            token = Token(TokenType.IDENTIFIER, "", None, outcome.line)
+            raise outcome.kind(token, outcome.error)
+        results.append(outcome.value)
+    return newArray(results)
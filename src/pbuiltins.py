@@ -1,7 +1,15 @@
 from __future__ import annotations
 import time
 from callable import Callable
-from typing import TYPE_CHECKING, NamedTuple
+from scheduler import PTask, PChannel
+from pgenerator import PGenerator, DONE
+from pfunction import PFunction
+from parallel import parallelMap
+import pruntime
+from typing import TYPE_CHECKING, NamedTuple, cast
+from lazy import lazyImport
+
+asyncio = lazyImport("asyncio")
 
 if TYPE_CHECKING:
     from interpreter import Interpreter
@@ -24,11 +32,16 @@ class Clock(Callable):
 
 
 class Print(Callable):
+    sideEffects = True
+
     def arity(self) -> int:
         return 1
 
     def call(self, interpreter: Interpreter, args: list[object]) -> object:
-        print(interpreter.stringify(args[0]))
+        text = interpreter.stringify(args[0])
+        print(text)
+        if interpreter.metrics != None:
+            interpreter.metrics.outputBytes += len(text.encode()) + 1
         return None
 
     def __str__(self) -> str:
@@ -36,18 +49,257 @@ class Print(Callable):
 
 
 class Input(Callable):
+    sideEffects = True
+
     def arity(self) -> int:
         return 1
 
     def call(self, interpreter: Interpreter, args: list[object]) -> object:
-        return input(interpreter.stringify(args[0]))
+        prompt = interpreter.stringify(args[0])
+        # Read on another thread so tasks keep running while this one waits.
+        return interpreter.scheduler.wait(asyncio.to_thread(input, prompt))
 
     def __str__(self) -> str:
         return "<native fn input>"
 
 
+class Len(Callable):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        return pruntime.length(args[0], None)
+
+    def __str__(self) -> str:
+        return "<native fn len>"
+
+
+class Push(Callable):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        pruntime.push(args[0], args[1], None)
+        return None
+
+    def __str__(self) -> str:
+        return "<native fn push>"
+
+
+class Has(Callable):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        return pruntime.hasKey(args[0], args[1], None)
+
+    def __str__(self) -> str:
+        return "<native fn has>"
+
+
+class Delete(Callable):
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        pruntime.deleteKey(args[0], args[1], None)
+        return None
+
+    def __str__(self) -> str:
+        return "<native fn delete>"
+
+
+class Keys(Callable):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        return pruntime.mapKeys(args[0], None)
+
+    def __str__(self) -> str:
+        return "<native fn keys>"
+
+
+class Next(Callable):
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        generator = args[0]
+        if not isinstance(generator, PGenerator):
+            raise pruntime.PlamError("Can only call next on generators.", None)
+        value = generator.next()
+        return None if value is DONE else value
+
+    def __str__(self) -> str:
+        return "<native fn next>"
+
+
+class Spawn(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        callee, arguments = args
+        if not isinstance(callee, Callable):
+            raise pruntime.PlamError("Can only spawn functions and classes.", None)
+        if not isinstance(arguments, pruntime.PArray):
+            raise pruntime.PlamError("Arguments to spawn must be an array.", None)
+        values = list(arguments.items)
+        if len(values) != callee.arity():
+            message = f"Expected {callee.arity()} arguments but got {len(values)}."
+            raise pruntime.PlamError(message, None)
+        return interpreter.scheduler.spawn(callee, values)
+
+    def __str__(self) -> str:
+        return "<native fn spawn>"
+
+
+class Await(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        task = args[0]
+        if not isinstance(task, PTask):
+            raise pruntime.PlamError("Can only await tasks.", None)
+        return interpreter.scheduler.wait(interpreter.scheduler.join(task), True)
+
+    def __str__(self) -> str:
+        return "<native fn await>"
+
+
+class Sleep(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        ms = args[0]
+        if type(ms) is not float or ms < 0:
+            raise pruntime.PlamError("Sleep time must be a non-negative number.", None)
+        interpreter.scheduler.wait(asyncio.sleep(ms / 1000))
+        return None
+
+    def __str__(self) -> str:
+        return "<native fn sleep>"
+
+
+class Channel(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        capacity = args[0]
+        if type(capacity) is not float or capacity < 0 or capacity % 1 != 0:
+            message = "Channel capacity must be a non-negative integer."
+            raise pruntime.PlamError(message, None)
+        return PChannel(int(capacity))
+
+    def __str__(self) -> str:
+        return "<native fn channel>"
+
+
+class Send(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        channel, value = args
+        if not isinstance(channel, PChannel):
+            raise pruntime.PlamError("Can only send to channels.", None)
+        interpreter.scheduler.wait(channel.queue.put(value), True)
+        return None
+
+    def __str__(self) -> str:
+        return "<native fn send>"
+
+
+class Receive(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 1
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        channel = args[0]
+        if not isinstance(channel, PChannel):
+            raise pruntime.PlamError("Can only receive from channels.", None)
+        return interpreter.scheduler.wait(channel.queue.get(), True)
+
+    def __str__(self) -> str:
+        return "<native fn receive>"
+
+
+class ParallelMap(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 2
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        function, inputs = args
+        if not isinstance(function, PFunction) or function.arity() != 1:
+            raise pruntime.PlamError("pmap needs a function of one argument.", None)
+        if not isinstance(inputs, pruntime.PArray):
+            raise pruntime.PlamError("pmap inputs must be an array.", None)
+        return parallelMap(interpreter, function, inputs, interpreter.plam.jobs)
+
+    def __str__(self) -> str:
+        return "<native fn pmap>"
+
+
+# The run's counters as a map, or null when it isn't keeping any.
+class Stats(Callable):
+    sideEffects = True
+
+    def arity(self) -> int:
+        return 0
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        if interpreter.metrics == None:
+            return None
+        return countersMap(interpreter.metrics.counters())
+
+    def __str__(self) -> str:
+        return "<native fn stats>"
+
+
+def countersMap(values: dict[str, object]) -> pruntime.PMap:
+    items: dict[object, object] = {}
+    for key, value in values.items():
+        if isinstance(value, dict):
+            items[key] = countersMap(value)
+        else:
+            items[key] = float(cast(int, value))
+    return pruntime.PMap(items)
+
+
 BUILTINS: list[BUILTIN] = [
     BUILTIN(Clock(), "clock"),
     BUILTIN(Print(), "print"),
     BUILTIN(Input(), "input"),
+    BUILTIN(Len(), "len"),
+    BUILTIN(Push(), "push"),
+    BUILTIN(Has(), "has"),
+    BUILTIN(Delete(), "delete"),
+    BUILTIN(Keys(), "keys"),
+    BUILTIN(Next(), "next"),
+    BUILTIN(Spawn(), "spawn"),
+    BUILTIN(Await(), "await"),
+    BUILTIN(Sleep(), "sleep"),
+    BUILTIN(Channel(), "channel"),
+    BUILTIN(Send(), "send"),
+    BUILTIN(Receive(), "receive"),
+    BUILTIN(ParallelMap(), "pmap"),
+    BUILTIN(Stats(), "stats"),
 ]
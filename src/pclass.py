@@ -0,0 +1,80 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Optional
+from callable import Callable
+from pfunction import PFunction
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+
+# The layout of an instance: which slot of its field list holds each field.
+# Instances of a class that get the same fields in the same order share a
+# shape, so a property access that has seen a shape once can reuse what it
+# found for every later instance with that shape.
+class Shape:
+    klass: PClass
+    slots: dict[str, int]
+    transitions: dict[str, Shape]
+
+    def __init__(self, klass: PClass, slots: dict[str, int]):
+        self.klass = klass
+        self.slots = slots
+        self.transitions = {}
+
+    def withField(self, name: str) -> Shape:
+        shape = self.transitions.get(name)
+        if shape == None:
+            slots = dict(self.slots)
+            slots[name] = len(slots)
+            shape = Shape(self.klass, slots)
+            self.transitions[name] = shape
+        return shape
+
+    # Copies of a node share the shapes in its inline cache.
+    def __deepcopy__(self, memo: dict) -> Shape:
+        return self
+
+
+class PInstance:
+    __slots__ = ("shape", "fields")
+    shape: Shape
+    fields: list[object]
+
+    def __init__(self, shape: Shape):
+        self.shape = shape
+        self.fields = []
+
+    def __str__(self) -> str:
+        return f"{self.shape.klass.name} instance"
+
+
+class PClass(Callable):
+    name: str
+    superclass: Optional[PClass]
+    # Own and inherited methods, so looking one up never walks the hierarchy.
+    methods: dict[str, PFunction]
+    # Shape of a new instance, before it has any fields.
+    shape: Shape
+
+    def __init__(
+        self, name: str, superclass: Optional[PClass], methods: dict[str, PFunction]
+    ):
+        self.name = name
+        self.superclass = superclass
+        self.methods = dict(superclass.methods) if superclass != None else {}
+        self.methods.update(methods)
+        self.shape = Shape(self, {})
+
+    def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        instance = PInstance(self.shape)
+        initializer = self.methods.get("init")
+        if initializer != None:
+            initializer.invoke(interpreter, instance, args)
+        return instance
+
+    def arity(self) -> int:
+        initializer = self.methods.get("init")
+        return initializer.arity() if initializer != None else 0
+
+    def __str__(self) -> str:
+        return self.name
@@ -1,34 +1,128 @@
 from __future__ import annotations
 from environment import Environment
 from callable import Callable
-from typing import TYPE_CHECKING
+from ptoken import Token, TokenType
+from typing import TYPE_CHECKING, Callable as PyCallable, Optional
 from exceptions import ReturnException
+from pgenerator import PGenerator
 
 if TYPE_CHECKING:
     from interpreter import Interpreter
     from stmt import Function
 
+THIS = Token(TokenType.THIS, "this", None, 0)
+
 
 class PFunction(Callable):
     declaration: Function
     closure: Environment
+    initializer: bool
+    # Profile kept by the JIT.
+    calls: int
+    backEdges: int
+    feedback: list[int]
+    compiled: Optional[PyCallable]
 
-    def __init__(self, declaration: Function, closure: Environment):
+    def __init__(
+        self, declaration: Function, closure: Environment, initializer: bool = False
+    ):
         self.declaration = declaration
         self.closure = closure
+        self.initializer = initializer
+        self.calls = 0
+        self.backEdges = 0
+        self.feedback = [0] * len(declaration.params)
+        self.compiled = None
+
+    # Compiled code can't be saved, so a saved function starts unprofiled.
+    def __getstate__(self) -> dict[str, object]:
+        state = dict(self.__dict__)
+        state.update(calls=0, backEdges=0, compiled=None)
+        state["feedback"] = [0] * len(self.declaration.params)
+        return state
 
     def call(self, interpreter: Interpreter, args: list[object]) -> object:
+        if self.declaration.pending != None:
+            interpreter.parseBody(self.declaration)
+        if interpreter.metrics != None:
+            interpreter.metrics.calls += 1
+        budget = interpreter.budget
+        if budget == None:
+            return self.run(interpreter, args)
+        budget.enter(self.declaration.name)
+        try:
+            return self.run(interpreter, args)
+        finally:
+            budget.calls -= 1
+
+    def run(self, interpreter: Interpreter, args: list[object]) -> object:
+        if self.declaration.generator:
+            return PGenerator(interpreter, self, self.parameters(self.closure, args))
+        if interpreter.jit != None and not self.initializer:
+            return interpreter.jit.call(self, args)
+        return self.interpret(interpreter, args)
+
+    def interpret(self, interpreter: Interpreter, args: list[object]) -> object:
+        env = self.parameters(self.closure, args)
+        try:
+            interpreter.executeBlock(self.declaration.body, env)
+        except ReturnException as e:
+            if not self.initializer:
+                return e.value
+        if self.initializer:
+            return self.closure.get(THIS)
+        return None
+
+    def parameters(self, closure: Environment, args: list[object]) -> Environment:
+        env = Environment(closure)
+        for param, arg in zip(self.declaration.params, args):
+            env.define(param.lexeme, arg)
+        return env
+
+    def bind(self, instance: object) -> PFunction:
         env = Environment(self.closure)
+        env.define("this", instance)
+        return PFunction(self.declaration, env, self.initializer)
+
+    # Calls a method on an instance without creating a bound method first.
+    def invoke(
+        self, interpreter: Interpreter, instance: object, args: list[object]
+    ) -> object:
+        if self.declaration.pending != None:
+            interpreter.parseBody(self.declaration)
+        if interpreter.metrics != None:
+            interpreter.metrics.calls += 1
+        budget = interpreter.budget
+        if budget == None:
+            return self.runMethod(interpreter, instance, args)
+        budget.enter(self.declaration.name)
+        try:
+            return self.runMethod(interpreter, instance, args)
+        finally:
+            budget.calls -= 1
+
+    def runMethod(
+        self, interpreter: Interpreter, instance: object, args: list[object]
+    ) -> object:
+        env = Environment(self.closure)
+        env.define("this", instance)
         for param, arg in zip(self.declaration.params, args):
             env.define(param.lexeme, arg)
+        if self.declaration.generator:
+            return PGenerator(interpreter, self, env)
         try:
             interpreter.executeBlock(self.declaration.body, env)
         except ReturnException as e:
-            return e.value
-        return None
+            if not self.initializer:
+                return e.value
+        return instance if self.initializer else None
 
     def arity(self) -> int:
         return len(self.declaration.params)
 
     def __str__(self) -> str:
         return f"<fn {self.declaration.name.lexeme}>"
+
+    # Copies of a node share the methods in its inline cache.
+    def __deepcopy__(self, memo: dict) -> PFunction:
+        return self
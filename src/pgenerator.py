@@ -0,0 +1,211 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Callable as PyCallable, Iterable, Iterator, Optional
+from environment import Environment
+from exceptions import PlamRuntimeError, ReturnException, BreakLoop, ContinueLoop
+from expr import Literal
+from ptoken import Token, TokenType
+from stmt import (
+    Stmt,
+    Block,
+    CompareAndBranch,
+    CountedFor,
+    ForIn,
+    If,
+    While,
+    Yield,
+)
+from pruntime import PIterable, PlamError, iterate
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+    from pfunction import PFunction
+
+# Returned by next once a generator has finished.
+DONE = object()
+
+
+# Runs a generator body so it can be suspended at any yield. Statements that
+# can hold one are walked here as Python generators, which keep their place
+# between resumptions; everything else runs in the interpreter as usual.
+class _Frame:
+    interpreter: Interpreter
+    compound: dict[type, PyCallable[[Stmt], Iterator[object]]]
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        self.compound = {
+            Block: self.runBlock,
+            If: self.runIf,
+            CompareAndBranch: self.runCompareAndBranch,
+            While: self.runWhile,
+            CountedFor: self.runCountedFor,
+            ForIn: self.runForIn,
+            Yield: self.runYield,
+        }
+
+    def run(self, stmt: Stmt) -> Iterable[object]:
+        compound = self.compound.get(type(stmt))
+        if compound == None:
+            self.interpreter.execute(stmt)
+            return ()
+        if self.interpreter.metrics != None:
+            self.interpreter.metrics.statements[stmt.kind] += 1
+        return compound(stmt)
+
+    # Unlike Interpreter.executeBlock, this doesn't restore the environment
+    # when an exception passes through, since the generator may be closed by
+    # the garbage collector in the middle of someone else's code. Loops that
+    # catch break and continue restore it themselves.
+    def block(self, stmts: list[Stmt], env: Environment) -> Iterator[object]:
+        interpreter = self.interpreter
+        previous = interpreter.environment
+        interpreter.environment = env
+        for stmt in stmts:
+            yield from self.run(stmt)
+        interpreter.environment = previous
+
+    def runBlock(self, stmt: Block) -> Iterator[object]:
+        env = Environment(self.interpreter.environment)
+        yield from self.block(stmt.statements, env)
+
+    def runIf(self, stmt: If) -> Iterator[object]:
+        interpreter = self.interpreter
+        if interpreter.isTruthy(interpreter.evaluate(stmt.cond)):
+            yield from self.run(stmt.thenBranch)
+        elif stmt.elseBranch != None:
+            yield from self.run(stmt.elseBranch)
+
+    def runCompareAndBranch(self, stmt: CompareAndBranch) -> Iterator[object]:
+        interpreter = self.interpreter
+        left = interpreter.evaluate(stmt.left)
+        right = interpreter.evaluate(stmt.right)
+        if not isinstance(left, float) or not isinstance(right, float):
+            raise PlamRuntimeError(stmt.operator, "Operand must be a number.")
+        if stmt.compare(left, right):
+            yield from self.run(stmt.thenBranch)
+        elif stmt.elseBranch != None:
+            yield from self.run(stmt.elseBranch)
+
+    # Runs one iteration of a loop body, returning whether it ended in break.
+    def iteration(self, body: Iterable[object]) -> Iterator[object]:
+        interpreter = self.interpreter
+        env = interpreter.environment
+        try:
+            yield from body
+        except ContinueLoop:
+            interpreter.environment = env
+        except BreakLoop:
+            interpreter.environment = env
+            return True
+        return False
+
+    def runWhile(self, stmt: While) -> Iterator[object]:
+        interpreter = self.interpreter
+        forever = isinstance(stmt.cond, Literal) and interpreter.isTruthy(
+            stmt.cond.value
+        )
+        while forever or interpreter.isTruthy(interpreter.evaluate(stmt.cond)):
+            if interpreter.budget != None:
+                interpreter.budget.step(stmt)
+            broke = yield from self.iteration(self.run(stmt.body))
+            if stmt.post != None:
+                interpreter.execute(stmt.post)
+            if broke:
+                break
+
+    def runCountedFor(self, stmt: CountedFor) -> Iterator[object]:
+        interpreter = self.interpreter
+        previous = interpreter.environment
+        env = Environment(previous)
+        interpreter.environment = env
+        interpreter.execute(stmt.initializer)
+        name = stmt.initializer.name
+        counter = env.get(name)
+        bound = interpreter.evaluate(stmt.bound)
+        if not isinstance(counter, float) or not isinstance(bound, float):
+            yield from self.runWhile(stmt.loop)
+        else:
+            while stmt.compare(counter, bound):
+                if interpreter.budget != None:
+                    interpreter.budget.step(stmt)
+                broke = yield from self.iteration(self.run(stmt.loop.body))
+                counter += stmt.step
+                env.define(name.lexeme, counter)
+                if broke:
+                    break
+        interpreter.environment = previous
+
+    def runForIn(self, stmt: ForIn) -> Iterator[object]:
+        interpreter = self.interpreter
+        iterable = interpreter.evaluate(stmt.iterable)
+        values = interpreter.runtime(stmt.keyword, iterate, iterable)
+        for value in values:
+            if interpreter.budget != None:
+                interpreter.budget.step(stmt.keyword)
+            env = Environment(interpreter.environment)
+            env.define(stmt.name.lexeme, value)
+            if (yield from self.iteration(self.block([stmt.body], env))):
+                break
+
+    def runYield(self, stmt: Yield) -> Iterator[object]:
+        value = None
+        if stmt.value != None:
+            value = self.interpreter.evaluate(stmt.value)
+        yield value
+
+
+# The value of a call to a function that yields. Its body runs a step at a
+# time, up to the next yield, each time a value is asked for.
+class PGenerator(PIterable):
+    __slots__ = ("interpreter", "function", "frame", "environment", "running")
+    interpreter: Interpreter
+    function: PFunction
+    frame: Optional[Iterator[object]]
+    # Innermost environment of the body where it last stopped.
+    environment: Environment
+    running: bool
+
+    def __init__(self, interpreter: Interpreter, function: PFunction, env: Environment):
+        self.interpreter = interpreter
+        self.function = function
+        self.frame = _Frame(interpreter).block(function.declaration.body, env)
+        self.environment = env
+        self.running = False
+
+    def next(self) -> object:
+        if self.frame == None:
+            return DONE
+        if self.running:
+            raise PlamError("Generator is already running.", None)
+        interpreter = self.interpreter
+        environment, function = interpreter.environment, interpreter.function
+        interpreter.environment = self.environment
+        interpreter.function = None
+        self.running = True
+        try:
+            value = next(self.frame)
+            self.environment = interpreter.environment
+            return value
+        except (StopIteration, ReturnException):
+            self.frame = None
+            return DONE
+        except BaseException:
+            self.frame = None
+            raise
+        finally:
+            self.running = False
+            interpreter.environment, interpreter.function = environment, function
+
+    # Values for a for-in loop, which reports errors at its own line.
+    def values(self, line: int) -> Iterator[object]:
+        while True:
+            if self.running:
+                token = Token(TokenType.IDENTIFIER, "", None, line)
+                raise PlamRuntimeError(token, "Generator is already running.")
+            value = self.next()
+            if value is DONE:
+                return
+            yield value
+
+    def __str__(self) -> str:
+        return f"<generator {self.function.declaration.name.lexeme}>"
@@ -1,49 +1,232 @@
 #!/usr/bin/env python
 
+from __future__ import annotations
+import atexit
+import copy
+import os
 import sys
+import time
+from typing import TYPE_CHECKING, Optional, cast
 from scanner import Scanner
 from ptoken import Token, TokenType
 from stmt import Stmt, Expression
 from pparser import Parser
-from ast_printer import AstPrinter
 from interpreter import Interpreter
-from exceptions import PlamRuntimeError
+from budget import Budget
+from exceptions import PlamRuntimeError, BuildError
+from pruntime import PlamError
+from lazy import lazyImport
+
+# Only loaded by the runs that use them.
+json = lazyImport("json")
+ast_printer = lazyImport("ast_printer")
+optimizer = lazyImport("optimizer")
+transpiler = lazyImport("transpiler")
+jit = lazyImport("jit")
+splitter = lazyImport("splitter")
+batch = lazyImport("batch")
+incremental = lazyImport("incremental")
+snapshot = lazyImport("snapshot")
+metrics = lazyImport("metrics")
+
+if TYPE_CHECKING:
+    from incremental import IncrementalParser
+    from metrics import Metrics
+
+# Seconds between checks for changes to a watched script.
+WATCH_INTERVAL = 0.1
+
+# Options limiting a run, and the attributes they set.
+LIMITS = {
+    "--max-steps": "maxSteps",
+    "--max-time": "maxTime",
+    "--max-depth": "maxDepth",
+    "--max-memory": "maxMemory",
+}
 
 
 class Plam:
     hadError = False
     hadRuntimeError = False
     interpreter: Interpreter
+    optLevel: int = 0
+    optReport: bool = False
+    output: Optional[str] = None
+    jitThreshold: Optional[int] = None
+    jitStats: bool = False
+    parallelParse: bool = False
+    jobs: int = os.cpu_count() or 1
+    watch: bool = False
+    strict: bool = False
+    # Loop iterations and calls, milliseconds, call depth and megabytes.
+    maxSteps: Optional[int] = None
+    maxTime: Optional[int] = None
+    maxDepth: Optional[int] = None
+    maxMemory: Optional[int] = None
+    # Where to write the counters when plam exits, and in which format.
+    metrics: Optional[str] = None
+    metricsFormat: str = "json"
+    counters: Optional[Metrics] = None
+    batch: Optional[str] = None
+    summary: Optional[str] = None
+    snapshot: Optional[str] = None
+    fromSnapshot: Optional[str] = None
 
     def __init__(self):
         Plam.interpreter = Interpreter(self)
 
     def main(self):
         args = sys.argv[1::]
-        if len(args) > 1:
-            print("Usage: plam [script]")
-            exit(64)
-        elif len(args) == 1:
-            self.runFile(args[0])
+        command = args.pop(0) if len(args) > 0 and args[0] == "build" else None
+        scripts: list[str] = []
+        while len(args) > 0:
+            arg = args.pop(0)
+            match arg:
+                case "-O0" | "-O1" | "-O2":
+                    self.optLevel = int(arg[2:])
+                case "--opt-report":
+                    self.optReport = True
+                case "-o" if command == "build" and len(args) > 0:
+                    self.output = args.pop(0)
+                case "--jit":
+                    self.jitThreshold = self.jitThreshold or jit.JIT_THRESHOLD
+                case _ if arg.startswith("--jit-threshold="):
+                    value = arg.removeprefix("--jit-threshold=")
+                    if not value.isdigit():
+                        self.usage()
+                    self.jitThreshold = int(value)
+                case _ if arg.partition("=")[0] in LIMITS:
+                    option, _, value = arg.partition("=")
+                    if not value.isdigit():
+                        self.usage()
+                    setattr(self, LIMITS[option], int(value))
+                case "--parallel-parse":
+                    self.parallelParse = True
+                case "-j" if len(args) > 0 and args[0].isdigit():
+                    self.jobs = max(int(args.pop(0)), 1)
+                case "--watch" if command == None:
+                    self.watch = True
+                case "--strict":
+                    self.strict = True
+                case "--batch" if command == None and len(args) > 0:
+                    self.batch = args.pop(0)
+                case "--summary" if len(args) > 0:
+                    self.summary = args.pop(0)
+                case "--snapshot" if command == None and len(args) > 0:
+                    self.snapshot = args.pop(0)
+                case "--from-snapshot" if len(args) > 0:
+                    self.fromSnapshot = args.pop(0)
+                case "--metrics" if len(args) > 0:
+                    self.metrics = args.pop(0)
+                case _ if arg.startswith("--metrics-format="):
+                    self.metricsFormat = arg.removeprefix("--metrics-format=")
+                    if self.metricsFormat not in metrics.FORMATS:
+                        self.usage()
+                case "--jit-stats":
+                    self.jitStats = True
+                    self.jitThreshold = self.jitThreshold or jit.JIT_THRESHOLD
+                case _ if arg.startswith("-"):
+                    self.usage()
+                case _:
+                    scripts.append(arg)
+        if self.metrics != None and command == None and self.batch == None:
+            self.counters = metrics.Metrics()
+            atexit.register(self.writeMetrics)
+        self.newInterpreter()
+
+        if len(scripts) > 1 or (self.watch and len(scripts) == 0):
+            self.usage()
+        elif self.snapshot != None and (len(scripts) == 0 or self.watch or self.batch):
+            self.usage()
+        elif self.metrics != None and self.counters == None:
+            self.usage()
+        elif self.batch != None:
+            if len(scripts) > 0 or self.watch:
+                self.usage()
+            self.runBatch(self.batch)
+        elif command == "build":
+            if len(scripts) == 0:
+                self.usage()
+            self.buildFile(scripts[0])
+        elif self.watch:
+            self.watchFile(scripts[0])
+        elif len(scripts) == 1:
+            self.runFile(scripts[0])
         else:
             self.runPrompt()
 
-    def run(self, source: str, repl: bool = False):
+    def usage(self):
+        print(
+            "Usage: plam [-O0|-O1|-O2] [--opt-report] [--parallel-parse] [-j N]\n"
+            "            [--jit] [--jit-threshold=N] [--jit-stats] [--strict]\n"
+            "            [--max-steps=N] [--max-time=ms] [--max-depth=N]\n"
+            "            [--max-memory=MB] [--metrics file]\n"
+            "            [--metrics-format=json|prometheus] [--watch]\n"
+            "            [--from-snapshot file] [script]"
+        )
+        print("       plam build [-O0|-O1|-O2] [--parallel-parse] script [-o output]")
+        print("       plam --batch dir [-j N] [--summary file] [options]")
+        print("       plam --snapshot file [options] script")
+        exit(64)
+
+    def newInterpreter(self):
+        Plam.interpreter = Interpreter(self)
+        if self.jitThreshold != None:
+            self.interpreter.jit = jit.JIT(self.interpreter, self.jitThreshold)
+        limits = (self.maxSteps, self.maxTime, self.maxDepth, self.maxMemory)
+        if any(limit != None for limit in limits):
+            self.interpreter.budget = Budget(
+                self.maxSteps,
+                None if self.maxTime == None else self.maxTime / 1000,
+                self.maxDepth,
+                None if self.maxMemory == None else self.maxMemory * 1024 * 1024,
+            )
+        if self.counters != None:
+            self.counters.attach(self.interpreter)
+        if self.fromSnapshot != None:
+            try:
+                snapshot.loadSnapshot(self.interpreter, self.fromSnapshot)
+            except (OSError, PlamError) as e:
+                message = f"{e.strerror}." if isinstance(e, OSError) else str(e)
+                path = self.fromSnapshot
+                print(f"Can't load snapshot '{path}': {message}", file=sys.stderr)
+                exit(66)
+
+    def parse(self, source: str, repl: bool = False, lazy: bool = False) -> list[Stmt]:
+        if self.parallelParse and not repl:
+            return splitter.parseParallel(source, self, self.jobs)
         scanner = Scanner(source, self)
         toks: list[Token] = scanner.scanTokens()
         # for t in toks:
         #     print(f"({t.t} {t.lexeme})", end=" ")
         # print()
         # print()
-        parser = Parser(toks, self)
-        statements: list[Stmt] = parser.parse()
+        parser = Parser(toks, self, lazy)
+        return parser.parse()
+
+    def optimize(self, statements: list[Stmt]) -> list[Stmt]:
+        # Functions restored from a snapshot may assign the script's globals.
+        passes = optimizer.Optimizer(self.optLevel, self.fromSnapshot != None)
+        statements = passes.optimize(statements)
+        if self.optReport:
+            print(f"[optimizer] {passes.report()}", file=sys.stderr)
+        return statements
+
+    def run(self, source: str, repl: bool = False):
+        # Unless the whole script has to be checked or optimised up front,
+        # function bodies are parsed the first time they're called.
+        lazy = not repl and not self.strict and self.optLevel == 0
+        statements = self.parse(source, repl, lazy)
 
         if Plam.hadError:
             return
 
+        if not repl and self.optLevel > 0:
+            statements = self.optimize(statements)
+
         # for stmt in statements:
         #     if isinstance(stmt, Expression):
-        #         print(AstPrinter().print(stmt.expression))
+        #         print(ast_printer.AstPrinter().print(stmt.expression))
 
         if repl:
             for s in statements:
@@ -55,7 +238,7 @@ class Plam:
                             )
                         )
                     except PlamRuntimeError as e:
-                        self.runtimeError(e)
+                        self.interpreter.runtimeError(e)
                 else:
                     self.interpreter.interpret([s])
         else:
@@ -81,13 +264,120 @@ class Plam:
         Plam.hadError = True
 
     def runFile(self, filename: str):
+        status = self.runScript(filename)
+        if status == 0 and self.snapshot != None:
+            self.saveSnapshot(self.snapshot)
+        if status != 0:
+            exit(status)
+
+    # Writes the counters of every interpreter the process ran.
+    def writeMetrics(self):
+        assert self.counters != None and self.metrics != None
+        try:
+            self.counters.write(self.metrics, self.metricsFormat)
+        except OSError as e:
+            message = f"Can't write metrics '{self.metrics}': {e.strerror}."
+            print(message, file=sys.stderr)
+
+    # Saves the globals a script left behind, for later runs to start from.
+    def saveSnapshot(self, path: str):
+        try:
+            snapshot.saveSnapshot(self.interpreter, path)
+        except PlamError as e:
+            print(e, file=sys.stderr)
+            exit(70)
+
+    # Runs a script and returns the status plam exits with for it.
+    def runScript(self, filename: str) -> int:
+        Plam.hadError = False
+        Plam.hadRuntimeError = False
+        self.interpreter.modules.directory = os.path.dirname(os.path.abspath(filename))
         with open(filename, "r") as f:
             self.run(f.read())
 
+        if self.jitStats:
+            for line in self.interpreter.jit.report():
+                print(f"[jit] {line}", file=sys.stderr)
         if Plam.hadError:
-            exit(65)
+            return 65
         if Plam.hadRuntimeError:
-            exit(70)
+            return 70
+        return 0
+
+    # Runs every script under a directory in worker processes and writes a
+    # JSON summary of how each went, with what it printed.
+    def runBatch(self, directory: str):
+        summary = batch.runBatch(self, directory, self.jobs)
+        if self.summary != None:
+            with open(self.summary, "w") as f:
+                json.dump(summary, f, indent=2)
+        else:
+            json.dump(summary, sys.stdout, indent=2)
+            print()
+        status = batch.batchStatus(summary)
+        if status != 0:
+            exit(status)
+
+    # Re-runs a script every time it changes, re-parsing only the declarations
+    # that were edited.
+    def watchFile(self, filename: str):
+        parser = incremental.IncrementalParser(self)
+        modified = None
+        while True:
+            try:
+                mtime = os.stat(filename).st_mtime_ns
+                if mtime != modified:
+                    modified = mtime
+                    with open(filename, "r") as f:
+                        self.rerun(parser, filename, f.read())
+                time.sleep(WATCH_INTERVAL)
+            except OSError:
+                time.sleep(WATCH_INTERVAL)
+            except KeyboardInterrupt:
+                break
+
+    def rerun(self, parser: IncrementalParser, filename: str, source: str):
+        Plam.hadError = False
+        Plam.hadRuntimeError = False
+        start = time.perf_counter()
+        statements = cast(list[Stmt], parser.update(source))
+        elapsed = (time.perf_counter() - start) * 1000
+        print(
+            f"[watch] {filename}: parsed {parser.parsed} of "
+            f"{parser.declarations()} declarations in {elapsed:.2f} ms",
+            file=sys.stderr,
+        )
+        if Plam.hadError:
+            return
+
+        # The optimizer rewrites the tree in place, and unchanged declarations
+        # are reused by the next run.
+        if self.optLevel > 0:
+            statements = self.optimize(copy.deepcopy(statements))
+        self.newInterpreter()
+        self.interpreter.modules.directory = os.path.dirname(os.path.abspath(filename))
+        self.interpreter.interpret(statements)
+        sys.stdout.flush()
+
+    def buildFile(self, filename: str):
+        with open(filename, "r") as f:
+            statements = self.parse(f.read())
+        if Plam.hadError:
+            exit(65)
+        if self.optLevel > 0:
+            statements = self.optimize(statements)
+
+        try:
+            module = transpiler.Transpiler().build(
+                statements, os.path.basename(filename)
+            )
+        except BuildError as e:
+            self.tok_error(e.token, str(e))
+            exit(65)
+
+        output = self.output or os.path.splitext(filename)[0] + ".py"
+        with open(output, "w") as f:
+            f.write(module)
 
     def runPrompt(self):
         while True:
@@ -11,8 +11,20 @@ from expr import (
     Variable,
     Assignment,
     Call,
+    IncrementVariable,
+    AddConstToVariable,
+    ArrayLiteral,
+    Index,
+    SetIndex,
+    Slice,
+    MapLiteral,
+    Get,
+    Set,
+    This,
+    Super,
+    Invoke,
 )
-from typing import Callable, Self, Optional, cast, Any
+from typing import Callable, Optional, cast, Any
 from stmt import (
     Stmt,
     Expression,
@@ -24,20 +36,92 @@ from stmt import (
     Break,
     Continue,
     Return,
+    CompareAndBranch,
+    ForIn,
+    Class,
+    Yield,
+    Import,
 )
 
+from loops import countedLoop, COMPARISONS
 from exceptions import ParseError, BreakOutsideLoop
 
 
+# The tokens of a function body that a lazy parse skipped, from just after its
+# opening brace up to its closing one, and what the parser knew at that point.
+class LazyBody:
+    tokens: list[Token]
+    start: int
+    end: int
+    classes: list[bool]
+    initializer: bool
+    # The tokens of a body loaded from a snapshot, as tuples, until they are
+    # needed.
+    packed: Optional[list[tuple[int, str, object, int]]]
+
+    def __init__(
+        self,
+        tokens: list[Token],
+        start: int,
+        end: int,
+        classes: list[bool],
+        initializer: bool,
+        packed: Optional[list[tuple[int, str, object, int]]] = None,
+    ):
+        self.tokens = tokens
+        self.start = start
+        self.end = end
+        self.classes = classes
+        self.initializer = initializer
+        self.packed = packed
+
+    # Copies of a declaration share its tokens.
+    def __deepcopy__(self, memo: dict) -> LazyBody:
+        return self
+
+    # Saved as just the tokens of the body, as tuples, which load much faster
+    # than tokens do.
+    def __reduce__(self) -> tuple:
+        packed = self.packed
+        if packed == None:
+            packed = [
+                (t.t.value, t.lexeme, t.literal, t.line) for t in self.bodyTokens()
+            ]
+        args = ([], 0, len(packed) - 1, self.classes, self.initializer, packed)
+        return LazyBody, args
+
+    def bodyTokens(self) -> list[Token]:
+        if self.packed != None:
+            self.tokens = [Token(TokenType(t), *fields) for t, *fields in self.packed]
+            self.packed = None
+        return self.tokens[self.start : self.end + 1]
+
+
 class Parser:
     tokens: list[Token]
     current: int
     plam: Any
-
-    def __init__(self, tokens: list[Token], plam):
+    errors: int
+    # One entry per enclosing class body, true if that class has a superclass.
+    classes: list[bool]
+    initializer: bool
+    # Whether the function being parsed has yielded, or None outside functions.
+    generator: Optional[bool]
+    # Whether function bodies are only brace-matched, to be parsed when called.
+    lazy: bool
+    # How many blocks enclose the declaration being parsed.
+    depth: int
+
+    def __init__(self, tokens: list[Token], plam, lazy: bool = False):
         self.current = 0
         self.tokens = tokens
         self.plam = plam
+        self.errors = 0
+        self.classes = []
+        self.initializer = False
+        self.generator = None
+        self.lazy = lazy
+        self.depth = 0
 
     def peek(self) -> Token:
         return self.tokens[self.current]
@@ -53,6 +137,10 @@ class Parser:
             return False
         return self.peek().t == t
 
+    def checkNext(self, t: TokenType, distance: int) -> bool:
+        index = self.current + distance
+        return index < len(self.tokens) and self.tokens[index].t == t
+
     def advance(self) -> Token:
         if not self.isAtEnd():
             self.current += 1
@@ -68,6 +156,7 @@ class Parser:
 
     def error(self, token: Token, message: str) -> ParseError:
         self.plam.tok_error(token, message)
+        self.errors += 1
         return ParseError()
 
     def consume(self, t: TokenType, message: str) -> Token:
@@ -91,6 +180,7 @@ class Parser:
                     | TokenType.IF
                     | TokenType.WHILE
                     | TokenType.RETURN
+                    | TokenType.IMPORT
                 ):
                     return
 
@@ -98,15 +188,40 @@ class Parser:
 
     def declaration(self) -> Optional[Stmt]:
         try:
+            if self.match(TokenType.CLASS):
+                return self.classDeclaration()
             if self.match(TokenType.FN):
                 return self.function("function")
             if self.match(TokenType.VAR):
                 return self.varDeclaration()
+            if self.match(TokenType.IMPORT):
+                return self.importDeclaration()
             return self.statement()
         except ParseError:
             self.synchronise()
             return None
 
+    def classDeclaration(self) -> Stmt:
+        name = self.consume(TokenType.IDENTIFIER, "Expected class name.")
+        superclass: Optional[Variable] = None
+        if self.match(TokenType.LESS):
+            superclass = Variable(
+                self.consume(TokenType.IDENTIFIER, "Expected superclass name.")
+            )
+            if superclass.name.lexeme == name.lexeme:
+                self.error(superclass.name, "A class can't inherit from itself.")
+
+        self.consume(TokenType.LBRACE, "Expected '{' before class body.")
+        methods: list[Function] = []
+        self.classes.append(superclass != None)
+        try:
+            while not self.check(TokenType.RBRACE) and not self.isAtEnd():
+                methods.append(self.function("method"))
+        finally:
+            self.classes.pop()
+        self.consume(TokenType.RBRACE, "Expected '}' after class body.")
+        return Class(name, superclass, methods)
+
     def varDeclaration(self) -> Stmt:
         name: Token = self.consume(TokenType.IDENTIFIER, "Expected variable name.")
 
@@ -123,6 +238,8 @@ class Parser:
             return self.ifStatement()
         if self.match(TokenType.RETURN):
             return self.returnStatement()
+        if self.match(TokenType.YIELD):
+            return self.yieldStatement()
         if self.match(TokenType.WHILE):
             return self.whileStatement()
         if self.match(TokenType.LBRACE):
@@ -137,16 +254,31 @@ class Parser:
 
         return self.expressionStatement()
 
+    def importDeclaration(self) -> Stmt:
+        keyword = self.previous()
+        if self.depth > 0:
+            self.error(keyword, "Can only import at the top level of a script.")
+        path = self.consume(TokenType.STRING, "Expected module path after 'import'.")
+        self.consume(TokenType.SEMICOLON, "Expected ';' after module path.")
+        return Import(keyword, path)
+
     def block(self) -> list[Stmt]:
         statements: list[Stmt] = []
-        while not self.check(TokenType.RBRACE) and not self.isAtEnd():
-            statements.append(cast(Stmt, self.declaration()))
+        self.depth += 1
+        try:
+            while not self.check(TokenType.RBRACE) and not self.isAtEnd():
+                statements.append(cast(Stmt, self.declaration()))
+        finally:
+            self.depth -= 1
 
         self.consume(TokenType.RBRACE, "Expected '}' after block.")
         return statements
 
     def forStatement(self) -> Stmt:
+        keyword = self.previous()
         self.consume(TokenType.LPAREN, "Expected '(' after 'for'.")
+        if self.check(TokenType.VAR) and self.checkNext(TokenType.IN, 2):
+            return self.forInStatement()
 
         initializer: Optional[Stmt]
         if self.match(TokenType.SEMICOLON):
@@ -162,21 +294,36 @@ class Parser:
         self.consume(TokenType.SEMICOLON, "Expected ';' after loop condition.")
 
         increment: Optional[Expr] = None
-        if not self.check(TokenType.SEMICOLON):
+        if not self.check(TokenType.RPAREN):
             increment = self.expression()
         self.consume(TokenType.RPAREN, "Expected ')' after for clauses.")
 
+        errors = self.errors
         body = self.statement()
         if condition == None:
             condition = Literal(True)
-        body = While(
-            condition, body, Expression(increment) if increment != None else None
-        )
+        post = Expression(increment) if increment != None else None
+        body = While(keyword, condition, body, post)
+        # A body with syntax errors has holes where its statements should be.
         if initializer != None:
+            counted = None
+            if self.errors == errors:
+                counted = countedLoop(initializer, body)
+            if counted != None:
+                return counted
             body = Block([initializer, body])
 
         return body
 
+    def forInStatement(self) -> Stmt:
+        self.advance()
+        name = self.consume(TokenType.IDENTIFIER, "Expected variable name.")
+        keyword = self.advance()
+        iterable = self.expression()
+        self.consume(TokenType.RPAREN, "Expected ')' after for clauses.")
+        body = self.statement()
+        return ForIn(name, keyword, iterable, body)
+
     def ifStatement(self) -> Stmt:
         self.consume(TokenType.LPAREN, "Expected '(' after 'if'.")
         expr = self.expression()
@@ -187,6 +334,15 @@ class Parser:
         if self.match(TokenType.ELSE):
             elseBranch = self.statement()
 
+        if isinstance(expr, Binary) and expr.operator.t in COMPARISONS:
+            return CompareAndBranch(
+                expr.left,
+                expr.operator,
+                expr.right,
+                COMPARISONS[expr.operator.t],
+                thenBranch,
+                elseBranch,
+            )
         return If(expr, thenBranch, elseBranch)
 
     def returnStatement(self) -> Stmt:
@@ -194,17 +350,34 @@ class Parser:
         value: Optional[Expr] = None
         if not self.check(TokenType.SEMICOLON):
             value = self.expression()
+            if self.initializer:
+                self.error(keyword, "Can't return a value from an initializer.")
 
         self.consume(TokenType.SEMICOLON, "Expected ';' after return value.")
         return Return(keyword, value)
 
+    def yieldStatement(self) -> Stmt:
+        keyword = self.previous()
+        if self.generator == None:
+            self.error(keyword, "Can't yield outside a function.")
+        elif self.initializer:
+            self.error(keyword, "Can't yield from an initializer.")
+        else:
+            self.generator = True
+        value: Optional[Expr] = None
+        if not self.check(TokenType.SEMICOLON):
+            value = self.expression()
+        self.consume(TokenType.SEMICOLON, "Expected ';' after yield value.")
+        return Yield(keyword, value)
+
     def whileStatement(self) -> Stmt:
+        keyword = self.previous()
         self.consume(TokenType.LPAREN, "Expected '(' after 'while'.")
         cond = self.expression()
         self.consume(TokenType.RPAREN, "Expected ')' after while condition.")
         body = self.statement()
 
-        return While(cond, body)
+        return While(keyword, cond, body)
 
     def expressionStatement(self) -> Stmt:
         expr = self.expression()
@@ -229,8 +402,39 @@ class Parser:
         self.consume(TokenType.RPAREN, f"Expected ')' after parameters.")
 
         self.consume(TokenType.LBRACE, "Expected '{' before " + kind + " body.")
-        body = self.block()
-        return Function(name, params, body)
+        initializer = kind == "method" and name.lexeme == "init"
+        if self.lazy:
+            end = self.matchingBrace()
+            if end != None:
+                start = self.current
+                self.current = end + 1
+                pending = LazyBody(
+                    self.tokens, start, end, list(self.classes), initializer
+                )
+                return Function(name, params, [], pending)
+
+        enclosing = self.initializer, self.generator
+        self.initializer, self.generator = initializer, False
+        try:
+            body = self.block()
+            generator = self.generator == True
+        finally:
+            self.initializer, self.generator = enclosing
+        return Function(name, params, body, None, generator)
+
+    # Index of the brace closing the block whose opening brace was just
+    # consumed, or None if the block is never closed.
+    def matchingBrace(self) -> Optional[int]:
+        depth = 1
+        for i in range(self.current, len(self.tokens)):
+            t = self.tokens[i].t
+            if t == TokenType.LBRACE:
+                depth += 1
+            elif t == TokenType.RBRACE:
+                depth -= 1
+                if depth == 0:
+                    return i
+        return None
 
     def expression(self) -> Expr:
         return self.assignment()
@@ -252,25 +456,26 @@ class Parser:
                 name = expr.name
                 match equals.t:
                     case TokenType.EQUAL:
+                        if (
+                            isinstance(value, Binary)
+                            and isinstance(value.left, Variable)
+                            and value.left.name.lexeme == name.lexeme
+                            and self.isNumberLiteral(value.right)
+                        ):
+                            fused = self.addConst(name, value.operator, value.right)
+                            if fused != None:
+                                return fused
                         return Assignment(name, value)
                     case TokenType.PLUSEQ:
-                        return Assignment(
-                            name,
-                            Binary(
-                                expr,
-                                Token(TokenType.PLUS, "+=", None, name.line),
-                                value,
-                            ),
-                        )
+                        op = Token(TokenType.PLUS, "+=", None, name.line)
+                        if self.isNumberLiteral(value):
+                            return cast(Expr, self.addConst(name, op, value))
+                        return Assignment(name, Binary(expr, op, value))
                     case TokenType.MINUSEQ:
-                        return Assignment(
-                            name,
-                            Binary(
-                                expr,
-                                Token(TokenType.MINUS, "-=", None, name.line),
-                                value,
-                            ),
-                        )
+                        op = Token(TokenType.MINUS, "-=", None, name.line)
+                        if self.isNumberLiteral(value):
+                            return cast(Expr, self.addConst(name, op, value))
+                        return Assignment(name, Binary(expr, op, value))
                     case TokenType.STAREQ:
                         return Assignment(
                             name,
@@ -290,6 +495,11 @@ class Parser:
                             ),
                         )
 
+            if isinstance(expr, Index) and equals.t == TokenType.EQUAL:
+                return SetIndex(expr.object, expr.bracket, expr.index, value)
+            if isinstance(expr, Get) and equals.t == TokenType.EQUAL:
+                return Set(expr.object, expr.name, value)
+
             self.error(equals, "Invalid assignment target.")
 
         if self.match(TokenType.PLUSEQ):
@@ -304,8 +514,22 @@ class Parser:
 
         return expr
 
+    def isNumberLiteral(self, expr: Expr) -> bool:
+        return isinstance(expr, Literal) and isinstance(expr.value, float)
+
+    def addConst(
+        self, name: Token, operator: Token, value: Expr
+    ) -> Optional[AddConstToVariable]:
+        delta = cast(float, cast(Literal, value).value)
+        match operator.t:
+            case TokenType.PLUS:
+                return AddConstToVariable(name, operator, delta)
+            case TokenType.MINUS:
+                return AddConstToVariable(name, operator, -delta)
+        return None
+
     def ternary(self) -> Expr:
-        expr = self.logic_or()
+        expr = self.binary(1)
         if self.match(TokenType.QMARK):
             first = self.ternary()
             self.consume(TokenType.COLON, "Expected ':' after '?'")
@@ -314,105 +538,61 @@ class Parser:
 
         return expr
 
-    def logic_or(self) -> Expr:
-        expr = self.logic_and()
-
-        while self.match(TokenType.OR):
-            op = self.previous()
-            right = self.logic_and()
-            expr = Logical(expr, op, right)
-
-        return expr
-
-    def logic_and(self) -> Expr:
-        expr = self.equality()
-
-        while self.match(TokenType.AND):
-            op = self.previous()
-            right = self.equality()
-            expr = Logical(expr, op, right)
-
-        return expr
-
-    def _create_left_assoc_binary(
-        self, types: list[TokenType], expr: Callable[[Self], Expr]
-    ):
-        e = expr(self)
-
-        while self.match(*types):
-            op = self.previous()
-            right = expr(self)
-            e = Binary(e, op, right)
-
-        return e
-
-    def equality(self) -> Expr:
-        return self._create_left_assoc_binary(
-            [TokenType.BANGEQ, TokenType.EQUALEQ], Parser.comparison
-        )
-
-    def comparison(self) -> Expr:
-        return self._create_left_assoc_binary(
-            [TokenType.GREATER, TokenType.GREATEREQ, TokenType.LESS, TokenType.LESSEQ],
-            Parser.term,
-        )
-
-    def term(self) -> Expr:
-        return self._create_left_assoc_binary(
-            [TokenType.MINUS, TokenType.PLUS],
-            Parser.factor,
-        )
-
-    def factor(self) -> Expr:
-        return self._create_left_assoc_binary(
-            [TokenType.SLASH, TokenType.STAR],
-            Parser.unary,
-        )
+    # Parses a chain of binary operators that bind at least as tightly as
+    # 'precedence'. Operators of the same level are folded into the tree by
+    # the loop, so only a tighter operator on the right recurses.
+    def binary(self, precedence: int) -> Expr:
+        expr = self.unary()
+        while True:
+            op = self.peek()
+            level = BINARY_PRECEDENCE.get(op.t, 0)
+            if level < precedence:
+                return expr
+            self.advance()
+            right = self.binary(level + 1)
+            if op.t == TokenType.OR or op.t == TokenType.AND:
+                expr = Logical(expr, op, right)
+            else:
+                expr = Binary(expr, op, right)
 
     def unary(self) -> Expr:
+        operators: list[Token] = []
+        while self.peek().t == TokenType.BANG or self.peek().t == TokenType.MINUS:
+            operators.append(self.advance())
+
         if self.match(TokenType.MINUSMINUS):
             if self.match(TokenType.IDENTIFIER):
-                return Assignment(
+                expr: Expr = IncrementVariable(
                     self.previous(),
-                    Binary(
-                        Variable(self.previous()),
-                        Token(TokenType.MINUS, "-", None, self.previous().line),
-                        Literal(1.0),
-                    ),
+                    Token(TokenType.MINUS, "-", None, self.previous().line),
+                    -1.0,
                 )
             else:
                 raise self.error(self.peek(), "Expected identified after '--'.")
-
         elif self.match(TokenType.PLUSPLUS):
             if self.match(TokenType.IDENTIFIER):
-                return Assignment(
+                expr = IncrementVariable(
                     self.previous(),
-                    Binary(
-                        Variable(self.previous()),
-                        Token(TokenType.PLUS, "+", None, self.previous().line),
-                        Literal(1.0),
-                    ),
+                    Token(TokenType.PLUS, "+", None, self.previous().line),
+                    1.0,
                 )
             else:
                 raise self.error(self.peek(), "Expected identified after '++'.")
+        else:
+            expr = self.call()
 
-        elif self.match(TokenType.BANG, TokenType.MINUS):
-            op = self.previous()
-            right = self.unary()
-            return Unary(op, right)
-
-        return self.call()
+        for op in reversed(operators):
+            expr = Unary(op, expr)
+        return expr
 
     def call(self) -> Expr:
         expr = self.primary()
-
         while True:
-            if self.match(TokenType.LPAREN):
-                expr = self.finishCall(expr)
-            else:
-                break
-
-        return expr
+            parselet = POSTFIX.get(self.peek().t)
+            if parselet == None:
+                return expr
+            self.advance()
+            expr = parselet(self, expr)
 
     def finishCall(self, callee: Expr) -> Expr:
         args: list[Expr] = []
@@ -424,31 +604,148 @@ class Parser:
                 args.append(self.expression())
         paren = self.consume(TokenType.RPAREN, "Expected ')' after arguments.")
 
+        if isinstance(callee, Get):
+            return Invoke(callee.object, callee.name, paren, args)
         return Call(callee, paren, args)
 
+    def finishIndex(self, target: Expr) -> Expr:
+        bracket = self.previous()
+        start: Optional[Expr] = None
+        if not self.check(TokenType.COLON):
+            start = self.expression()
+        if self.match(TokenType.COLON):
+            end: Optional[Expr] = None
+            if not self.check(TokenType.RBRACKET):
+                end = self.expression()
+            self.consume(TokenType.RBRACKET, "Expected ']' after slice.")
+            return Slice(target, bracket, start, end)
+        self.consume(TokenType.RBRACKET, "Expected ']' after index.")
+        return Index(target, bracket, cast(Expr, start))
+
+    def finishGet(self, target: Expr) -> Expr:
+        name = self.consume(TokenType.IDENTIFIER, "Expected property name after '.'.")
+        return Get(target, name)
+
     def primary(self) -> Expr:
-        if self.match(TokenType.FALSE):
-            return Literal(False)
-        if self.match(TokenType.TRUE):
-            return Literal(True)
-        if self.match(TokenType.NULL):
-            return Literal(None)
+        token = self.peek()
+        parselet = PREFIX.get(token.t)
+        if parselet == None:
+            raise self.error(token, "Expected expression.")
+        self.advance()
+        return parselet(self, token)
+
+    def literal(self, token: Token) -> Expr:
+        return Literal(token.literal)
 
-        if self.match(TokenType.NUMBER, TokenType.STRING):
-            return Literal(self.previous().literal)
+    def variable(self, token: Token) -> Expr:
+        return Variable(token)
 
-        if self.match(TokenType.IDENTIFIER):
-            return Variable(self.previous())
+    def this(self, token: Token) -> Expr:
+        if len(self.classes) == 0:
+            self.error(token, "Can't use 'this' outside of a class.")
+        return This(token)
 
-        if self.match(TokenType.LPAREN):
-            expr = self.expression()
-            self.consume(TokenType.RPAREN, "Expected ')' after expression.")
-            return Grouping(expr)
+    def superMethod(self, keyword: Token) -> Expr:
+        if len(self.classes) == 0:
+            self.error(keyword, "Can't use 'super' outside of a class.")
+        elif not self.classes[-1]:
+            self.error(keyword, "Can't use 'super' in a class with no superclass.")
+        self.consume(TokenType.DOT, "Expected '.' after 'super'.")
+        method = self.consume(TokenType.IDENTIFIER, "Expected superclass method name.")
+        return Super(keyword, method)
 
-        raise self.error(self.peek(), "Expected expression.")
+    def grouping(self, paren: Token) -> Expr:
+        expr = self.expression()
+        self.consume(TokenType.RPAREN, "Expected ')' after expression.")
+        return Grouping(expr)
+
+    def arrayLiteral(self, bracket: Token) -> Expr:
+        elements: list[Expr] = []
+        if not self.check(TokenType.RBRACKET):
+            elements.append(self.expression())
+            while self.match(TokenType.COMMA):
+                elements.append(self.expression())
+        self.consume(TokenType.RBRACKET, "Expected ']' after array elements.")
+        return ArrayLiteral(bracket, elements)
+
+    # Only reached in expression position; a '{' that starts a statement is a
+    # block.
+    def mapLiteral(self, brace: Token) -> Expr:
+        keys: list[Expr] = []
+        values: list[Expr] = []
+        if not self.check(TokenType.RBRACE):
+            while True:
+                keys.append(self.expression())
+                self.consume(TokenType.COLON, "Expected ':' after map key.")
+                values.append(self.expression())
+                if not self.match(TokenType.COMMA):
+                    break
+        self.consume(TokenType.RBRACE, "Expected '}' after map entries.")
+        return MapLiteral(brace, keys, values)
 
     def parse(self) -> list[Stmt]:
         stmts: list[Stmt] = []
         while not self.isAtEnd():
             stmts.append(cast(Stmt, self.declaration()))
         return stmts
+
+
+# Parses the body of a function declared by a lazy parse, reporting syntax
+# errors in it through plam. Raises ParseError if there were any.
+def parseBody(declaration: Function, plam) -> list[Stmt]:
+    pending = cast(LazyBody, declaration.pending)
+    tokens = pending.bodyTokens()
+    tokens.append(Token(TokenType.EOF, "", None, tokens[-1].line))
+    parser = Parser(tokens, plam, True)
+    parser.classes = pending.classes
+    parser.initializer = pending.initializer
+    parser.generator = False
+    body = parser.block()
+    if parser.errors > 0:
+        raise ParseError()
+    declaration.body = body
+    declaration.pending = None
+    declaration.generator = parser.generator == True
+    return body
+
+
+# How tightly each binary operator binds; operators missing from the table end
+# a binary expression.
+BINARY_PRECEDENCE: dict[TokenType, int] = {
+    TokenType.OR: 1,
+    TokenType.AND: 2,
+    TokenType.BANGEQ: 3,
+    TokenType.EQUALEQ: 3,
+    TokenType.GREATER: 4,
+    TokenType.GREATEREQ: 4,
+    TokenType.LESS: 4,
+    TokenType.LESSEQ: 4,
+    TokenType.MINUS: 5,
+    TokenType.PLUS: 5,
+    TokenType.SLASH: 6,
+    TokenType.STAR: 6,
+}
+
+# Parse functions for the tokens that can start an operand, called with the
+# token once it has been consumed.
+PREFIX: dict[TokenType, Callable[[Parser, Token], Expr]] = {
+    TokenType.FALSE: lambda parser, token: Literal(False),
+    TokenType.TRUE: lambda parser, token: Literal(True),
+    TokenType.NULL: lambda parser, token: Literal(None),
+    TokenType.NUMBER: Parser.literal,
+    TokenType.STRING: Parser.literal,
+    TokenType.IDENTIFIER: Parser.variable,
+    TokenType.THIS: Parser.this,
+    TokenType.SUPER: Parser.superMethod,
+    TokenType.LPAREN: Parser.grouping,
+    TokenType.LBRACKET: Parser.arrayLiteral,
+    TokenType.LBRACE: Parser.mapLiteral,
+}
+
+# Parse functions for the tokens that continue an operand: calls, indexing
+# and property access, called with the operand so far.
+POSTFIX: dict[TokenType, Callable[[Parser, Expr], Expr]] = {
+    TokenType.LPAREN: Parser.finishCall,
+    TokenType.LBRACKET: Parser.finishIndex,
+    TokenType.DOT: Parser.finishGet,
+}
@@ -0,0 +1,579 @@
+import operator
+import re
+import sys
+import time
+from abc import ABC
+from array import array
+from itertools import repeat
+
+# Runtime support for programs compiled to Python by 'plam build'. The source
+# of this module is copied into every generated module, so it must not import
+# anything from the interpreter.
+
+
+class PlamError(Exception):
+    def __init__(self, message, line):
+        super().__init__(message)
+        self.line = line
+
+
+# Value of a variable declared without an initializer.
+UNINIT = object()
+# Value of a captured variable whose declaration hasn't run yet.
+UNDEF = object()
+
+
+# Holds a variable declared inside a loop and captured by a function, so each
+# iteration gets its own binding the way it gets its own environment.
+class Cell:
+    __slots__ = ("v",)
+
+    def __init__(self, v):
+        self.v = v
+
+
+def setCell(cell, value):
+    cell.v = value
+    return value
+
+
+# Concatenations whose result is at least this long build a rope instead of
+# copying both strings.
+ROPE_THRESHOLD = 256
+
+
+# A plam string built by concatenation, kept as its pieces until something
+# needs the text. Ropes made by appending to the same rope share its list of
+# pieces: each sees only its first 'count' entries, and appending copies the
+# list only when something was already appended after those entries.
+class PRope:
+    __slots__ = ("parts", "count", "size", "text")
+
+    def __init__(self, parts, size):
+        self.parts = parts
+        self.count = len(parts)
+        self.size = size
+        self.text = None
+
+    def __str__(self):
+        if self.text is None:
+            parts = self.parts
+            if len(parts) != self.count:
+                parts = parts[: self.count]
+            self.text = "".join(parts)
+        return self.text
+
+
+def isString(value):
+    return type(value) is str or type(value) is PRope
+
+
+def textLength(value):
+    return value.size if type(value) is PRope else len(value)
+
+
+def concat(left, right):
+    size = textLength(left) + textLength(right)
+    if type(left) is PRope:
+        parts = left.parts
+        if len(parts) != left.count:
+            parts = parts[: left.count]
+        if type(right) is PRope:
+            parts.extend(right.parts[: right.count])
+        else:
+            parts.append(right)
+        return PRope(parts, size)
+    if type(right) is PRope:
+        return PRope([left] + right.parts[: right.count], size)
+    if size < ROPE_THRESHOLD:
+        return left + right
+    return PRope([left, right], size)
+
+
+# Repeating a rope repeats its pieces rather than its text.
+def repeatString(text, times):
+    if type(text) is PRope:
+        if times <= 0:
+            return ""
+        return PRope(text.parts[: text.count] * times, text.size * times)
+    return text * times
+
+
+# A plam array. Arrays that only hold numbers keep them in a compact buffer of
+# doubles that arithmetic runs over at C speed; storing anything else in one
+# switches it to a list.
+class PArray:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+
+def newArray(values):
+    for value in values:
+        if type(value) is not float:
+            return PArray(values)
+    return PArray(array("d", values))
+
+
+# A plam map, backed by a dict. Booleans are stored under the markers below,
+# since Python would treat true and 1 as the same key.
+class PMap:
+    __slots__ = ("items",)
+
+    def __init__(self, items):
+        self.items = items
+
+
+class BoolKey:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    # Keys are compared by identity, so a copy in another process must come
+    # back as the same object.
+    def __reduce__(self):
+        return "TRUE_KEY" if self.value else "FALSE_KEY"
+
+
+TRUE_KEY = BoolKey(True)
+FALSE_KEY = BoolKey(False)
+
+
+def mapKey(key, line):
+    kind = type(key)
+    if kind is float or kind is str or key is None:
+        return key
+    if kind is PRope:
+        return str(key)
+    if kind is bool:
+        return TRUE_KEY if key else FALSE_KEY
+    raise PlamError("Map keys must be numbers, strings, booleans or null.", line)
+
+
+def plainKey(key):
+    return key.value if type(key) is BoolKey else key
+
+
+def newMap(pairs, line):
+    return PMap({mapKey(key, line): value for key, value in pairs})
+
+
+def truthy(value):
+    return value is not None and value is not False
+
+
+def equal(left, right):
+    if type(left) is PRope:
+        left = str(left)
+    if type(right) is PRope:
+        right = str(right)
+    return type(left) is type(right) and left == right
+
+
+def stringify(value):
+    if value is None:
+        return "null"
+    if isinstance(value, float):
+        text = str(value)
+        if text.endswith(".0"):
+            text = text[:-2]
+        return text
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if isinstance(value, PArray):
+        return formatArray(value, stringify)
+    if isinstance(value, PMap):
+        return formatMap(value, stringify)
+    if callable(value):
+        return value.plam
+    return str(value)
+
+
+_formatting = set()
+
+
+def formatArray(target, stringify):
+    if id(target) in _formatting:
+        return "[...]"
+    _formatting.add(id(target))
+    try:
+        return "[" + ", ".join(stringify(item) for item in target.items) + "]"
+    finally:
+        _formatting.discard(id(target))
+
+
+def formatMap(target, stringify):
+    if id(target) in _formatting:
+        return "{...}"
+    _formatting.add(id(target))
+    try:
+        entries = [
+            stringify(plainKey(key)) + ": " + stringify(value)
+            for key, value in target.items.items()
+        ]
+        return "{" + ", ".join(entries) + "}"
+    finally:
+        _formatting.discard(id(target))
+
+
+def check(value, name, line):
+    if value is UNINIT:
+        raise PlamError(f"Attempted to access uninitialized variable '{name}'.", line)
+    if value is UNDEF:
+        raise PlamError(f"Undefined variable '{name}'.", line)
+    return value
+
+
+def undefined(name, line, value=None):
+    raise PlamError(f"Undefined variable '{name}'.", line)
+
+
+def sub(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left - right
+    if isinstance(left, PArray) or isinstance(right, PArray):
+        return broadcast("-", left, right, line)
+    raise PlamError("Operand must be a number.", line)
+
+
+def div(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        if right == 0.0:
+            raise PlamError("Can't divide by zero.", line)
+        return left / right
+    if isinstance(left, PArray) or isinstance(right, PArray):
+        return broadcast("/", left, right, line)
+    raise PlamError("Operand must be a number.", line)
+
+
+def mul(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left * right
+    if isString(left) and isinstance(right, float):
+        left, right = right, left
+    if isString(right) and isinstance(left, float):
+        if left.is_integer():
+            return repeatString(right, int(left))
+        raise PlamError("Can't multiply string by non-integer amount.", line)
+    if isinstance(left, PArray) or isinstance(right, PArray):
+        return broadcast("*", left, right, line)
+    raise PlamError("Operand must be a number.", line)
+
+
+def add(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left + right
+    if isString(left) and isString(right):
+        return concat(left, right)
+    if isinstance(left, PArray) or isinstance(right, PArray):
+        return broadcast("+", left, right, line)
+    raise PlamError("Operands must be two numbers or two strings.", line)
+
+
+def gt(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left > right
+    raise PlamError("Operand must be a number.", line)
+
+
+def ge(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left >= right
+    raise PlamError("Operand must be a number.", line)
+
+
+def lt(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left < right
+    raise PlamError("Operand must be a number.", line)
+
+
+def le(left, right, line):
+    if isinstance(left, float) and isinstance(right, float):
+        return left <= right
+    raise PlamError("Operand must be a number.", line)
+
+
+def neg(right, line):
+    if isinstance(right, float):
+        return -right
+    if isinstance(right, PArray):
+        return PArray(array("d", map(operator.neg, numbers(right, line))))
+    raise PlamError("Operand must be a number.", line)
+
+
+def addConst(value, delta, plus, line):
+    if isinstance(value, float):
+        return value + delta
+    if isinstance(value, PArray):
+        return broadcast("+", value, delta, line)
+    if plus:
+        raise PlamError("Operands must be two numbers or two strings.", line)
+    raise PlamError("Operand must be a number.", line)
+
+
+BROADCAST_OPS = {
+    "+": operator.add,
+    "-": operator.sub,
+    "*": operator.mul,
+    "/": operator.truediv,
+}
+
+
+def numbers(target, line):
+    items = target.items
+    if type(items) is not array:
+        for item in items:
+            if type(item) is not float:
+                raise PlamError("Array elements must be numbers.", line)
+    return items
+
+
+def scalar(value, symbol, line):
+    if isinstance(value, float):
+        return value
+    if symbol == "+":
+        raise PlamError("Operands must be two numbers or two strings.", line)
+    raise PlamError("Operand must be a number.", line)
+
+
+# Applies an arithmetic operator element by element. An array can be combined
+# with a number or with another array of the same length.
+def broadcast(symbol, left, right, line):
+    if isinstance(left, PArray) and isinstance(right, PArray):
+        a, b = numbers(left, line), numbers(right, line)
+        if len(a) != len(b):
+            raise PlamError("Array lengths don't match.", line)
+    elif isinstance(left, PArray):
+        a = numbers(left, line)
+        b = repeat(scalar(right, symbol, line), len(a))
+    else:
+        b = numbers(right, line)
+        a = repeat(scalar(left, symbol, line), len(b))
+    try:
+        return PArray(array("d", map(BROADCAST_OPS[symbol], a, b)))
+    except ZeroDivisionError:
+        raise PlamError("Can't divide by zero.", line)
+
+
+def toIndex(index, line):
+    if not isinstance(index, float) or not index.is_integer():
+        raise PlamError("Array index must be an integer.", line)
+    return int(index)
+
+
+def getIndex(target, index, line):
+    if not isinstance(target, PArray):
+        if isinstance(target, PMap):
+            return getKey(target, index, line)
+        raise PlamError("Only arrays and maps can be indexed.", line)
+    i = toIndex(index, line)
+    items = target.items
+    if i < 0 or i >= len(items):
+        raise PlamError("Array index out of range.", line)
+    return items[i]
+
+
+def setIndex(target, index, value, line):
+    if not isinstance(target, PArray):
+        if isinstance(target, PMap):
+            target.items[mapKey(index, line)] = value
+            return value
+        raise PlamError("Only arrays and maps can be indexed.", line)
+    i = toIndex(index, line)
+    items = target.items
+    if i < 0 or i >= len(items):
+        raise PlamError("Array index out of range.", line)
+    if type(items) is array and type(value) is not float:
+        items = target.items = list(items)
+    items[i] = value
+    return value
+
+
+def getKey(target, key, line):
+    try:
+        return target.items[mapKey(key, line)]
+    except KeyError:
+        raise PlamError(f"Undefined key '{stringify(key)}'.", line)
+
+
+def getSlice(target, start, end, line):
+    if not isinstance(target, PArray):
+        raise PlamError("Only arrays can be sliced.", line)
+    items = target.items
+    first = 0 if start is None else toIndex(start, line)
+    last = len(items) if end is None else toIndex(end, line)
+    if first < 0 or last < 0:
+        raise PlamError("Array index out of range.", line)
+    return PArray(items[first:last])
+
+
+def length(value, line):
+    if isinstance(value, PArray):
+        return float(len(value.items))
+    if isString(value):
+        return float(textLength(value))
+    if isinstance(value, PMap):
+        return float(len(value.items))
+    raise PlamError("Can only take the length of arrays, maps and strings.", line)
+
+
+def push(target, value, line):
+    if not isinstance(target, PArray):
+        raise PlamError("Can only push to arrays.", line)
+    items = target.items
+    if type(items) is array and type(value) is not float:
+        items = target.items = list(items)
+    items.append(value)
+
+
+def hasKey(target, key, line):
+    if not isinstance(target, PMap):
+        raise PlamError("Can only look up keys in maps.", line)
+    return mapKey(key, line) in target.items
+
+
+def deleteKey(target, key, line):
+    if not isinstance(target, PMap):
+        raise PlamError("Can only delete keys from maps.", line)
+    target.items.pop(mapKey(key, line), None)
+
+
+def mapKeys(target, line):
+    if not isinstance(target, PMap):
+        raise PlamError("Can only list the keys of maps.", line)
+    return newArray([plainKey(key) for key in target.items])
+
+
+# Base of values other than arrays and maps that a for-in loop can walk, which
+# produce their elements one at a time.
+class PIterable(ABC):
+    __slots__ = ()
+
+    def values(self, line): ...
+
+
+# The values a for-in loop visits, copied so the loop body can change the
+# array or map it is iterating over.
+def iterate(value, line):
+    if isinstance(value, PArray):
+        return value.items[:]
+    if isinstance(value, PMap):
+        return [plainKey(key) for key in value.items]
+    if isinstance(value, PIterable):
+        return value.values(line)
+    raise PlamError("Can only iterate over arrays, maps and generators.", line)
+
+
+# Errors raised by builtins don't know their line; the call fills it in.
+def call(callee, args, line):
+    arity = getattr(callee, "arity", None)
+    if arity is None:
+        raise PlamError("Can only call functions and classes.", line)
+    if len(args) != arity:
+        raise PlamError(f"Expected {arity} arguments but got {len(args)}.", line)
+    try:
+        return callee(*args)
+    except PlamError as e:
+        if e.line is None:
+            e.line = line
+        raise
+
+
+def function(fn, name, arity):
+    fn.plam = f"<fn {name}>"
+    fn.arity = arity
+    return fn
+
+
+def native(name, arity):
+    def wrap(fn):
+        fn.plam = f"<native fn {name}>"
+        fn.arity = arity
+        return fn
+
+    return wrap
+
+
+@native("clock", 0)
+def builtinClock():
+    return time.time()
+
+
+@native("print", 1)
+def builtinPrint(value):
+    print(stringify(value))
+
+
+@native("input", 1)
+def builtinInput(prompt):
+    return input(stringify(prompt))
+
+
+@native("len", 1)
+def builtinLen(value):
+    return length(value, None)
+
+
+@native("push", 2)
+def builtinPush(target, value):
+    push(target, value, None)
+
+
+@native("has", 2)
+def builtinHas(target, key):
+    return hasKey(target, key, None)
+
+
+@native("delete", 2)
+def builtinDelete(target, key):
+    deleteKey(target, key, None)
+
+
+@native("keys", 1)
+def builtinKeys(target):
+    return mapKeys(target, None)
+
+
+RUNTIME_BUILTINS = {
+    "clock": "builtinClock",
+    "print": "builtinPrint",
+    "input": "builtinInput",
+    "len": "builtinLen",
+    "push": "builtinPush",
+    "has": "builtinHas",
+    "delete": "builtinDelete",
+    "keys": "builtinKeys",
+}
+
+
+def errorLine(error, main, lines):
+    lineno = 0
+    tb = error.__traceback__
+    while tb is not None:
+        if tb.tb_frame.f_code.co_filename == main.__code__.co_filename:
+            lineno = tb.tb_lineno
+        tb = tb.tb_next
+    return lines[lineno] if lineno < len(lines) else 0
+
+
+def run(main, lines):
+    try:
+        main()
+    except PlamError as e:
+        message, line = str(e), e.line
+    except NameError as e:
+        # A variable read before its declaration ran. Generated names are the
+        # plam name with a numeric suffix.
+        name = e.name or re.search(r"'(\w+)'", str(e)).group(1)
+        message = f"Undefined variable '{name.rsplit('_', 1)[0]}'."
+        line = errorLine(e, main, lines)
+    else:
+        return
+    sys.stdout.flush()
+    print(f"{message}\n[line {line}]", file=sys.stderr)
+    sys.exit(70)
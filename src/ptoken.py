@@ -57,6 +57,13 @@ class TokenType(Enum):
     STAREQ = 47
     SLASHEQ = 48
 
+    LBRACKET = 49
+    RBRACKET = 50
+
+    IN = 51
+    YIELD = 52
+    IMPORT = 53
+
 
 class Token:
     t: TokenType
@@ -30,6 +30,9 @@ class Scanner:
         "while": TokenType.WHILE,
         "break": TokenType.BREAK,
         "continue": TokenType.CONTINUE,
+        "in": TokenType.IN,
+        "yield": TokenType.YIELD,
+        "import": TokenType.IMPORT,
     }
 
     def __init__(self, source: str, plam):
@@ -72,6 +75,10 @@ class Scanner:
                 self.addToken(TokenType.LBRACE)
             case "}":
                 self.addToken(TokenType.RBRACE)
+            case "[":
+                self.addToken(TokenType.LBRACKET)
+            case "]":
+                self.addToken(TokenType.RBRACKET)
             case ",":
                 self.addToken(TokenType.COMMA)
             case ".":
@@ -0,0 +1,242 @@
+from __future__ import annotations
+import threading
+from typing import TYPE_CHECKING, Coroutine, Optional, cast
+from callable import Callable
+from environment import Environment
+from pruntime import PlamError
+from lazy import lazyImport
+
+asyncio = lazyImport("asyncio")
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+    from pfunction import PFunction
+
+
+# A plam call running as a task. Its call stack lives on a thread of its own so
+# it can be suspended anywhere, but only one thread runs plam code at a time:
+# control is handed back and forth with the event loop through the two
+# semaphores whenever the task waits for something.
+class PTask:
+    callee: Callable
+    args: list[object]
+    # Resolved, always with None, once the call has returned or failed.
+    done: asyncio.Future
+    result: object
+    error: Optional[Exception]
+    # Whether a task that failed has had its error raised by an await.
+    observed: bool
+    resume: threading.Semaphore
+    suspended: threading.Semaphore
+    # What the task is waiting for while it is suspended, and the outcome
+    # handed back to it when it resumes.
+    request: Optional[Coroutine]
+    value: object
+    failure: Optional[Exception]
+
+    def __init__(self, callee: Callable, args: list[object], done: asyncio.Future):
+        self.callee = callee
+        self.args = args
+        self.done = done
+        self.result = None
+        self.error = None
+        self.observed = False
+        self.resume = threading.Semaphore(0)
+        self.suspended = threading.Semaphore(0)
+        self.request = None
+        self.value = None
+        self.failure = None
+
+    def __str__(self) -> str:
+        return "<task>"
+
+
+class PChannel:
+    queue: asyncio.Queue
+
+    def __init__(self, capacity: int):
+        self.queue = asyncio.Queue(capacity)
+
+    def __str__(self) -> str:
+        return "<channel>"
+
+
+# Runs plam tasks on an asyncio event loop. The loop only runs while the main
+# script waits for something, or after it has finished and the tasks it
+# spawned are still running.
+class Scheduler:
+    interpreter: Interpreter
+    loop: Optional[asyncio.AbstractEventLoop]
+    # The task running on each task thread.
+    threads: dict[int, PTask]
+    pending: set[asyncio.Task]
+    failed: list[PTask]
+    # The main script's wait, while the loop is running it.
+    main: Optional[asyncio.Task]
+    # How many tasks, counting the main script, are waiting for a channel or
+    # another task, and how many such waits have ended.
+    blocked: int
+    progress: int
+
+    def __init__(self, interpreter: Interpreter):
+        self.interpreter = interpreter
+        self.loop = None
+        self.threads = {}
+        self.pending = set()
+        self.failed = []
+        self.main = None
+        self.blocked = 0
+        self.progress = 0
+
+    def eventLoop(self) -> asyncio.AbstractEventLoop:
+        if self.loop == None:
+            self.loop = asyncio.new_event_loop()
+        return self.loop
+
+    def spawn(self, callee: Callable, args: list[object]) -> PTask:
+        loop = self.eventLoop()
+        task = PTask(callee, args, loop.create_future())
+        self.pending.add(loop.create_task(self.drive(task)))
+        return task
+
+    # Suspends whoever is running plam code until the coroutine completes and
+    # returns its result, letting other tasks run in the meantime. A blocking
+    # wait can only be ended by another task.
+    def wait(self, request: Coroutine, blocking: bool = False) -> object:
+        if blocking:
+            request = self.block(request)
+        state = self.save()
+        try:
+            task = self.threads.get(threading.get_ident())
+            if task == None:
+                return self.waitMain(request)
+            task.request = request
+            task.suspended.release()
+            task.resume.acquire()
+            if task.failure != None:
+                raise task.failure
+            return task.value
+        finally:
+            self.restore(state)
+
+    def waitMain(self, request: Coroutine) -> object:
+        loop = self.eventLoop()
+        self.main = loop.create_task(request)
+        try:
+            return loop.run_until_complete(self.main)
+        except asyncio.CancelledError:
+            # Cancelled by a deadlock. A task that failed is the likely cause.
+            for task in self.failed:
+                if not task.observed:
+                    task.observed = True
+                    raise cast(Exception, task.error)
+            raise PlamError("Deadlock: every task is waiting for another.", None)
+        finally:
+            self.main = None
+
+    async def block(self, request: Coroutine) -> object:
+        self.blocked += 1
+        self.eventLoop().call_soon(self.checkDeadlock, self.progress, True)
+        try:
+            return await request
+        finally:
+            self.blocked -= 1
+            self.progress += 1
+
+    # Cancels the main script's wait once it and every task are blocked. A
+    # wait that has been satisfied ends before a callback scheduled after it
+    # runs, so the check is repeated once to let those finish first.
+    def checkDeadlock(self, progress: int, again: bool):
+        if self.main == None or self.progress != progress:
+            return
+        if self.blocked < len(self.pending) + 1:
+            return
+        if again:
+            self.eventLoop().call_soon(self.checkDeadlock, progress, False)
+        else:
+            self.main.cancel()
+
+    async def join(self, task: PTask) -> object:
+        await asyncio.shield(task.done)
+        if task.error != None:
+            task.observed = True
+            raise task.error
+        return task.result
+
+    async def drive(self, task: PTask):
+        threading.Thread(target=self.run, args=(task,), daemon=True).start()
+        try:
+            while True:
+                state = self.save()
+                task.resume.release()
+                task.suspended.acquire()
+                self.restore(state)
+                request = task.request
+                if request == None:
+                    break
+                task.request = None
+                try:
+                    task.value, task.failure = await request, None
+                except Exception as e:
+                    task.value, task.failure = None, e
+        finally:
+            task.done.set_result(None)
+            self.pending.discard(asyncio.current_task())
+            self.eventLoop().call_soon(self.checkDeadlock, self.progress, True)
+
+    def run(self, task: PTask):
+        ident = threading.get_ident()
+        self.threads[ident] = task
+        task.resume.acquire()
+        try:
+            task.result = task.callee.call(self.interpreter, task.args)
+        except Exception as e:
+            task.error = e
+            self.failed.append(task)
+        finally:
+            del self.threads[ident]
+            task.request = None
+            task.suspended.release()
+
+    # Runs spawned tasks until they have all returned or are blocked for good,
+    # then raises the first error no await has seen.
+    def finish(self):
+        try:
+            while len(self.pending) > 0:
+                self.wait(asyncio.wait(set(self.pending)), True)
+        except PlamError:
+            pass
+        failed, self.failed = self.failed, []
+        for task in failed:
+            if not task.observed:
+                task.observed = True
+                raise cast(Exception, task.error)
+
+    # Cancels the tasks a failed script leaves behind and closes the loop, so
+    # none of them is left half run when the process exits. A later spawn
+    # starts a new loop.
+    def shutdown(self):
+        if self.loop == None:
+            return
+        for task in self.pending:
+            task.cancel()
+        if len(self.pending) > 0:
+            cancelled = asyncio.gather(*self.pending, return_exceptions=True)
+            self.loop.run_until_complete(cancelled)
+        self.loop.close()
+        self.loop = None
+        self.pending.clear()
+        self.failed = []
+
+    # What the interpreter knows about where the running task is, including
+    # how deep its calls go when they are limited.
+    def save(self) -> tuple[Environment, Optional[PFunction], int]:
+        interpreter = self.interpreter
+        calls = 0 if interpreter.budget == None else interpreter.budget.calls
+        return interpreter.environment, interpreter.function, calls
+
+    def restore(self, state: tuple[Environment, Optional[PFunction], int]):
+        interpreter = self.interpreter
+        interpreter.environment, interpreter.function, calls = state
+        if interpreter.budget != None:
+            interpreter.budget.calls = calls
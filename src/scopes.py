@@ -0,0 +1,51 @@
+from __future__ import annotations
+from typing import Generic, Optional, TypeVar
+from pbuiltins import BUILTINS
+
+B = TypeVar("B")
+
+BUILTIN_NAMES = {b.name for b in BUILTINS}
+
+
+# A lexical mirror of one runtime environment, used by passes that need to
+# know which declaration a name refers to before the program runs.
+class Scope(Generic[B]):
+    parent: Optional[Scope[B]]
+    function: bool
+    names: dict[str, tuple[int, B]]
+    position: int
+
+    def __init__(self, parent: Optional[Scope[B]], function: bool):
+        self.parent = parent
+        self.function = function
+        self.names = {}
+        self.position = 0
+
+
+# Resolves a name the way the environment chain resolves it at runtime: a
+# declaration only shadows references that run after it, and a reference from
+# inside a nested function may see declarations made after the function was
+# defined. Returns every binding the name could refer to and whether the last
+# one is certain to be found; if not, the lookup may fall through to a builtin
+# or fail.
+def resolve(scope: Optional[Scope[B]], name: str) -> tuple[list[B], bool]:
+    found: list[B] = []
+    crossed = False
+    while scope != None:
+        entry = scope.names.get(name)
+        if entry != None:
+            index, binding = entry
+            position = scope.position
+            if index < position or (crossed and index <= position):
+                found.append(binding)
+                return found, True
+            if crossed:
+                found.append(binding)
+                # A global declared later is either defined by the time the
+                # function runs or the lookup fails, unless it replaces a
+                # builtin that would be found in the meantime.
+                if scope.parent == None and name not in BUILTIN_NAMES:
+                    return found, True
+        crossed = crossed or scope.function
+        scope = scope.parent
+    return found, False
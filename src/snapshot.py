@@ -0,0 +1,119 @@
+from __future__ import annotations
+import io
+import pickle
+from typing import IO, TYPE_CHECKING, Any, Optional
+from expr import Get, Invoke, Set, Variable
+from pbuiltins import BUILTINS
+from pgenerator import PGenerator
+from pruntime import PlamError
+from scheduler import PChannel, PTask
+
+if TYPE_CHECKING:
+    from interpreter import Interpreter
+
+# Changed whenever what a snapshot holds changes shape, so older ones are
+# refused rather than misread.
+SNAPSHOT_VERSION = 3
+
+_BUILTINS: dict[str, object] = {b.name: b.fn for b in BUILTINS}
+_BUILTIN_NAMES: dict[int, str] = {id(b.fn): b.name for b in BUILTINS}
+
+# Snapshots read by this process, by path.
+_loaded: dict[str, bytes] = {}
+
+
+class Snapshot:
+    version: int
+    # The globals the script defined, without the builtins.
+    values: dict[str, object]
+    shadowed: set[str]
+    modules: dict[str, Any]
+
+    def __init__(
+        self, values: dict[str, object], shadowed: set[str], modules: dict[str, Any]
+    ):
+        self.version = SNAPSHOT_VERSION
+        self.values = values
+        self.shadowed = shadowed
+        self.modules = modules
+
+
+# Saves references to the global environment and the builtins by name, so
+# they are the restoring interpreter's own, and leaves out the lookups nodes
+# have cached, which only held for the interpreter that ran them.
+class _Pickler(pickle.Pickler):
+    interpreter: Interpreter
+
+    def __init__(self, file: IO[bytes], interpreter: Interpreter):
+        super().__init__(file)
+        self.interpreter = interpreter
+
+    def persistent_id(self, obj: object) -> Optional[object]:
+        if obj is self.interpreter.globalenv:
+            return "globals"
+        name = _BUILTIN_NAMES.get(id(obj))
+        if name != None and _BUILTINS[name] is obj:
+            return name
+        if isinstance(obj, (PGenerator, PTask, PChannel)):
+            raise PlamError(f"Can't snapshot {obj}.", None)
+        return None
+
+    def reducer_override(self, obj: object) -> Any:
+        match obj:
+            case Variable():
+                return Variable, (obj.name,)
+            case Get():
+                return Get, (obj.object, obj.name)
+            case Set():
+                return Set, (obj.object, obj.name, obj.value)
+            case Invoke():
+                return Invoke, (obj.object, obj.name, obj.paren, obj.arguments)
+        return NotImplemented
+
+
+class _Unpickler(pickle.Unpickler):
+    interpreter: Interpreter
+
+    def __init__(self, file: IO[bytes], interpreter: Interpreter):
+        super().__init__(file)
+        self.interpreter = interpreter
+
+    def persistent_load(self, pid: object) -> object:
+        if pid == "globals":
+            return self.interpreter.globalenv
+        return _BUILTINS[pid]
+
+
+# Writes the globals a script has defined, the functions and values they
+# reach, and the modules it imported.
+def saveSnapshot(interpreter: Interpreter, path: str):
+    values: dict[str, object] = {}
+    for name, value in interpreter.globalenv.items():
+        if _BUILTINS.get(name) is not value:
+            values[name] = value
+    snapshot = Snapshot(values, interpreter.shadowed, interpreter.modules.modules)
+    data = io.BytesIO()
+    _Pickler(data, interpreter).dump(snapshot)
+    with open(path, "wb") as f:
+        f.write(data.getvalue())
+
+
+# Defines the globals of a snapshot in a fresh interpreter, as if the script
+# it was taken from had just run in it.
+def loadSnapshot(interpreter: Interpreter, path: str):
+    data = _loaded.get(path)
+    if data == None:
+        with open(path, "rb") as f:
+            data = f.read()
+        _loaded[path] = data
+    try:
+        snapshot = _Unpickler(io.BytesIO(data), interpreter).load()
+    except Exception:
+        raise PlamError("Not a snapshot.", None)
+    if not isinstance(snapshot, Snapshot) or snapshot.version != SNAPSHOT_VERSION:
+        raise PlamError("Taken by another version of plam.", None)
+
+    for name, value in snapshot.values.items():
+        interpreter.globalenv.define(name, value)
+    interpreter.shadowed |= snapshot.shadowed
+    interpreter.modules.modules.update(snapshot.modules)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import re
+from typing import Any, NamedTuple
+from ptoken import Token, TokenType
+from scanner import Scanner
+from pparser import Parser
+from stmt import Stmt
+from lazy import lazyImport
+
+futures = lazyImport("concurrent.futures")
+
+# Sources smaller than this are parsed in one piece.
+MIN_CHUNK_SIZE = 64 * 1024
+
+# Strings, comments, newlines, brackets and statement ends, runs of anything
+# else, and stray characters, in the order the scanner would see them.
+_LEXEMES = re.compile(r'"[^"]*"?|//[^\n]*|\n|[(){}\[\];]|[^\s(){}\[\];"/]+|/|[^\S\n]+')
+# The first word after a point, past blank lines and comments.
+_NEXT_WORD = re.compile(r"(?:\s|//[^\n]*)*(\w*)")
+
+# Keywords the parser resynchronises on after a syntax error, so a chunk that
+# follows a block can't be swallowed by error recovery in the one before it.
+_SYNC_KEYWORDS = {"class", "fn", "var", "for", "if", "while", "return", "import"}
+
+
+class Chunk(NamedTuple):
+    text: str
+    line: int
+
+
+class Report(NamedTuple):
+    line: int
+    where: str
+    message: str
+
+
+# Stands in for Plam while a chunk is scanned and parsed in a worker, keeping
+# errors so they can be reported in source order once every chunk is done.
+class ErrorCollector:
+    reports: list[Report]
+
+    def __init__(self):
+        self.reports = []
+
+    def error(self, line: int, message: str):
+        self.reports.append(Report(line, "", message))
+
+    def tok_error(self, token: Token, message: str):
+        if token.t == TokenType.EOF:
+            self.reports.append(Report(token.line, " at end", message))
+        else:
+            where = " at '" + token.lexeme + "'"
+            self.reports.append(Report(token.line, where, message))
+
+
+def _boundaries(source: str) -> list[int]:
+    boundaries: list[int] = []
+    depth = 0
+    last = ""
+    for m in _LEXEMES.finditer(source):
+        lexeme = m.group()
+        c = lexeme[0]
+        if c == "\n":
+            if depth != 0 or (last != ";" and last != "}"):
+                continue
+            word = _NEXT_WORD.match(source, m.end()).group(1)
+            if word == "else" or (last == "}" and word not in _SYNC_KEYWORDS):
+                continue
+            boundaries.append(m.end())
+        elif c in "({[":
+            depth += 1
+        elif c in ")}]":
+            depth -= 1
+        if not c.isspace() and not lexeme.startswith("//"):
+            last = c
+    return boundaries
+
+
+# Splits a source into roughly equal chunks at top-level statement boundaries,
+# each tagged with the line it starts on.
+def splitSource(source: str, chunks: int) -> list[Chunk]:
+    size = max(len(source) // chunks, MIN_CHUNK_SIZE)
+    result: list[Chunk] = []
+    start = 0
+    line = 1
+    for boundary in _boundaries(source):
+        if boundary - start >= size:
+            result.append(Chunk(source[start:boundary], line))
+            line += source.count("\n", start, boundary)
+            start = boundary
+    result.append(Chunk(source[start:], line))
+    return result
+
+
+class _Result(NamedTuple):
+    statements: list[Stmt]
+    scanErrors: list[Report]
+    parseErrors: list[Report]
+
+
+def _parseChunk(chunk: Chunk) -> _Result:
+    collector = ErrorCollector()
+    scanner = Scanner(chunk.text, collector)
+    scanner.line = chunk.line
+    tokens = scanner.scanTokens()
+    scanErrors = collector.reports
+    collector.reports = []
+    statements = Parser(tokens, collector).parse()
+    return _Result(statements, scanErrors, collector.reports)
+
+
+# Scans and parses the chunks of a source in a pool of worker processes and
+# joins the results. Syntax errors are reported through plam in the order a
+# single scanner and parser would have reported them.
+def parseParallel(source: str, plam: Any, jobs: int) -> list[Stmt]:
+    chunks = splitSource(source, jobs)
+    if len(chunks) == 1:
+        results = [_parseChunk(chunks[0])]
+    else:
+        with futures.ProcessPoolExecutor(jobs) as pool:
+            results = list(pool.map(_parseChunk, chunks))
+
+    statements: list[Stmt] = []
+    for result in results:
+        statements.extend(result.statements)
+    scanErrors = [r for result in results for r in result.scanErrors]
+    parseErrors = [r for result in results for r in result.parseErrors]
+    for report in scanErrors + parseErrors:
+        plam.report(report.line, report.where, report.message)
+    return statements
@@ -2,36 +2,44 @@ from __future__ import annotations
 from dataclasses import dataclass
 from abc import ABC
 from ptoken import Token
-from typing import TypeVar, Generic, Optional
-from expr import Expr
+from typing import Any, Callable, ClassVar, TypeVar, Generic, Optional
+from expr import Expr, Variable
 
 T = TypeVar("T")
 
 
 class Stmt(ABC):
+    __slots__ = ()
+    kind: ClassVar[int]
+
     def accept(self, visitor: Visitor[T]) -> T: ...
 
 
-@dataclass
+@dataclass(slots=True)
 class Expression(Stmt):
+    kind: ClassVar[int] = 0
     expression: Expr
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitExpressionStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Function(Stmt):
+    kind: ClassVar[int] = 1
     name: Token
     params: list[Token]
     body: list[Stmt]
+    pending: object = None
+    generator: bool = False
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitFunctionStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class If(Stmt):
+    kind: ClassVar[int] = 2
     cond: Expr
     thenBranch: Stmt
     elseBranch: Optional[Stmt]
@@ -40,8 +48,9 @@ class If(Stmt):
         return visitor.visitIfStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Return(Stmt):
+    kind: ClassVar[int] = 3
     keyword: Token
     value: Optional[Expr]
 
@@ -49,8 +58,9 @@ class Return(Stmt):
         return visitor.visitReturnStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Var(Stmt):
+    kind: ClassVar[int] = 4
     name: Token
     initializer: Optional[Expr]
 
@@ -58,44 +68,115 @@ class Var(Stmt):
         return visitor.visitVarStmt(self)
 
 
+@dataclass(slots=True)
 class While(Stmt):
+    kind: ClassVar[int] = 5
+    keyword: Token
     cond: Expr
     body: Stmt
-    post: Optional[Stmt]
-
-    def __init__(self, cond: Expr, body: Stmt, post: Optional[Stmt] = None):
-        self.cond = cond
-        self.body = body
-        self.post = post
+    post: Optional[Stmt] = None
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitWhileStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Block(Stmt):
+    kind: ClassVar[int] = 6
     statements: list[Stmt]
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitBlockStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Break(Stmt):
+    kind: ClassVar[int] = 7
     tok: Token
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitBreakStmt(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class Continue(Stmt):
+    kind: ClassVar[int] = 8
     tok: Token
 
     def accept(self, visitor: Visitor[T]) -> T:
         return visitor.visitContinueStmt(self)
 
 
+@dataclass(slots=True)
+class CountedFor(Stmt):
+    kind: ClassVar[int] = 9
+    initializer: Var
+    loop: While
+    compare: object
+    bound: Expr
+    step: float
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitCountedForStmt(self)
+
+
+@dataclass(slots=True)
+class CompareAndBranch(Stmt):
+    kind: ClassVar[int] = 10
+    left: Expr
+    operator: Token
+    right: Expr
+    compare: object
+    thenBranch: Stmt
+    elseBranch: Optional[Stmt]
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitCompareAndBranchStmt(self)
+
+
+@dataclass(slots=True)
+class ForIn(Stmt):
+    kind: ClassVar[int] = 11
+    name: Token
+    keyword: Token
+    iterable: Expr
+    body: Stmt
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitForInStmt(self)
+
+
+@dataclass(slots=True)
+class Class(Stmt):
+    kind: ClassVar[int] = 12
+    name: Token
+    superclass: Optional[Variable]
+    methods: list[Function]
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitClassStmt(self)
+
+
+@dataclass(slots=True)
+class Yield(Stmt):
+    kind: ClassVar[int] = 13
+    keyword: Token
+    value: Optional[Expr]
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitYieldStmt(self)
+
+
+@dataclass(slots=True)
+class Import(Stmt):
+    kind: ClassVar[int] = 14
+    keyword: Token
+    path: Token
+
+    def accept(self, visitor: Visitor[T]) -> T:
+        return visitor.visitImportStmt(self)
+
+
 class Visitor(ABC, Generic[T]):
     def visitExpressionStmt(self, stmt: Expression) -> T: ...
 
@@ -114,3 +195,38 @@ class Visitor(ABC, Generic[T]):
     def visitBreakStmt(self, stmt: Break) -> T: ...
 
     def visitContinueStmt(self, stmt: Continue) -> T: ...
+
+    def visitCountedForStmt(self, stmt: CountedFor) -> T: ...
+
+    def visitCompareAndBranchStmt(self, stmt: CompareAndBranch) -> T: ...
+
+    def visitForInStmt(self, stmt: ForIn) -> T: ...
+
+    def visitClassStmt(self, stmt: Class) -> T: ...
+
+    def visitYieldStmt(self, stmt: Yield) -> T: ...
+
+    def visitImportStmt(self, stmt: Import) -> T: ...
+
+
+VISIT_METHODS = [
+    "visitExpressionStmt",
+    "visitFunctionStmt",
+    "visitIfStmt",
+    "visitReturnStmt",
+    "visitVarStmt",
+    "visitWhileStmt",
+    "visitBlockStmt",
+    "visitBreakStmt",
+    "visitContinueStmt",
+    "visitCountedForStmt",
+    "visitCompareAndBranchStmt",
+    "visitForInStmt",
+    "visitClassStmt",
+    "visitYieldStmt",
+    "visitImportStmt",
+]
+
+
+def dispatchTable(visitor: Visitor[T]) -> list[Callable[[Any], T]]:
+    return [getattr(visitor, name) for name in VISIT_METHODS]
@@ -0,0 +1,410 @@
+from __future__ import annotations
+from collections import Counter
+from typing import Optional, cast
+from expr import (
+    Expr,
+    Assignment,
+    Binary,
+    Call,
+    Grouping,
+    Inline,
+    Literal,
+    Logical,
+    NumBinary,
+    StrConcat,
+    IncrementVariable,
+    AddConstToVariable,
+    ArrayLiteral,
+    Index,
+    SetIndex,
+    Slice,
+    MapLiteral,
+    Get,
+    Set,
+    This,
+    Super,
+    Invoke,
+    Ternary,
+    Unary,
+    Variable,
+    Visitor as EVisitor,
+)
+from stmt import (
+    Stmt,
+    Block,
+    Break,
+    Class,
+    Yield,
+    Import,
+    Continue,
+    CountedFor,
+    CompareAndBranch,
+    Expression,
+    ForIn,
+    Function,
+    If,
+    Return,
+    Var,
+    While,
+    Visitor as SVisitor,
+)
+
+
+# Base class for optimizer passes. Nodes are rewritten in place and each visit
+# returns the node that should take the visited node's place; statement visits
+# may return None to remove the statement from its enclosing list.
+class Transformer(EVisitor[Expr], SVisitor[Optional[Stmt]]):
+    def expr(self, expr: Expr) -> Expr:
+        return expr.accept(self)
+
+    def stmt(self, stmt: Stmt) -> Optional[Stmt]:
+        return stmt.accept(self)
+
+    def stmts(self, stmts: list[Stmt]) -> list[Stmt]:
+        result: list[Stmt] = []
+        for s in stmts:
+            s = self.stmt(s)
+            if s != None:
+                result.append(s)
+        return result
+
+    def branch(self, stmt: Stmt) -> Stmt:
+        s = self.stmt(stmt)
+        return s if s != None else Block([])
+
+    def visitAssignmentExpr(self, expr: Assignment) -> Expr:
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitTernaryExpr(self, expr: Ternary) -> Expr:
+        expr.cond = self.expr(expr.cond)
+        expr.first = self.expr(expr.first)
+        expr.second = self.expr(expr.second)
+        return expr
+
+    def visitBinaryExpr(self, expr: Binary) -> Expr:
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        return expr
+
+    def visitCallExpr(self, expr: Call) -> Expr:
+        expr.callee = self.expr(expr.callee)
+        expr.arguments = [self.expr(arg) for arg in expr.arguments]
+        return expr
+
+    def visitGroupingExpr(self, expr: Grouping) -> Expr:
+        expr.expression = self.expr(expr.expression)
+        return expr
+
+    def visitLiteralExpr(self, expr: Literal) -> Expr:
+        return expr
+
+    def visitLogicalExpr(self, expr: Logical) -> Expr:
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        return expr
+
+    def visitUnaryExpr(self, expr: Unary) -> Expr:
+        expr.right = self.expr(expr.right)
+        return expr
+
+    def visitVariableExpr(self, expr: Variable) -> Expr:
+        return expr
+
+    def visitInlineExpr(self, expr: Inline) -> Expr:
+        expr.arguments = [self.expr(arg) for arg in expr.arguments]
+        expr.body = self.expr(expr.body)
+        return expr
+
+    def visitNumBinaryExpr(self, expr: NumBinary) -> Expr:
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        return expr
+
+    def visitStrConcatExpr(self, expr: StrConcat) -> Expr:
+        expr.left = self.expr(expr.left)
+        expr.right = self.expr(expr.right)
+        return expr
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> Expr:
+        return expr
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> Expr:
+        return expr
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral) -> Expr:
+        expr.elements = [self.expr(element) for element in expr.elements]
+        return expr
+
+    def visitIndexExpr(self, expr: Index) -> Expr:
+        expr.object = self.expr(expr.object)
+        expr.index = self.expr(expr.index)
+        return expr
+
+    def visitSetIndexExpr(self, expr: SetIndex) -> Expr:
+        expr.object = self.expr(expr.object)
+        expr.index = self.expr(expr.index)
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitSliceExpr(self, expr: Slice) -> Expr:
+        expr.object = self.expr(expr.object)
+        if expr.start != None:
+            expr.start = self.expr(expr.start)
+        if expr.end != None:
+            expr.end = self.expr(expr.end)
+        return expr
+
+    def visitMapLiteralExpr(self, expr: MapLiteral) -> Expr:
+        expr.keys = [self.expr(key) for key in expr.keys]
+        expr.values = [self.expr(value) for value in expr.values]
+        return expr
+
+    def visitGetExpr(self, expr: Get) -> Expr:
+        expr.object = self.expr(expr.object)
+        return expr
+
+    def visitSetExpr(self, expr: Set) -> Expr:
+        expr.object = self.expr(expr.object)
+        expr.value = self.expr(expr.value)
+        return expr
+
+    def visitThisExpr(self, expr: This) -> Expr:
+        return expr
+
+    def visitSuperExpr(self, expr: Super) -> Expr:
+        return expr
+
+    def visitInvokeExpr(self, expr: Invoke) -> Expr:
+        expr.object = self.expr(expr.object)
+        expr.arguments = [self.expr(arg) for arg in expr.arguments]
+        return expr
+
+    def visitExpressionStmt(self, stmt: Expression) -> Optional[Stmt]:
+        stmt.expression = self.expr(stmt.expression)
+        return stmt
+
+    def visitFunctionStmt(self, stmt: Function) -> Optional[Stmt]:
+        stmt.body = self.stmts(stmt.body)
+        return stmt
+
+    def visitIfStmt(self, stmt: If) -> Optional[Stmt]:
+        stmt.cond = self.expr(stmt.cond)
+        stmt.thenBranch = self.branch(stmt.thenBranch)
+        if stmt.elseBranch != None:
+            stmt.elseBranch = self.stmt(stmt.elseBranch)
+        return stmt
+
+    def visitReturnStmt(self, stmt: Return) -> Optional[Stmt]:
+        if stmt.value != None:
+            stmt.value = self.expr(stmt.value)
+        return stmt
+
+    def visitVarStmt(self, stmt: Var) -> Optional[Stmt]:
+        if stmt.initializer != None:
+            stmt.initializer = self.expr(stmt.initializer)
+        return stmt
+
+    def visitWhileStmt(self, stmt: While) -> Optional[Stmt]:
+        stmt.cond = self.expr(stmt.cond)
+        stmt.body = self.branch(stmt.body)
+        if stmt.post != None:
+            stmt.post = self.stmt(stmt.post)
+        return stmt
+
+    def visitBlockStmt(self, stmt: Block) -> Optional[Stmt]:
+        stmt.statements = self.stmts(stmt.statements)
+        return stmt
+
+    def visitBreakStmt(self, stmt: Break) -> Optional[Stmt]:
+        return stmt
+
+    def visitContinueStmt(self, stmt: Continue) -> Optional[Stmt]:
+        return stmt
+
+    def visitCompareAndBranchStmt(self, stmt: CompareAndBranch) -> Optional[Stmt]:
+        stmt.left = self.expr(stmt.left)
+        stmt.right = self.expr(stmt.right)
+        stmt.thenBranch = self.branch(stmt.thenBranch)
+        if stmt.elseBranch != None:
+            stmt.elseBranch = self.stmt(stmt.elseBranch)
+        return stmt
+
+    # The bound is shared with the loop condition, so it is only visited there.
+    def visitCountedForStmt(self, stmt: CountedFor) -> Optional[Stmt]:
+        stmt.initializer = cast(Var, self.stmt(stmt.initializer))
+        stmt.loop = cast(While, self.stmt(stmt.loop))
+        return stmt
+
+    def visitForInStmt(self, stmt: ForIn) -> Optional[Stmt]:
+        stmt.iterable = self.expr(stmt.iterable)
+        stmt.body = self.branch(stmt.body)
+        return stmt
+
+    def visitClassStmt(self, stmt: Class) -> Optional[Stmt]:
+        if stmt.superclass != None:
+            stmt.superclass = cast(Variable, self.expr(stmt.superclass))
+        stmt.methods = [cast(Function, self.stmt(m)) for m in stmt.methods]
+        return stmt
+
+    def visitYieldStmt(self, stmt: Yield) -> Optional[Stmt]:
+        if stmt.value != None:
+            stmt.value = self.expr(stmt.value)
+        return stmt
+
+    def visitImportStmt(self, stmt: Import) -> Optional[Stmt]:
+        return stmt
+
+
+def declaredNames(stmts: list[Stmt]) -> set[str]:
+    names: set[str] = set()
+    for s in stmts:
+        if isinstance(s, (Var, Function, Class)):
+            names.add(s.name.lexeme)
+    return names
+
+
+# Collects every name that can be declared in an environment other than the
+# global one: parameters, and anything declared inside a block or function.
+class _LocalNames(Transformer):
+    names: set[str]
+    depth: int
+
+    def __init__(self):
+        self.names = set()
+        self.depth = 0
+
+    def visitVarStmt(self, stmt: Var) -> Optional[Stmt]:
+        if self.depth > 0:
+            self.names.add(stmt.name.lexeme)
+        return super().visitVarStmt(stmt)
+
+    def visitFunctionStmt(self, stmt: Function) -> Optional[Stmt]:
+        if self.depth > 0:
+            self.names.add(stmt.name.lexeme)
+        self.names.update(p.lexeme for p in stmt.params)
+        self.depth += 1
+        super().visitFunctionStmt(stmt)
+        self.depth -= 1
+        return stmt
+
+    def visitBlockStmt(self, stmt: Block) -> Optional[Stmt]:
+        self.depth += 1
+        super().visitBlockStmt(stmt)
+        self.depth -= 1
+        return stmt
+
+    def visitCountedForStmt(self, stmt: CountedFor) -> Optional[Stmt]:
+        self.depth += 1
+        super().visitCountedForStmt(stmt)
+        self.depth -= 1
+        return stmt
+
+    # Methods are looked up on the class, not in an environment.
+    def visitClassStmt(self, stmt: Class) -> Optional[Stmt]:
+        if self.depth > 0:
+            self.names.add(stmt.name.lexeme)
+        self.depth += 1
+        for method in stmt.methods:
+            self.names.update(p.lexeme for p in method.params)
+            self.stmts(method.body)
+        self.depth -= 1
+        return stmt
+
+    def visitForInStmt(self, stmt: ForIn) -> Optional[Stmt]:
+        self.names.add(stmt.name.lexeme)
+        self.depth += 1
+        super().visitForInStmt(stmt)
+        self.depth -= 1
+        return stmt
+
+    def visitInlineExpr(self, expr: Inline) -> Expr:
+        self.names.update(p.lexeme for p in expr.params)
+        return super().visitInlineExpr(expr)
+
+
+def localNames(stmts: list[Stmt]) -> set[str]:
+    collector = _LocalNames()
+    collector.stmts(stmts)
+    return collector.names
+
+
+class _NodeCounter(Transformer):
+    count: int
+
+    def __init__(self):
+        self.count = 0
+
+    def expr(self, expr: Expr) -> Expr:
+        self.count += 1
+        return super().expr(expr)
+
+    def stmt(self, stmt: Stmt) -> Optional[Stmt]:
+        self.count += 1
+        return super().stmt(stmt)
+
+
+def countNodes(node: Expr | Stmt) -> int:
+    counter = _NodeCounter()
+    if isinstance(node, Expr):
+        counter.expr(node)
+    else:
+        counter.stmt(node)
+    return counter.count
+
+
+class NameUsage(Transformer):
+    assigned: set[str]
+    refs: Counter[str]
+    calls: Counter[str]
+    hasCalls: bool
+    hasYields: bool
+
+    def __init__(self):
+        self.assigned = set()
+        self.refs = Counter()
+        self.calls = Counter()
+        self.hasCalls = False
+        self.hasYields = False
+
+    def visitAssignmentExpr(self, expr: Assignment) -> Expr:
+        self.assigned.add(expr.name.lexeme)
+        return super().visitAssignmentExpr(expr)
+
+    def visitVariableExpr(self, expr: Variable) -> Expr:
+        self.refs[expr.name.lexeme] += 1
+        return expr
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> Expr:
+        self.assigned.add(expr.name.lexeme)
+        self.refs[expr.name.lexeme] += 1
+        return expr
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> Expr:
+        self.assigned.add(expr.name.lexeme)
+        self.refs[expr.name.lexeme] += 1
+        return expr
+
+    def visitCallExpr(self, expr: Call) -> Expr:
+        self.hasCalls = True
+        if isinstance(expr.callee, Variable):
+            self.calls[expr.callee.name.lexeme] += 1
+        return super().visitCallExpr(expr)
+
+    def visitInvokeExpr(self, expr: Invoke) -> Expr:
+        self.hasCalls = True
+        return super().visitInvokeExpr(expr)
+
+    def visitYieldStmt(self, stmt: Yield) -> Optional[Stmt]:
+        self.hasYields = True
+        return super().visitYieldStmt(stmt)
+
+
+def nameUsage(*nodes: Expr | Stmt) -> NameUsage:
+    usage = NameUsage()
+    for node in nodes:
+        if isinstance(node, Expr):
+            usage.expr(node)
+        else:
+            usage.stmt(node)
+    return usage
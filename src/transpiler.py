@@ -0,0 +1,787 @@
+from __future__ import annotations
+import inspect
+import re
+from typing import Optional
+from ptoken import Token, TokenType
+from expr import (
+    Expr,
+    Assignment,
+    Binary,
+    Call,
+    Grouping,
+    Inline,
+    Literal,
+    Logical,
+    NumBinary,
+    StrConcat,
+    IncrementVariable,
+    AddConstToVariable,
+    ArrayLiteral,
+    Index,
+    SetIndex,
+    Slice,
+    MapLiteral,
+    Get,
+    Set,
+    This,
+    Super,
+    Invoke,
+    Ternary,
+    Unary,
+    Variable,
+    Visitor as EVisitor,
+)
+from stmt import (
+    Stmt,
+    Block,
+    Break,
+    Class,
+    Yield,
+    Import,
+    Continue,
+    CountedFor,
+    CompareAndBranch,
+    Expression,
+    ForIn,
+    Function,
+    If,
+    Return,
+    Var,
+    While,
+    Visitor as SVisitor,
+)
+from exceptions import BuildError
+from scopes import Scope, resolve, BUILTIN_NAMES
+import pruntime
+
+HELPERS = {
+    TokenType.MINUS: "sub",
+    TokenType.SLASH: "div",
+    TokenType.STAR: "mul",
+    TokenType.PLUS: "add",
+    TokenType.GREATER: "gt",
+    TokenType.GREATEREQ: "ge",
+    TokenType.LESS: "lt",
+    TokenType.LESSEQ: "le",
+}
+
+OPERATORS = {
+    TokenType.MINUS: "-",
+    TokenType.STAR: "*",
+    TokenType.PLUS: "+",
+    TokenType.GREATER: ">",
+    TokenType.GREATEREQ: ">=",
+    TokenType.LESS: "<",
+    TokenType.LESSEQ: "<=",
+}
+
+BOOLEAN_OPS = {
+    TokenType.GREATER,
+    TokenType.GREATEREQ,
+    TokenType.LESS,
+    TokenType.LESSEQ,
+    TokenType.EQUALEQ,
+    TokenType.BANGEQ,
+}
+
+
+# A plam function, or the top level of the program, compiled to a Python def.
+class _Function:
+    parent: Optional[_Function]
+    declaration: Optional[Function]
+    loops: int
+    nonlocals: set[str]
+    # Cells of the enclosing function bound as keyword defaults at definition
+    # time, so a closure keeps the cell of the iteration that created it.
+    captures: dict[str, None]
+
+    def __init__(self, parent: Optional[_Function], declaration: Optional[Function]):
+        self.parent = parent
+        self.declaration = declaration
+        self.loops = 0
+        self.nonlocals = set()
+        self.captures = {}
+
+
+class _Binding:
+    name: str
+    pyname: str
+    function: _Function
+    inLoop: bool
+    captured: bool
+    assigned: bool
+    uninitialized: bool
+    declarations: int
+    arity: Optional[int]
+
+    def __init__(self, name: str, pyname: str, function: _Function, inLoop: bool):
+        self.name = name
+        self.pyname = pyname
+        self.function = function
+        self.inLoop = inLoop
+        self.captured = False
+        self.assigned = False
+        self.uninitialized = False
+        self.declarations = 0
+        self.arity = None
+
+    @property
+    def boxed(self) -> bool:
+        return self.inLoop and self.captured
+
+
+# Works out which declaration every name refers to and how each binding has to
+# be represented in Python. Bindings become Python locals, closures over them
+# become Python closures (with 'nonlocal' where they are assigned), and
+# bindings that need a fresh copy per loop iteration become cells. Names that
+# don't resolve are builtins or undefined, unless the resolver is 'dynamic',
+# in which case they are looked up in an environment at runtime.
+class _Resolver(EVisitor[None], SVisitor[None]):
+    dynamic: bool
+    scope: Optional[Scope[_Binding]]
+    function: _Function
+    functions: dict[int, _Function]
+    declared: dict[int, list[_Binding]]
+    resolved: dict[int, Optional[_Binding]]
+    crossings: list[tuple[_Function, _Binding, bool]]
+    names: int
+
+    def __init__(self, dynamic: bool = False):
+        self.dynamic = dynamic
+        self.scope = None
+        self.functions = {}
+        self.declared = {}
+        self.resolved = {}
+        self.crossings = []
+        self.names = 0
+
+    def run(self, owner: object, stmts: list[Stmt], params: list[Token] = []):
+        declaration = owner if isinstance(owner, Function) else None
+        self.function = _Function(None, declaration)
+        self.functions[id(owner)] = self.function
+        self.block(owner, stmts, params)
+        for function, binding, write in self.crossings:
+            if binding.boxed:
+                child = function
+                while child.parent is not binding.function:
+                    child = child.parent
+                child.captures[binding.pyname] = None
+            elif write:
+                function.nonlocals.add(binding.pyname)
+
+    def declare(
+        self, owner: object, token: Token, index: int, stmt: Optional[Stmt] = None
+    ):
+        name = token.lexeme
+        if name not in self.scope.names:
+            self.names += 1
+            pyname = re.sub(r"\W", "_", name) + f"_{self.names}"
+            binding = _Binding(name, pyname, self.function, self.function.loops > 0)
+            self.scope.names[name] = (index, binding)
+            self.declared[id(owner)].append(binding)
+        elif index < 0:
+            raise BuildError(token, f"Duplicate parameter '{name}'.")
+        binding = self.scope.names[name][1]
+        binding.declarations += 1
+        binding.arity = None
+        if isinstance(stmt, Function) and binding.declarations == 1:
+            binding.arity = len(stmt.params)
+        if isinstance(stmt, Var) and stmt.initializer == None:
+            binding.uninitialized = True
+        if stmt != None:
+            self.resolved[id(stmt)] = binding
+
+    def block(
+        self,
+        owner: object,
+        stmts: list[Stmt],
+        params: list[Token] = [],
+        function: bool = False,
+    ):
+        self.scope = Scope(self.scope, function)
+        self.declared[id(owner)] = []
+        for param in params:
+            self.declare(owner, param, -1)
+        for i, s in enumerate(stmts):
+            if isinstance(s, (Var, Function, Class)):
+                self.declare(owner, s.name, i, s)
+        for i, s in enumerate(stmts):
+            self.scope.position = i
+            s.accept(self)
+        self.scope = self.scope.parent
+
+    def reference(self, node: Expr, token: Token, write: bool):
+        name = token.lexeme
+        bindings, definite = resolve(self.scope, name)
+        ambiguous = not definite and len(bindings) > 0 and name in BUILTIN_NAMES
+        if len(bindings) > 1 or ambiguous:
+            raise BuildError(token, f"Can't compile ambiguous reference to '{name}'.")
+        if len(bindings) == 0 and name in BUILTIN_NAMES and not self.dynamic:
+            if write:
+                message = f"Can't compile assignment to builtin '{name}'."
+                raise BuildError(token, message)
+            if name not in pruntime.RUNTIME_BUILTINS:
+                raise BuildError(token, f"Builtin '{name}' isn't supported by build.")
+
+        binding = bindings[0] if bindings else None
+        self.resolved[id(node)] = binding
+        if binding == None:
+            return
+        if write:
+            binding.assigned = True
+        if binding.function is not self.function:
+            binding.captured = True
+            self.crossings.append((self.function, binding, write))
+
+    def visitAssignmentExpr(self, expr: Assignment):
+        expr.value.accept(self)
+        self.reference(expr, expr.name, True)
+
+    def visitTernaryExpr(self, expr: Ternary):
+        expr.cond.accept(self)
+        expr.first.accept(self)
+        expr.second.accept(self)
+
+    def visitBinaryExpr(self, expr: Binary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitCallExpr(self, expr: Call):
+        expr.callee.accept(self)
+        for arg in expr.arguments:
+            arg.accept(self)
+
+    def visitGroupingExpr(self, expr: Grouping):
+        expr.expression.accept(self)
+
+    def visitLiteralExpr(self, expr: Literal):
+        pass
+
+    def visitLogicalExpr(self, expr: Logical):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitUnaryExpr(self, expr: Unary):
+        expr.right.accept(self)
+
+    def visitVariableExpr(self, expr: Variable):
+        self.reference(expr, expr.name, False)
+
+    def visitInlineExpr(self, expr: Inline):
+        for arg in expr.arguments:
+            arg.accept(self)
+        self.scope = Scope(self.scope, False)
+        self.declared[id(expr)] = []
+        for param in expr.params:
+            self.declare(expr, param, -1)
+        expr.body.accept(self)
+        self.scope = self.scope.parent
+
+    def visitNumBinaryExpr(self, expr: NumBinary):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitStrConcatExpr(self, expr: StrConcat):
+        expr.left.accept(self)
+        expr.right.accept(self)
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable):
+        self.reference(expr, expr.name, True)
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable):
+        self.reference(expr, expr.name, True)
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral):
+        for element in expr.elements:
+            element.accept(self)
+
+    def visitIndexExpr(self, expr: Index):
+        expr.object.accept(self)
+        expr.index.accept(self)
+
+    def visitSetIndexExpr(self, expr: SetIndex):
+        expr.object.accept(self)
+        expr.index.accept(self)
+        expr.value.accept(self)
+
+    def visitSliceExpr(self, expr: Slice):
+        expr.object.accept(self)
+        if expr.start != None:
+            expr.start.accept(self)
+        if expr.end != None:
+            expr.end.accept(self)
+
+    def visitMapLiteralExpr(self, expr: MapLiteral):
+        for key, value in zip(expr.keys, expr.values):
+            key.accept(self)
+            value.accept(self)
+
+    def visitGetExpr(self, expr: Get):
+        raise BuildError(expr.name, "Can't compile property access.")
+
+    def visitSetExpr(self, expr: Set):
+        raise BuildError(expr.name, "Can't compile property access.")
+
+    def visitThisExpr(self, expr: This):
+        raise BuildError(expr.keyword, "Can't compile 'this'.")
+
+    def visitSuperExpr(self, expr: Super):
+        raise BuildError(expr.keyword, "Can't compile 'super'.")
+
+    def visitInvokeExpr(self, expr: Invoke):
+        raise BuildError(expr.name, "Can't compile property access.")
+
+    def visitExpressionStmt(self, stmt: Expression):
+        stmt.expression.accept(self)
+
+    def visitFunctionStmt(self, stmt: Function):
+        enclosing = self.function
+        self.function = _Function(enclosing, stmt)
+        self.functions[id(stmt)] = self.function
+        self.block(stmt, stmt.body, stmt.params, True)
+        self.function = enclosing
+
+    def visitClassStmt(self, stmt: Class):
+        raise BuildError(stmt.name, "Can't compile classes.")
+
+    def visitYieldStmt(self, stmt: Yield):
+        raise BuildError(stmt.keyword, "Can't compile generators.")
+
+    def visitImportStmt(self, stmt: Import):
+        raise BuildError(stmt.keyword, "Can't compile imports.")
+
+    def visitIfStmt(self, stmt: If):
+        stmt.cond.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch != None:
+            stmt.elseBranch.accept(self)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value != None:
+            stmt.value.accept(self)
+
+    def visitVarStmt(self, stmt: Var):
+        if stmt.initializer != None:
+            stmt.initializer.accept(self)
+
+    def visitWhileStmt(self, stmt: While):
+        stmt.cond.accept(self)
+        self.function.loops += 1
+        stmt.body.accept(self)
+        self.function.loops -= 1
+        if stmt.post != None:
+            stmt.post.accept(self)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.block(stmt, stmt.statements)
+
+    def visitCompareAndBranchStmt(self, stmt: CompareAndBranch):
+        stmt.left.accept(self)
+        stmt.right.accept(self)
+        stmt.thenBranch.accept(self)
+        if stmt.elseBranch != None:
+            stmt.elseBranch.accept(self)
+
+    def visitCountedForStmt(self, stmt: CountedFor):
+        self.block(stmt, [stmt.initializer, stmt.loop])
+
+    def visitForInStmt(self, stmt: ForIn):
+        stmt.iterable.accept(self)
+        self.function.loops += 1
+        self.scope = Scope(self.scope, False)
+        self.declared[id(stmt)] = []
+        self.declare(stmt, stmt.name, -1)
+        stmt.body.accept(self)
+        self.scope = self.scope.parent
+        self.function.loops -= 1
+
+    def visitBreakStmt(self, stmt: Break):
+        pass
+
+    def visitContinueStmt(self, stmt: Continue):
+        pass
+
+
+# Compiles a program to the source of a standalone Python module. Arithmetic
+# and comparisons go through small helpers that perform the interpreter's type
+# checks and carry the plam line to report, except where type inference has
+# already proven the operands are numbers or strings.
+class Transpiler(EVisitor[str], SVisitor[None]):
+    # Runtime helper that checks and performs a call.
+    CALL = "call"
+
+    resolver: _Resolver
+    function: _Function
+    lines: list[str]
+    sourceLines: list[int]
+    indent: int
+    line: int
+    temps: int
+
+    def __init__(self, dynamic: bool = False):
+        self.resolver = _Resolver(dynamic)
+        self.lines = []
+        self.sourceLines = []
+        self.indent = 0
+        self.line = 0
+        self.temps = 0
+
+    def build(self, statements: list[Stmt], filename: str) -> str:
+        self.resolver.run(statements, statements)
+        self.function = self.resolver.functions[id(statements)]
+
+        header = [
+            f"# Generated by plam build from {filename}. Do not edit.",
+            inspect.getsource(pruntime),
+            "",
+        ]
+        for text in "\n".join(header).splitlines():
+            self.emit(text)
+        self.emit("def main():")
+        self.indent += 1
+        self.body(lambda: self.block(statements, statements))
+        self.indent -= 1
+
+        self.emit("")
+        self.emit("")
+        self.emit(f"LINES = {tuple([0] + self.sourceLines + [0] * 4)!r}")
+        self.emit("")
+        self.emit('if __name__ == "__main__":')
+        self.emit("    run(main, LINES)")
+        return "\n".join(self.lines) + "\n"
+
+    def emit(self, text: str):
+        self.lines.append("    " * self.indent + text if text else "")
+        self.sourceLines.append(self.line)
+
+    def body(self, generate):
+        self.indent += 1
+        count = len(self.lines)
+        generate()
+        if len(self.lines) == count:
+            self.emit("pass")
+        self.indent -= 1
+
+    def temp(self) -> str:
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    def binding(self, node: object) -> Optional[_Binding]:
+        return self.resolver.resolved[id(node)]
+
+    def block(self, owner: object, stmts: list[Stmt]):
+        for binding in self.resolver.declared[id(owner)]:
+            if binding.boxed:
+                self.emit(f"{binding.pyname} = Cell(UNDEF)")
+        for s in stmts:
+            self.execute(s)
+
+    def execute(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def evaluate(self, expr: Expr) -> str:
+        return expr.accept(self)
+
+    def isBoolean(self, expr: Expr) -> bool:
+        if isinstance(expr, Grouping):
+            return self.isBoolean(expr.expression)
+        if isinstance(expr, Literal):
+            return isinstance(expr.value, bool)
+        if isinstance(expr, (Binary, NumBinary)):
+            return expr.operator.t in BOOLEAN_OPS
+        if isinstance(expr, Unary):
+            return expr.operator.t == TokenType.BANG
+        return False
+
+    def test(self, expr: Expr) -> str:
+        value = self.evaluate(expr)
+        return value if self.isBoolean(expr) else f"truthy({value})"
+
+    def freeRead(self, name: Token) -> str:
+        if name.lexeme in pruntime.RUNTIME_BUILTINS:
+            return pruntime.RUNTIME_BUILTINS[name.lexeme]
+        return f"undefined({name.lexeme!r}, {name.line})"
+
+    def freeWrite(self, name: Token, value: str) -> str:
+        return f"undefined({name.lexeme!r}, {name.line}, {value})"
+
+    def read(self, binding: Optional[_Binding], name: Token) -> str:
+        self.line = name.line
+        if binding == None:
+            return self.freeRead(name)
+        if binding.boxed:
+            return f"check({binding.pyname}.v, {name.lexeme!r}, {name.line})"
+        if binding.uninitialized:
+            return f"check({binding.pyname}, {name.lexeme!r}, {name.line})"
+        return binding.pyname
+
+    def write(self, binding: Optional[_Binding], name: Token, value: str) -> str:
+        self.line = name.line
+        if binding == None:
+            return self.freeWrite(name, value)
+        if binding.boxed:
+            return f"setCell({binding.pyname}, {value})"
+        return f"({binding.pyname} := {value})"
+
+    def store(self, binding: Optional[_Binding], name: Token, value: str):
+        if binding == None:
+            self.emit(self.freeWrite(name, value))
+        elif binding.boxed:
+            self.emit(f"{binding.pyname}.v = {value}")
+        else:
+            self.emit(f"{binding.pyname} = {value}")
+
+    def addConst(
+        self, expr: IncrementVariable | AddConstToVariable
+    ) -> tuple[Optional[_Binding], str]:
+        binding = self.binding(expr)
+        plus = expr.operator.t == TokenType.PLUS
+        value = self.read(binding, expr.name)
+        return binding, f"addConst({value}, {expr.delta!r}, {plus}, {expr.name.line})"
+
+    def visitAssignmentExpr(self, expr: Assignment) -> str:
+        return self.write(self.binding(expr), expr.name, self.evaluate(expr.value))
+
+    def visitTernaryExpr(self, expr: Ternary) -> str:
+        cond = self.test(expr.cond)
+        first = self.evaluate(expr.first)
+        second = self.evaluate(expr.second)
+        return f"({first} if {cond} else {second})"
+
+    def visitBinaryExpr(self, expr: Binary) -> str:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        self.line = expr.operator.line
+        match expr.operator.t:
+            case TokenType.EQUALEQ:
+                return f"equal({left}, {right})"
+            case TokenType.BANGEQ:
+                return f"(not equal({left}, {right}))"
+        helper = HELPERS[expr.operator.t]
+        return f"{helper}({left}, {right}, {expr.operator.line})"
+
+    def visitCallExpr(self, expr: Call) -> str:
+        callee = self.evaluate(expr.callee)
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        self.line = expr.paren.line
+        if isinstance(expr.callee, Variable):
+            binding = self.binding(expr.callee)
+            # A function that is never reassigned can be called directly.
+            if (
+                binding != None
+                and binding.arity == len(args)
+                and not binding.assigned
+                and not binding.boxed
+            ):
+                return f"{callee}({', '.join(args)})"
+        arguments = "".join(f"{arg}, " for arg in args)
+        return f"{self.CALL}({callee}, ({arguments}), {expr.paren.line})"
+
+    def visitGroupingExpr(self, expr: Grouping) -> str:
+        return self.evaluate(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> str:
+        return repr(expr.value)
+
+    def visitLogicalExpr(self, expr: Logical) -> str:
+        temp = self.temp()
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        if expr.operator.t == TokenType.OR:
+            return f"({temp} if truthy({temp} := {left}) else {right})"
+        return f"({right} if truthy({temp} := {left}) else {temp})"
+
+    def visitUnaryExpr(self, expr: Unary) -> str:
+        right = self.evaluate(expr.right)
+        self.line = expr.operator.line
+        if expr.operator.t == TokenType.MINUS:
+            return f"neg({right}, {expr.operator.line})"
+        if self.isBoolean(expr.right):
+            return f"(not {right})"
+        return f"(not truthy({right}))"
+
+    def visitVariableExpr(self, expr: Variable) -> str:
+        return self.read(self.binding(expr), expr.name)
+
+    def visitInlineExpr(self, expr: Inline) -> str:
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        params = [b.pyname for b in self.resolver.declared[id(expr)]]
+        body = self.evaluate(expr.body)
+        if len(params) == 0:
+            return body
+        bound = "".join(f"{p} := {a}, " for p, a in zip(params, args))
+        return f"({bound}{body})[-1]"
+
+    def visitNumBinaryExpr(self, expr: NumBinary) -> str:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        return f"({left} {OPERATORS[expr.operator.t]} {right})"
+
+    def visitStrConcatExpr(self, expr: StrConcat) -> str:
+        return f"concat({self.evaluate(expr.left)}, {self.evaluate(expr.right)})"
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> str:
+        binding, value = self.addConst(expr)
+        return self.write(binding, expr.name, value)
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> str:
+        binding, value = self.addConst(expr)
+        return self.write(binding, expr.name, value)
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral) -> str:
+        elements = [self.evaluate(element) for element in expr.elements]
+        return f"newArray([{', '.join(elements)}])"
+
+    def visitIndexExpr(self, expr: Index) -> str:
+        target = self.evaluate(expr.object)
+        index = self.evaluate(expr.index)
+        self.line = expr.bracket.line
+        return f"getIndex({target}, {index}, {expr.bracket.line})"
+
+    def visitSetIndexExpr(self, expr: SetIndex) -> str:
+        target = self.evaluate(expr.object)
+        index = self.evaluate(expr.index)
+        value = self.evaluate(expr.value)
+        self.line = expr.bracket.line
+        return f"setIndex({target}, {index}, {value}, {expr.bracket.line})"
+
+    def visitSliceExpr(self, expr: Slice) -> str:
+        target = self.evaluate(expr.object)
+        start = "None" if expr.start == None else self.evaluate(expr.start)
+        end = "None" if expr.end == None else self.evaluate(expr.end)
+        self.line = expr.bracket.line
+        return f"getSlice({target}, {start}, {end}, {expr.bracket.line})"
+
+    def visitMapLiteralExpr(self, expr: MapLiteral) -> str:
+        pairs = [
+            f"({self.evaluate(key)}, {self.evaluate(value)})"
+            for key, value in zip(expr.keys, expr.values)
+        ]
+        self.line = expr.brace.line
+        return f"newMap([{', '.join(pairs)}], {expr.brace.line})"
+
+    def visitExpressionStmt(self, stmt: Expression):
+        expr = stmt.expression
+        if isinstance(expr, Assignment):
+            self.store(self.binding(expr), expr.name, self.evaluate(expr.value))
+        elif isinstance(expr, (IncrementVariable, AddConstToVariable)):
+            binding, value = self.addConst(expr)
+            self.store(binding, expr.name, value)
+        else:
+            self.emit(self.evaluate(expr))
+
+    def visitFunctionStmt(self, stmt: Function):
+        binding = self.resolver.resolved[id(stmt)]
+        self.line = stmt.name.line
+        function = self.resolver.functions[id(stmt)]
+        name = binding.pyname + "_fn" if binding.boxed else binding.pyname
+
+        declared = self.resolver.declared[id(stmt)]
+        params = [b.pyname for b in declared[: len(stmt.params)]]
+        if len(function.captures) > 0:
+            params.append("*")
+            params.extend(f"{c}={c}" for c in function.captures)
+        self.emit(f"def {name}({', '.join(params)}):")
+
+        enclosing = self.function
+        self.function = function
+        self.indent += 1
+        if len(function.nonlocals) > 0:
+            self.emit(f"nonlocal {', '.join(sorted(function.nonlocals))}")
+        self.indent -= 1
+        self.body(lambda: self.block(stmt, stmt.body))
+        self.function = enclosing
+
+        self.line = stmt.name.line
+        value = f"function({name}, {stmt.name.lexeme!r}, {len(stmt.params)})"
+        if binding.boxed:
+            self.emit(f"{binding.pyname}.v = {value}")
+        else:
+            self.emit(value)
+
+    def visitIfStmt(self, stmt: If):
+        self.emit(f"if {self.test(stmt.cond)}:")
+        self.body(lambda: self.execute(stmt.thenBranch))
+        if stmt.elseBranch != None:
+            self.emit("else:")
+            self.body(lambda: self.execute(stmt.elseBranch))
+
+    def visitCompareAndBranchStmt(self, stmt: CompareAndBranch):
+        left = self.evaluate(stmt.left)
+        right = self.evaluate(stmt.right)
+        self.line = stmt.operator.line
+        helper = HELPERS[stmt.operator.t]
+        self.emit(f"if {helper}({left}, {right}, {stmt.operator.line}):")
+        self.body(lambda: self.execute(stmt.thenBranch))
+        if stmt.elseBranch != None:
+            self.emit("else:")
+            self.body(lambda: self.execute(stmt.elseBranch))
+
+    def visitReturnStmt(self, stmt: Return):
+        if self.function.declaration == None:
+            raise BuildError(stmt.keyword, "Can't return from top-level code.")
+        value = "None" if stmt.value == None else self.evaluate(stmt.value)
+        self.line = stmt.keyword.line
+        self.emit(f"return {value}")
+
+    def visitVarStmt(self, stmt: Var):
+        value = "UNINIT"
+        if stmt.initializer != None:
+            value = self.evaluate(stmt.initializer)
+        self.line = stmt.name.line
+        self.store(self.resolver.resolved[id(stmt)], stmt.name, value)
+
+    def visitWhileStmt(self, stmt: While):
+        forever = isinstance(stmt.cond, Literal) and pruntime.truthy(stmt.cond.value)
+        self.emit("while True:" if forever else f"while {self.test(stmt.cond)}:")
+        self.function.loops += 1
+        if stmt.post == None:
+            self.body(lambda: self.loopBody(stmt, stmt.body))
+        else:
+            # The increment also runs after 'continue', like the interpreter's.
+            self.indent += 1
+            self.emit("try:")
+            self.body(lambda: self.loopBody(stmt, stmt.body))
+            self.emit("finally:")
+            self.body(lambda: self.execute(stmt.post))
+            self.indent -= 1
+        self.function.loops -= 1
+
+    def loopBody(self, loop: Stmt, body: Stmt):
+        self.execute(body)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.block(stmt, stmt.statements)
+
+    def visitCountedForStmt(self, stmt: CountedFor):
+        self.block(stmt, [stmt.initializer, stmt.loop])
+
+    # A variable captured by a closure gets a new cell on every iteration.
+    def visitForInStmt(self, stmt: ForIn):
+        binding = self.resolver.declared[id(stmt)][0]
+        iterable = self.evaluate(stmt.iterable)
+        self.line = stmt.keyword.line
+        values = f"iterate({iterable}, {stmt.keyword.line})"
+        self.function.loops += 1
+        if binding.boxed:
+            value = self.temp()
+            self.emit(f"for {value} in {values}:")
+            self.indent += 1
+            self.emit(f"{binding.pyname} = Cell({value})")
+            self.indent -= 1
+        else:
+            self.emit(f"for {binding.pyname} in {values}:")
+        self.body(lambda: self.loopBody(stmt, stmt.body))
+        self.function.loops -= 1
+
+    def visitBreakStmt(self, stmt: Break):
+        if self.function.loops == 0:
+            raise BuildError(stmt.tok, "Can't compile 'break' outside a loop.")
+        self.line = stmt.tok.line
+        self.emit("break")
+
+    def visitContinueStmt(self, stmt: Continue):
+        if self.function.loops == 0:
+            raise BuildError(stmt.tok, "Can't compile 'continue' outside a loop.")
+        self.line = stmt.tok.line
+        self.emit("continue")
@@ -0,0 +1,438 @@
+from __future__ import annotations
+import operator
+from typing import Optional
+from ptoken import TokenType
+from expr import (
+    Expr,
+    Assignment,
+    Binary,
+    Call,
+    Grouping,
+    Inline,
+    Literal,
+    Logical,
+    NumBinary,
+    StrConcat,
+    IncrementVariable,
+    AddConstToVariable,
+    ArrayLiteral,
+    Index,
+    SetIndex,
+    Slice,
+    MapLiteral,
+    Get,
+    Set,
+    This,
+    Super,
+    Invoke,
+    Ternary,
+    Unary,
+    Variable,
+    Visitor as EVisitor,
+)
+from stmt import (
+    Stmt,
+    Block,
+    Break,
+    Class,
+    Yield,
+    Import,
+    Continue,
+    CountedFor,
+    CompareAndBranch,
+    Expression,
+    ForIn,
+    Function,
+    If,
+    Return,
+    Var,
+    While,
+    Visitor as SVisitor,
+)
+from transformer import Transformer
+from scopes import Scope, resolve
+from pruntime import PArray, isString
+
+# Sets of runtime types an expression may produce, as bit masks.
+NUM = 1
+STR = 2
+BOOL = 4
+NULL = 8
+OTHER = 16
+ARRAY = 32
+ANY = NUM | STR | BOOL | NULL | OTHER | ARRAY
+
+NUMERIC_OPS = {
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.PLUS: operator.add,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATEREQ: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESSEQ: operator.le,
+}
+
+
+def literalType(value: object) -> int:
+    if value == None:
+        return NULL
+    if isinstance(value, bool):
+        return BOOL
+    if isinstance(value, float):
+        return NUM
+    if isString(value):
+        return STR
+    if isinstance(value, PArray):
+        return ARRAY
+    return OTHER
+
+
+class _Binding:
+    types: int
+
+    def __init__(self):
+        self.types = 0
+
+
+# Infers the set of types every variable binding can hold by iterating over
+# the program until no binding's set grows, then rewrites arithmetic and
+# comparisons whose operands are proven to be numbers (or strings, for '+')
+# into nodes the interpreter executes without runtime type checks.
+# When a reference could reach more than one binding, every binding it could
+# reach is considered.
+class TypeInference(EVisitor[int], SVisitor[None]):
+    stats: dict[str, int]
+    bindings: dict[tuple[int, str], _Binding]
+    types: dict[int, int]
+    scope: Optional[Scope[_Binding]]
+    changed: bool
+    # Whether code the pass can't see, such as functions restored from a
+    # snapshot, may assign the program's globals.
+    sharedGlobals: bool
+
+    def __init__(self, stats: dict[str, int], sharedGlobals: bool = False):
+        self.stats = stats
+        self.stats.setdefault("specialized", 0)
+        self.bindings = {}
+        self.types = {}
+        self.scope = None
+        self.changed = False
+        self.sharedGlobals = sharedGlobals
+
+    def run(self, statements: list[Stmt]) -> list[Stmt]:
+        if self.sharedGlobals:
+            for s in statements:
+                if isinstance(s, (Var, Function, Class)):
+                    self.join(self.binding(None, s.name.lexeme), ANY)
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            self.types = {}
+            self.block(None, statements)
+        return _Specializer(self.types, self.stats).stmts(statements)
+
+    # Specialises the body of a single function, assuming each parameter holds
+    # one of the given types whenever it is called.
+    def runFunction(self, function: Function, paramTypes: list[int]) -> Function:
+        params = [p.lexeme for p in function.params]
+        self.changed = True
+        while self.changed:
+            self.changed = False
+            self.types = {}
+            self.block(function, function.body, params, True, paramTypes)
+        function.body = _Specializer(self.types, self.stats).stmts(function.body)
+        return function
+
+    def binding(self, owner: object, name: str) -> _Binding:
+        key = (id(owner), name)
+        if key not in self.bindings:
+            self.bindings[key] = _Binding()
+        return self.bindings[key]
+
+    def declare(self, owner: object, name: str, index: int):
+        if name not in self.scope.names:
+            self.scope.names[name] = (index, self.binding(owner, name))
+
+    def join(self, binding: _Binding, types: int):
+        if binding.types | types != binding.types:
+            binding.types |= types
+            self.changed = True
+
+    def block(
+        self,
+        owner: object,
+        stmts: list[Stmt],
+        params: list[str] = [],
+        function: bool = False,
+        paramTypes: list[int] = [],
+    ):
+        self.scope = Scope(self.scope, function)
+        for name in params:
+            self.declare(owner, name, -1)
+        for name, types in zip(params, paramTypes):
+            self.join(self.binding(owner, name), types)
+        for i, s in enumerate(stmts):
+            if isinstance(s, (Var, Function, Class)):
+                self.declare(owner, s.name.lexeme, i)
+        for i, s in enumerate(stmts):
+            self.scope.position = i
+            self.execute(s)
+        self.scope = self.scope.parent
+
+    def resolve(self, name: str) -> tuple[list[_Binding], bool]:
+        return resolve(self.scope, name)
+
+    def evaluate(self, expr: Expr) -> int:
+        types = expr.accept(self)
+        self.types[id(expr)] = types
+        return types
+
+    def execute(self, stmt: Stmt):
+        stmt.accept(self)
+
+    def visitAssignmentExpr(self, expr: Assignment) -> int:
+        types = self.evaluate(expr.value)
+        for binding in self.resolve(expr.name.lexeme)[0]:
+            self.join(binding, types)
+        return types
+
+    def visitTernaryExpr(self, expr: Ternary) -> int:
+        self.evaluate(expr.cond)
+        return self.evaluate(expr.first) | self.evaluate(expr.second)
+
+    def visitBinaryExpr(self, expr: Binary) -> int:
+        left = self.evaluate(expr.left)
+        right = self.evaluate(expr.right)
+        # Arithmetic on an array produces an array.
+        array = (left | right) & ARRAY
+        match expr.operator.t:
+            case TokenType.MINUS | TokenType.SLASH:
+                return NUM | array
+            case TokenType.STAR:
+                return NUM if left | right == NUM else NUM | STR | array
+            case TokenType.PLUS:
+                if left | right == NUM:
+                    return NUM
+                if left | right == STR:
+                    return STR
+                return NUM | STR | array
+        return BOOL
+
+    def visitCallExpr(self, expr: Call) -> int:
+        self.evaluate(expr.callee)
+        for arg in expr.arguments:
+            self.evaluate(arg)
+        return ANY
+
+    def visitGroupingExpr(self, expr: Grouping) -> int:
+        return self.evaluate(expr.expression)
+
+    def visitLiteralExpr(self, expr: Literal) -> int:
+        return literalType(expr.value)
+
+    def visitLogicalExpr(self, expr: Logical) -> int:
+        return self.evaluate(expr.left) | self.evaluate(expr.right)
+
+    def visitUnaryExpr(self, expr: Unary) -> int:
+        right = self.evaluate(expr.right)
+        if expr.operator.t == TokenType.MINUS:
+            return NUM | (right & ARRAY)
+        return BOOL
+
+    def visitVariableExpr(self, expr: Variable) -> int:
+        bindings, definite = self.resolve(expr.name.lexeme)
+        types = 0 if definite else ANY
+        for binding in bindings:
+            types |= binding.types
+        return types
+
+    def visitInlineExpr(self, expr: Inline) -> int:
+        args = [self.evaluate(arg) for arg in expr.arguments]
+        self.scope = Scope(self.scope, False)
+        for param, types in zip(expr.params, args):
+            self.declare(expr, param.lexeme, -1)
+            self.join(self.binding(expr, param.lexeme), types)
+        types = self.evaluate(expr.body)
+        self.scope = self.scope.parent
+        return types
+
+    def visitNumBinaryExpr(self, expr: NumBinary) -> int:
+        self.evaluate(expr.left)
+        self.evaluate(expr.right)
+        match expr.operator.t:
+            case TokenType.MINUS | TokenType.STAR | TokenType.PLUS:
+                return NUM
+        return BOOL
+
+    def visitStrConcatExpr(self, expr: StrConcat) -> int:
+        self.evaluate(expr.left)
+        self.evaluate(expr.right)
+        return STR
+
+    def addConst(self, name: str) -> int:
+        bindings, definite = self.resolve(name)
+        types = NUM if definite else NUM | ARRAY
+        for binding in bindings:
+            types |= binding.types & ARRAY
+        for binding in bindings:
+            self.join(binding, types)
+        return types
+
+    def visitIncrementVariableExpr(self, expr: IncrementVariable) -> int:
+        return self.addConst(expr.name.lexeme)
+
+    def visitAddConstToVariableExpr(self, expr: AddConstToVariable) -> int:
+        return self.addConst(expr.name.lexeme)
+
+    def visitArrayLiteralExpr(self, expr: ArrayLiteral) -> int:
+        for element in expr.elements:
+            self.evaluate(element)
+        return ARRAY
+
+    def visitIndexExpr(self, expr: Index) -> int:
+        self.evaluate(expr.object)
+        self.evaluate(expr.index)
+        return ANY
+
+    def visitSetIndexExpr(self, expr: SetIndex) -> int:
+        self.evaluate(expr.object)
+        self.evaluate(expr.index)
+        return self.evaluate(expr.value)
+
+    def visitSliceExpr(self, expr: Slice) -> int:
+        self.evaluate(expr.object)
+        if expr.start != None:
+            self.evaluate(expr.start)
+        if expr.end != None:
+            self.evaluate(expr.end)
+        return ARRAY
+
+    def visitMapLiteralExpr(self, expr: MapLiteral) -> int:
+        for key, value in zip(expr.keys, expr.values):
+            self.evaluate(key)
+            self.evaluate(value)
+        return OTHER
+
+    def visitGetExpr(self, expr: Get) -> int:
+        self.evaluate(expr.object)
+        return ANY
+
+    def visitSetExpr(self, expr: Set) -> int:
+        self.evaluate(expr.object)
+        return self.evaluate(expr.value)
+
+    def visitThisExpr(self, expr: This) -> int:
+        return OTHER
+
+    def visitSuperExpr(self, expr: Super) -> int:
+        return OTHER
+
+    def visitInvokeExpr(self, expr: Invoke) -> int:
+        self.evaluate(expr.object)
+        for arg in expr.arguments:
+            self.evaluate(arg)
+        return ANY
+
+    def visitExpressionStmt(self, stmt: Expression):
+        self.evaluate(stmt.expression)
+
+    # Nothing is known about what a function or method is called with.
+    def visitFunctionStmt(self, stmt: Function):
+        self.join(self.scope.names[stmt.name.lexeme][1], OTHER)
+        params = [p.lexeme for p in stmt.params]
+        self.block(stmt, stmt.body, params, True, [ANY] * len(params))
+
+    def visitClassStmt(self, stmt: Class):
+        self.join(self.scope.names[stmt.name.lexeme][1], OTHER)
+        if stmt.superclass != None:
+            self.evaluate(stmt.superclass)
+        for method in stmt.methods:
+            params = [p.lexeme for p in method.params]
+            self.block(method, method.body, params, True, [ANY] * len(params))
+
+    def visitYieldStmt(self, stmt: Yield):
+        if stmt.value != None:
+            self.evaluate(stmt.value)
+
+    # An import defines whatever the module exports, which isn't known until
+    # it runs, so any name in reach may be rebound to anything.
+    def visitImportStmt(self, stmt: Import):
+        scope = self.scope
+        while scope != None:
+            for _, binding in scope.names.values():
+                self.join(binding, ANY)
+            scope = scope.parent
+
+    def visitIfStmt(self, stmt: If):
+        self.evaluate(stmt.cond)
+        self.execute(stmt.thenBranch)
+        if stmt.elseBranch != None:
+            self.execute(stmt.elseBranch)
+
+    def visitReturnStmt(self, stmt: Return):
+        if stmt.value != None:
+            self.evaluate(stmt.value)
+
+    def visitVarStmt(self, stmt: Var):
+        types = NULL
+        if stmt.initializer != None:
+            types = self.evaluate(stmt.initializer)
+        self.join(self.scope.names[stmt.name.lexeme][1], types)
+
+    def visitWhileStmt(self, stmt: While):
+        self.evaluate(stmt.cond)
+        self.execute(stmt.body)
+        if stmt.post != None:
+            self.execute(stmt.post)
+
+    def visitBlockStmt(self, stmt: Block):
+        self.block(stmt, stmt.statements)
+
+    def visitCompareAndBranchStmt(self, stmt: CompareAndBranch):
+        self.evaluate(stmt.left)
+        self.evaluate(stmt.right)
+        self.execute(stmt.thenBranch)
+        if stmt.elseBranch != None:
+            self.execute(stmt.elseBranch)
+
+    def visitCountedForStmt(self, stmt: CountedFor):
+        self.block(stmt, [stmt.initializer, stmt.loop])
+
+    def visitForInStmt(self, stmt: ForIn):
+        self.evaluate(stmt.iterable)
+        self.scope = Scope(self.scope, False)
+        self.declare(stmt, stmt.name.lexeme, -1)
+        self.join(self.binding(stmt, stmt.name.lexeme), ANY)
+        self.execute(stmt.body)
+        self.scope = self.scope.parent
+
+    def visitBreakStmt(self, stmt: Break):
+        pass
+
+    def visitContinueStmt(self, stmt: Continue):
+        pass
+
+
+class _Specializer(Transformer):
+    types: dict[int, int]
+    stats: dict[str, int]
+
+    def __init__(self, types: dict[int, int], stats: dict[str, int]):
+        self.types = types
+        self.stats = stats
+
+    def visitBinaryExpr(self, expr: Binary) -> Expr:
+        left = self.types.get(id(expr.left), ANY)
+        right = self.types.get(id(expr.right), ANY)
+        super().visitBinaryExpr(expr)
+        if left == 0 or right == 0:
+            return expr
+        if left | right == NUM and expr.operator.t in NUMERIC_OPS:
+            self.stats["specialized"] += 1
+            return NumBinary(
+                expr.left, expr.operator, expr.right, NUMERIC_OPS[expr.operator.t]
+            )
+        if left | right == STR and expr.operator.t == TokenType.PLUS:
+            self.stats["specialized"] += 1
+            return StrConcat(expr.left, expr.operator, expr.right)
+        return expr
@@ -0,0 +1,161 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+PLAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plam.py")
+
+
+# Runs a script with plam and returns its exit status, stdout and stderr.
+def run(tmp_path, source: str, *flags: str) -> tuple[int, str, str]:
+    script = tmp_path / "script.plam"
+    script.write_text(textwrap.dedent(source))
+    result = subprocess.run(
+        [sys.executable, PLAM, *flags, str(script)], capture_output=True, text=True
+    )
+    return result.returncode, result.stdout, result.stderr
+
+
+def test_unannotated_parameters_keep_their_type_checks(tmp_path):
+    source = """\
+        fn f(p) { var y = p * 2; return y - 1; }
+        fn g(p) { return p + 1; }
+        print(f(3));
+        print(g([1, 2]));
+        print(f("ab"));
+    """
+    for flags in [(), ("-O1",), ("-O2",)]:
+        status, out, err = run(tmp_path, source, *flags)
+        assert out == "5\n[2, 3]\n"
+        assert err == "Operand must be a number.\n[line 1]\n"
+        assert status == 70
+
+
+def test_counted_loop_in_generator_rereads_its_bound(tmp_path):
+    source = """\
+        var n = 10;
+        fn gen() { for (var i = 0; i < n; i = i + 1) { yield i; } }
+        var g = gen();
+        print(next(g));
+        print(next(g));
+        n = 3;
+        print(next(g));
+        print(next(g));
+        print(next(g));
+    """
+    for flags in [(), ("-O1",), ("-O2",)]:
+        assert run(tmp_path, source, *flags) == (0, "0\n1\n2\nnull\nnull\n", "")
+
+
+def test_importing_again_binds_current_values(tmp_path):
+    (tmp_path / "counter.plam").write_text(
+        "var x = 1;\nfn setx(v) { x = v; }\nfn getx() { return x; }\n"
+    )
+    source = """\
+        import "counter.plam";
+        setx(5);
+        import "counter.plam";
+        print(x);
+        print(getx());
+    """
+    assert run(tmp_path, source) == (0, "5\n5\n", "")
+
+
+def test_runtime_error_cancels_spawned_tasks(tmp_path):
+    spawned = """\
+        fn w(i) { sleep(100); return i; }
+        var t = spawn(w, [1]);
+        print(1 / 0);
+    """
+    error = "Can't divide by zero.\n[line 3]\n"
+    assert run(tmp_path, spawned) == (70, "", error)
+    limited = """\
+        fn w(i) { sleep(100); return i; }
+        while (true) { spawn(w, [1]); }
+    """
+    error = "Step limit of 50 exceeded.\n[line 2]\n"
+    assert run(tmp_path, limited, "--max-steps=50") == (70, "", error)
+
+
+def test_parallel_parse_keeps_else_after_a_comment(tmp_path):
+    statement = "if (y == 0) y = 1;\n// note\nelse y = 0;\n"
+    source = "var y = 0;\n" + statement * 10000 + "print(y);\n"
+    assert run(tmp_path, source, "--parallel-parse", "-j", "4") == (0, "0\n", "")
+
+
+def test_inlined_calls_leave_globals_alone(capsys):
+    sys.path.insert(0, os.path.dirname(PLAM))
+    import plam
+
+    runner = plam.Plam()
+    runner.optLevel = 2
+    runner.newInterpreter()
+    runner.run("fn f(x) { return x + 1; }\nprint(f(1));\nprint(f(2));\n")
+    assert capsys.readouterr().out == "2\n3\n"
+    globalenv = runner.interpreter.globalenv
+    assert [name for name, _ in globalenv.items() if "@" in name] == []
+
+
+def test_imported_globals_keep_their_type_checks(tmp_path):
+    (tmp_path / "m.plam").write_text('var x = "s";\n')
+    source = """\
+        var x = 1;
+        import "m.plam";
+        print(x - 1);
+    """
+    error = "Operand must be a number.\n[line 3]\n"
+    for flags in [(), ("-O1",), ("-O2",)]:
+        assert run(tmp_path, source, *flags) == (70, "", error)
+
+
+def test_globals_assigned_by_snapshot_functions_keep_their_type_checks(tmp_path):
+    snapshot = str(tmp_path / "prelude.snap")
+    prelude = """\
+        var x = 0;
+        fn f() { x = "s"; }
+    """
+    assert run(tmp_path, prelude, "--snapshot", snapshot) == (0, "", "")
+    called = """\
+        var x = 1;
+        f();
+        print(x - 1);
+    """
+    aliased = """\
+        var x = 1;
+        var g = f;
+        g();
+        print(x * 2);
+    """
+    error = "Operand must be a number.\n[line 3]\n"
+    for flags in [(), ("-O1",), ("-O2",)]:
+        flags += ("--from-snapshot", snapshot)
+        assert run(tmp_path, called, *flags) == (70, "", error)
+        assert run(tmp_path, aliased, *flags) == (0, "ss\n", "")
+
+
+def test_repeating_a_rope_a_negative_number_of_times_is_empty(tmp_path):
+    source = """\
+        var s = "";
+        for (var i = 0; i < 300; i = i + 1) s = s + "a";
+        print(len(s * -1));
+        print(len(s * -2 + "x"));
+        print(len("ab" * -1));
+    """
+    for flags in [(), ("-O1",), ("-O2",)]:
+        assert run(tmp_path, source, *flags) == (0, "0\n1\n0\n", "")
+
+
+def test_limits_are_reported_at_the_loop_that_exceeds_them(tmp_path):
+    looping = """\
+        var a = 1;
+
+        while (true) {}
+    """
+    error = "Step limit of 1000 exceeded.\n[line 3]\n"
+    assert run(tmp_path, looping, "--max-steps=1000") == (70, "", error)
+    looping = """\
+        var a = 1;
+        for (;;) {}
+    """
+    error = "Time limit of 50 ms exceeded.\n[line 2]\n"
+    assert run(tmp_path, looping, "--max-time=50") == (70, "", error)
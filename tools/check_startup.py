@@ -0,0 +1,78 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PLAM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "plam.py")
+
+# Modules a run of a plain script must not load.
+LAZY_MODULES = [
+    "asyncio",
+    "concurrent.futures",
+    "json",
+    "ast_printer",
+    "optimizer",
+    "transpiler",
+    "jit",
+    "splitter",
+    "batch",
+    "incremental",
+    "snapshot",
+    "metrics",
+]
+
+# Runs of a trivial script, of which the fastest is compared with the budget.
+RUNS = 10
+# Milliseconds the fastest run may take by default.
+BUDGET = 400
+
+
+def loadedModules(script: str) -> set[str]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", PLAM, script],
+        capture_output=True,
+        text=True,
+    )
+    modules: set[str] = set()
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            modules.add(line.rsplit("|", 1)[1].strip())
+    return modules
+
+
+def fastestRun(script: str) -> float:
+    fastest = float("inf")
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, PLAM, script], stdout=subprocess.DEVNULL)
+        fastest = min(fastest, time.perf_counter() - start)
+    return fastest * 1000
+
+
+if __name__ == "__main__":
+    args = sys.argv[1::]
+    budget = BUDGET
+    if len(args) == 2 and args[0] == "--budget" and args[1].isdigit():
+        budget = int(args[1])
+    elif len(args) != 0:
+        print("Usage: check_startup [--budget ms]")
+        exit(64)
+
+    with tempfile.TemporaryDirectory() as directory:
+        script = os.path.join(directory, "startup.plam")
+        with open(script, "w") as f:
+            f.write('print("ok");\n')
+        loaded = loadedModules(script)
+        elapsed = fastestRun(script)
+
+    failed = False
+    for module in LAZY_MODULES:
+        if module in loaded:
+            print(f"'{module}' is imported by a plain run.")
+            failed = True
+    print(f"Startup took {elapsed:.0f} ms (budget {budget} ms).")
+    if elapsed > budget:
+        print("Startup is over budget.")
+        failed = True
+    exit(1 if failed else 0)
@@ -4,56 +4,84 @@ import os
 
 def defineAst(outdir: str, basename: str, types: list[str], additional=""):
     path = os.path.join(outdir, basename.lower() + ".py")
+    if additional:
+        additional += "\n"
     with open(path, "w+") as f:
         f.write(
-            f"""
+            f"""\
 from __future__ import annotations
 from dataclasses import dataclass
 from abc import ABC
 from ptoken import Token
-from typing import TypeVar, Generic, Optional
+from typing import Any, Callable, ClassVar, TypeVar, Generic, Optional
 {additional}
-
 T = TypeVar("T")
 
+
 class {basename}(ABC):
+    __slots__ = ()
+    kind: ClassVar[int]
+
     def accept(self, visitor: Visitor[T]) -> T: ...
 """
         )
-        for t in types:
+        for kind, t in enumerate(types):
             classname = t.split(":")[0].strip()
             fields = t.split(":")[1].strip()
-            defineType(f, basename, classname, fields)
-        f.write("\nclass Visitor(ABC, Generic[T]):\n")
-        for t in types:
+            defineType(f, basename, classname, fields, kind)
+        f.write("\n\nclass Visitor(ABC, Generic[T]):\n")
+        for i, t in enumerate(types):
             classname = t.split(":")[0].strip()
-            defineVisitor(f, basename, classname)
+            defineVisitor(f, basename, classname, i == len(types) - 1)
+        defineDispatch(f, basename, types)
 
 
-def defineType(f, basename, classname, fields):
+def defineType(f, basename, classname, fields, kind):
     f.write(
         f"""
-@dataclass
+
+@dataclass(slots=True)
 class {classname}({basename}):
+    kind: ClassVar[int] = {kind}
 """
     )
     for field in [x.strip() for x in fields.split(",") if len(x.strip()) > 0]:
-        t = field.split(" ")[0].strip()
-        n = field.split(" ")[1].strip()
-        f.write(f"""    {n}: {t}\n""")
+        declaration, _, default = field.partition("=")
+        t = declaration.split(" ")[0].strip()
+        n = declaration.split(" ")[1].strip()
+        default = f" = {default.strip()}" if default else ""
+        f.write(f"""    {n}: {t}{default}\n""")
     f.write(
         f"""
     def accept(self, visitor: Visitor[T]) -> T:
-            return visitor.visit{classname}{basename}(self)
+        return visitor.visit{classname}{basename}(self)
 """
     )
 
 
-def defineVisitor(f, basename: str, classname: str):
+def defineVisitor(f, basename: str, classname: str, last: bool):
     f.write(
         f"""\
     def visit{classname}{basename}(self, {basename.lower()}: {classname}) -> T: ...
-        
+"""
+    )
+    if not last:
+        f.write("\n")
+
+
+# Visitors that need fast dispatch can index a table of their bound visit
+# methods by node kind instead of going through accept.
+def defineDispatch(f, basename: str, types: list[str]):
+    f.write("\n\nVISIT_METHODS = [\n")
+    for t in types:
+        classname = t.split(":")[0].strip()
+        f.write(f'    "visit{classname}{basename}",\n')
+    f.write(
+        f"""]
+
+
+def dispatchTable(visitor: Visitor[T]) -> list[Callable[[Any], T]]:
+    return [getattr(visitor, name) for name in VISIT_METHODS]
 """
     )
 
@@ -76,7 +104,22 @@ if __name__ == "__main__":
             "Literal    : object value",
             "Logical    : Expr left, Token operator, Expr right",
             "Unary      : Token operator, Expr right",
-            "Variable   : Token name",
+            "Variable   : Token name, object cache = None, int version = 0",
+            "Inline     : Token callee, list[Token] params, list[Expr] arguments, Expr body",
+            "NumBinary  : Expr left, Token operator, Expr right, object op",
+            "StrConcat  : Expr left, Token operator, Expr right",
+            "IncrementVariable : Token name, Token operator, float delta",
+            "AddConstToVariable : Token name, Token operator, float delta",
+            "ArrayLiteral : Token bracket, list[Expr] elements",
+            "Index      : Expr object, Token bracket, Expr index",
+            "SetIndex   : Expr object, Token bracket, Expr index, Expr value",
+            "Slice      : Expr object, Token bracket, Optional[Expr] start, Optional[Expr] end",
+            "MapLiteral : Token brace, list[Expr] keys, list[Expr] values",
+            "Get        : Expr object, Token name, object shape = None, int slot = 0, object method = None",
+            "Set        : Expr object, Token name, Expr value, object shape = None, object next = None, int slot = 0",
+            "This       : Token keyword",
+            "Super      : Token keyword, Token method",
+            "Invoke     : Expr object, Token name, Token paren, list[Expr] arguments, object shape = None, int slot = 0, object method = None",
         ],
     )
     defineAst(
@@ -84,27 +127,20 @@ if __name__ == "__main__":
         "Stmt",
         [
             "Expression : Expr expression",
-            "Function   : Token name, list[Token] params, list[Stmt] body",
+            "Function   : Token name, list[Token] params, list[Stmt] body, object pending = None, bool generator = False",
             "If         : Expr cond, Stmt thenBranch, Optional[Stmt] elseBranch, ",
             "Return     : Token keyword, Optional[Expr] value",
             "Var        : Token name, Optional[Expr] initializer",
-            "While      : Expr cond, Stmt body",
+            "While      : Token keyword, Expr cond, Stmt body, Optional[Stmt] post = None",
             "Block      : list[Stmt] statements",
             "Break      : Token tok",
             "Continue   : Token tok",
+            "CountedFor : Var initializer, While loop, object compare, Expr bound, float step",
+            "CompareAndBranch : Expr left, Token operator, Expr right, object compare, Stmt thenBranch, Optional[Stmt] elseBranch",
+            "ForIn      : Token name, Token keyword, Expr iterable, Stmt body",
+            "Class      : Token name, Optional[Variable] superclass, list[Function] methods",
+            "Yield      : Token keyword, Optional[Expr] value",
+            "Import     : Token keyword, Token path",
         ],
-        "from expr import Expr",
+        "from expr import Expr, Variable",
     )
-
-# class While(Stmt):
-#     cond: Expr
-#     body: Stmt
-#     post: Optional[Stmt]
-
-#     def __init__(self, cond: Expr, body: Stmt, post: Optional[Stmt] = None):
-#           self.cond = cond
-#           self.body = body
-#           self.post = post
-
-#     def accept(self, visitor: Visitor[T]) -> T:
-#             return visitor.visitWhileStmt(self)